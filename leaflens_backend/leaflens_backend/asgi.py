@@ -3,6 +3,9 @@ ASGI config for leaflens_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+HTTP goes to Django as usual; WebSocket connections to /ws/live-scan/
+are handled by the live-scan endpoint (prediction/live_scan.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
 """
@@ -13,4 +16,24 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'leaflens_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django is set up (they read settings and app modules).
+# live_scan itself loads the inference stack, so it is imported on the
+# first live-scan connection rather than here.
+from prediction.constants import LIVE_SCAN_PATH  # noqa: E402
+from prediction.warmup import start_warmup  # noqa: E402
+
+start_warmup()
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "websocket":
+        if scope["path"] == LIVE_SCAN_PATH:
+            from prediction.live_scan import live_scan_application
+
+            return await live_scan_application(scope, receive, send)
+        # Unknown WebSocket route: reject the handshake
+        await receive()
+        return await send({"type": "websocket.close", "code": 4404})
+    return await django_application(scope, receive, send)
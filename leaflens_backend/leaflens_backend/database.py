@@ -0,0 +1,115 @@
+"""
+LeafLens - Database Configuration
+@Maharsh Doshi
+
+Builds settings.DATABASES from environment variables.
+
+SQLite (default, DB_ENGINE=sqlite):
+    WAL journaling so readers never block the writer, a busy timeout so
+    concurrent writers from several workers wait instead of failing with
+    "database is locked", IMMEDIATE transactions so a transaction takes
+    the write lock up front (avoiding lock upgrade deadlocks), and
+    synchronous=NORMAL, which is safe under WAL.
+
+PostgreSQL (DB_ENGINE=postgresql):
+    Persistent connections (DB_CONN_MAX_AGE) or, with DB_POOL=True, a
+    psycopg 3 connection pool per worker. Setting DB_REPLICA_HOST adds a
+    "replica" alias that history and analytics reads use via
+    read_database(); writes and everything else stay on "default".
+"""
+
+import os
+
+REPLICA_ALIAS = "replica"
+
+
+def _env_bool(name: str, default: str = "False") -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+def _sqlite_config(base_dir) -> dict:
+    busy_timeout = int(os.getenv("SQLITE_BUSY_TIMEOUT", "20"))
+    synchronous = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": os.getenv("DB_NAME", str(base_dir / "db.sqlite3")),
+        "OPTIONS": {
+            "timeout": busy_timeout,
+            "transaction_mode": "IMMEDIATE",
+            "init_command": (
+                "PRAGMA journal_mode=WAL;"
+                f"PRAGMA synchronous={synchronous};"
+                "PRAGMA foreign_keys=ON;"
+            ),
+        },
+    }
+
+
+def _postgresql_config(host: str, port: str) -> dict:
+    config = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.getenv("DB_NAME", "leaflens"),
+        "USER": os.getenv("DB_USER", "leaflens"),
+        "PASSWORD": os.getenv("DB_PASSWORD", ""),
+        "HOST": host,
+        "PORT": port,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
+    }
+    if _env_bool("DB_POOL"):
+        # Pooling and persistent connections are mutually exclusive
+        config["CONN_MAX_AGE"] = 0
+        config["OPTIONS"]["pool"] = {
+            "min_size": int(os.getenv("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.getenv("DB_POOL_MAX_SIZE", "10")),
+            "timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        }
+    else:
+        config["CONN_MAX_AGE"] = int(os.getenv("DB_CONN_MAX_AGE", "60"))
+    return config
+
+
+def build_databases(base_dir) -> dict:
+    """Returns the DATABASES setting for the configured engine."""
+    engine = os.getenv("DB_ENGINE", "sqlite").lower()
+    if engine == "sqlite":
+        return {"default": _sqlite_config(base_dir)}
+    if engine not in ("postgresql", "postgres"):
+        raise ValueError(f"Unsupported DB_ENGINE: {engine}")
+
+    port = os.getenv("DB_PORT", "5432")
+    databases = {"default": _postgresql_config(os.getenv("DB_HOST", "localhost"), port)}
+
+    replica_host = os.getenv("DB_REPLICA_HOST")
+    if replica_host:
+        replica = _postgresql_config(replica_host, os.getenv("DB_REPLICA_PORT", port))
+        replica["TEST"] = {"MIRROR": "default"}
+        databases[REPLICA_ALIAS] = replica
+    return databases
+
+
+def read_database() -> str:
+    """Alias to use for history/analytics reads: the replica if configured."""
+    from django.conf import settings
+
+    return REPLICA_ALIAS if REPLICA_ALIAS in settings.DATABASES else "default"
+
+
+class PrimaryReplicaRouter:
+    """
+    Keeps the ORM's implicit routing on "default"; only queries that
+    explicitly ask for read_database() go to the replica. Migrations never
+    run against the replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
@@ -10,6 +10,8 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+from .database import build_databases
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +50,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",  # CORS - must be before CommonMiddleware
+    "prediction.rate_limit.RateLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -76,13 +79,29 @@ TEMPLATES = [
 WSGI_APPLICATION = "leaflens_backend.wsgi.application"
 
 
-# Database
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# Database (SQLite with WAL by default; see leaflens_backend/database.py for
+# the DB_* variables, PostgreSQL pooling and the optional read replica)
+DATABASES = build_databases(BASE_DIR)
+DATABASE_ROUTERS = ["leaflens_backend.database.PrimaryReplicaRouter"]
+
+
+# Cache (shared weather store, etc.)
+# Set REDIS_URL so all workers on all hosts share one store; the local-memory
+# fallback is per-process and only suitable for development.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "leaflens",
+        }
     }
-}
 
 
 # Password validation
@@ -138,11 +157,197 @@ CORS_ALLOW_ALL_ORIGINS = DEBUG  # Allow all in development
 # Path to the trained .h5 model
 ML_MODEL_PATH = os.getenv("ML_MODEL_PATH", str(PROJECT_ROOT / "potatoes.h5"))
 
+# Multi-crop serving: the default crop uses ML_MODEL_PATH; other crops are
+# declared by JSON manifests in ML_CROP_MANIFESTS_DIR (see
+# prediction/model_router.py). Loaded models beyond the memory budget are
+# evicted least-recently-used.
+ML_DEFAULT_CROP = os.getenv("ML_DEFAULT_CROP", "potato")
+ML_CROP_MANIFESTS_DIR = os.getenv("ML_CROP_MANIFESTS_DIR", str(PROJECT_ROOT / "crop_models"))
+ML_MODEL_MEMORY_BUDGET_MB = float(os.getenv("ML_MODEL_MEMORY_BUDGET_MB", "512"))
+
+# When a server process loads the inference stack (prediction/warmup.py):
+# "lazy" on the first inference request (fastest cold start, for
+# scale-to-zero), "background" in a thread at startup, or "eager" before
+# serving. Profile the import cost with `python manage.py profile_imports`.
+ML_WARMUP = os.getenv("ML_WARMUP", "lazy").lower()
+
+# Keras serving mode: "predict" (model.predict), "function" (traced graph with
+# a fixed input signature per batch bucket) or "xla" (same, XLA-compiled).
+# Compare them with `python manage.py benchmark_serving`.
+ML_KERAS_SERVING_MODE = os.getenv("ML_KERAS_SERVING_MODE", "predict")
+ML_BATCH_BUCKETS = [
+    int(size) for size in os.getenv("ML_BATCH_BUCKETS", "1,2,4,8,16,32").split(",")
+]
+
+# Shared inference batcher: concurrent requests (HTTP and live-scan frames)
+# are grouped into one forward pass of up to ML_BATCH_MAX_SIZE images
+ML_BATCHING_ENABLED = os.getenv("ML_BATCHING_ENABLED", "False").lower() == "true"
+ML_BATCH_MAX_SIZE = int(os.getenv("ML_BATCH_MAX_SIZE", "16"))
+ML_BATCH_MAX_WAIT_MS = float(os.getenv("ML_BATCH_MAX_WAIT_MS", "10"))
+
+# Reusable float32 input buffers kept per worker (see prediction/buffers.py);
+# roughly the number of requests that run inference at the same time
+ML_BUFFER_POOL_SIZE = int(os.getenv("ML_BUFFER_POOL_SIZE", "8"))
+
+# CPU layout (see prediction/cpu_topology.py): usable CPUs (affinity mask and
+# cgroup quota) minus ML_RESERVED_CPUS are split evenly between the
+# WEB_CONCURRENCY workers, and each worker's TensorFlow/TFLite thread pools are
+# sized to its share. 0 means "derive automatically". ML_PIN_CPUS pins each
+# worker to its own cores.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+ML_RESERVED_CPUS = int(os.getenv("ML_RESERVED_CPUS", "0"))
+ML_INTRA_OP_THREADS = int(os.getenv("ML_INTRA_OP_THREADS", "0"))
+ML_INTER_OP_THREADS = int(os.getenv("ML_INTER_OP_THREADS", "0"))
+ML_PIN_CPUS = os.getenv("ML_PIN_CPUS", "False").lower() == "true"
+
+# Test-time augmentation: re-score low-confidence predictions with flipped,
+# rotated and cropped views in one batched pass (threshold is a percentage)
+ML_TTA_ENABLED = os.getenv("ML_TTA_ENABLED", "False").lower() == "true"
+ML_TTA_CONFIDENCE_THRESHOLD = float(os.getenv("ML_TTA_CONFIDENCE_THRESHOLD", "70"))
+
+# Model cascade: the quantized TFLite model answers first; the full model
+# runs only when its top-class confidence or its margin over the runner-up
+# (both percentages) is below the thresholds. ML_CASCADE_AUDIT_RATE of the
+# confident answers are re-checked by the full model to measure agreement.
+ML_CASCADE_ENABLED = os.getenv("ML_CASCADE_ENABLED", "False").lower() == "true"
+ML_CASCADE_MODEL_PATH = os.getenv(
+    "ML_CASCADE_MODEL_PATH", str(PROJECT_ROOT / "tf-lite-models" / "2.tflite")
+)
+ML_CASCADE_CONFIDENCE_THRESHOLD = float(os.getenv("ML_CASCADE_CONFIDENCE_THRESHOLD", "90"))
+ML_CASCADE_MARGIN_THRESHOLD = float(os.getenv("ML_CASCADE_MARGIN_THRESHOLD", "50"))
+ML_CASCADE_AUDIT_RATE = float(os.getenv("ML_CASCADE_AUDIT_RATE", "0.02"))
+
+# Tiled inference for high-resolution photos (POST /api/predict/tiled/)
+TILED_STRIDE = int(os.getenv("TILED_STRIDE", "192"))  # 256px tiles, 25% overlap
+TILED_MAX_SIDE = int(os.getenv("TILED_MAX_SIDE", "2048"))  # Long side is capped here
+TILED_DISEASE_THRESHOLD = float(os.getenv("TILED_DISEASE_THRESHOLD", "80"))
+TILED_MIN_DISEASE_TILES = int(os.getenv("TILED_MIN_DISEASE_TILES", "2"))
+TILED_BATCH_SIZE = int(os.getenv("TILED_BATCH_SIZE", "16"))  # Tiles per forward pass
+
+# Live-scan WebSocket (ws://<host>/ws/live-scan/)
+# Frames whose perceptual hash is within LIVE_SCAN_HASH_DISTANCE bits of the
+# last classified frame are skipped; at most LIVE_SCAN_MAX_IN_FLIGHT frames per
+# connection are classified at once, extra frames are dropped
+LIVE_SCAN_HASH_DISTANCE = int(os.getenv("LIVE_SCAN_HASH_DISTANCE", "6"))
+LIVE_SCAN_MAX_IN_FLIGHT = int(os.getenv("LIVE_SCAN_MAX_IN_FLIGHT", "2"))
+LIVE_SCAN_MAX_FRAME_BYTES = int(os.getenv("LIVE_SCAN_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+
+# Grad-CAM explanations (prediction/explain.py): the conv layer to explain
+# (empty = the last one; an earlier layer gives a finer grid) and the side
+# of the overlay PNG. Explanations are cached by image hash like predictions.
+ML_EXPLAIN_LAYER = os.getenv("ML_EXPLAIN_LAYER", "")
+ML_EXPLAIN_OVERLAY_SIZE = int(os.getenv("ML_EXPLAIN_OVERLAY_SIZE", "128"))
+
+# Per-client token buckets shared by all workers on a host (see
+# prediction/rate_limit.py). Budgets are "capacity/seconds"; each endpoint
+# costs tokens from one budget. RATE_LIMIT_API_KEYS ("key=multiplier,...")
+# gives known integrations their own, scaled buckets (0 = unlimited);
+# everyone else is limited per IP address.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "True").lower() == "true"
+RATE_LIMIT_BUDGETS = {
+    "inference": os.getenv("RATE_LIMIT_INFERENCE", "60/60"),
+    "download": os.getenv("RATE_LIMIT_DOWNLOAD", "20/3600"),
+    "api": os.getenv("RATE_LIMIT_API", "600/60"),
+}
+RATE_LIMIT_COSTS = {
+    "predict": ("inference", 1),
+    "upload-finalize": ("inference", 1),
+    "predict-tiled": ("inference", 4),
+    "tflite-download": ("download", 1),
+    "history-export": ("download", 1),
+    "history-sync": ("inference", 4),  # Thousands of rows, may re-score a sample
+}
+RATE_LIMIT_API_KEYS = {
+    key: float(multiplier)
+    for key, _, multiplier in (
+        item.partition("=") for item in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if item
+    )
+}
+# Behind a reverse proxy, limit by the client address it forwards
+RATE_LIMIT_TRUST_X_FORWARDED_FOR = (
+    os.getenv("RATE_LIMIT_TRUST_X_FORWARDED_FOR", "False").lower() == "true"
+)
+RATE_LIMIT_SLOTS = int(os.getenv("RATE_LIMIT_SLOTS", "16384"))
+
+# Predictions cached by image content hash (re-uploads skip inference)
+PREDICTION_CACHE_TTL = int(os.getenv("PREDICTION_CACHE_TTL", str(7 * 24 * 3600)))
+
 # Path to TFLite models directory
 TFLITE_MODELS_DIR = os.getenv("TFLITE_MODELS_DIR", str(PROJECT_ROOT / "tf-lite-models"))
 
+# Scan images: content-addressed originals plus derived images, written by a
+# background worker pool (see prediction/image_store.py)
+IMAGE_STORE_WORKERS = int(os.getenv("IMAGE_STORE_WORKERS", "2"))
+SCAN_THUMBNAIL_SIZE = int(os.getenv("SCAN_THUMBNAIL_SIZE", "160"))
+SCAN_THUMBNAIL_QUALITY = int(os.getenv("SCAN_THUMBNAIL_QUALITY", "70"))
+
+# Resumable chunked uploads (POST /api/uploads/)
+UPLOAD_TEMP_DIR = os.getenv("UPLOAD_TEMP_DIR", str(BASE_DIR / "upload_tmp"))
+UPLOAD_EXPIRY = int(os.getenv("UPLOAD_EXPIRY", str(24 * 3600)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))  # Suggested
+UPLOAD_MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_BYTES", str(2 * 1024 * 1024)))
+
+# Scan history API: keyset-paginated pages of HISTORY_PAGE_SIZE rows
+# (clients may ask for up to HISTORY_MAX_PAGE_SIZE with ?limit=)
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "200"))
+
+# Traffic capture for `manage.py replay_traffic`: TRAFFIC_CAPTURE_RATE of
+# /api/predict/ requests (image + form fields + timing) are appended to
+# per-worker logs, rotated at TRAFFIC_CAPTURE_FILE_BYTES and pruned to
+# TRAFFIC_CAPTURE_MAX_BYTES in total. Captures hold user photos and locations.
+TRAFFIC_CAPTURE_ENABLED = os.getenv("TRAFFIC_CAPTURE_ENABLED", "False").lower() == "true"
+TRAFFIC_CAPTURE_RATE = float(os.getenv("TRAFFIC_CAPTURE_RATE", "0.05"))
+TRAFFIC_CAPTURE_DIR = os.getenv("TRAFFIC_CAPTURE_DIR", str(BASE_DIR / "traffic_capture"))
+TRAFFIC_CAPTURE_FILE_BYTES = int(os.getenv("TRAFFIC_CAPTURE_FILE_BYTES", str(64 * 1024 * 1024)))
+TRAFFIC_CAPTURE_MAX_BYTES = int(os.getenv("TRAFFIC_CAPTURE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+# Scan history retention (`manage.py archive_scans`, e.g. nightly from cron):
+# months older than SCAN_RETENTION_MONTHS move out of the ScanHistory table
+# into Parquet files under SCAN_ARCHIVE_DIR (needs pyarrow). History pages
+# and exports still read them. 0 keeps every scan in the table.
+SCAN_RETENTION_MONTHS = int(os.getenv("SCAN_RETENTION_MONTHS", "12"))
+SCAN_ARCHIVE_DIR = os.getenv("SCAN_ARCHIVE_DIR", str(BASE_DIR / "scan_archive"))
+SCAN_ARCHIVE_COMPRESSION = os.getenv("SCAN_ARCHIVE_COMPRESSION", "zstd")
+
+# Offline scan sync (POST /api/history/sync/): a random SYNC_VERIFY_RATE of
+# the synced scans that include an image (at most SYNC_VERIFY_MAX per
+# request) is re-scored by the server model
+SYNC_MAX_RECORDS = int(os.getenv("SYNC_MAX_RECORDS", "5000"))
+SYNC_VERIFY_RATE = float(os.getenv("SYNC_VERIFY_RATE", "0.02"))
+SYNC_VERIFY_MAX = int(os.getenv("SYNC_VERIFY_MAX", "8"))
+SYNC_MAX_CLOCK_SKEW = int(os.getenv("SYNC_MAX_CLOCK_SKEW", "300"))  # Seconds
+
+# Nearby outbreaks (GET /api/outbreaks/nearby/ and the predict response)
+OUTBREAK_RADIUS_KM = float(os.getenv("OUTBREAK_RADIUS_KM", "5"))
+OUTBREAK_DAYS = int(os.getenv("OUTBREAK_DAYS", "7"))
+OUTBREAK_MAX_RADIUS_KM = float(os.getenv("OUTBREAK_MAX_RADIUS_KM", "50"))
+OUTBREAK_MAX_DAYS = int(os.getenv("OUTBREAK_MAX_DAYS", "365"))
+OUTBREAK_CACHE_TTL = int(os.getenv("OUTBREAK_CACHE_TTL", "300"))
+
 # OpenWeatherMap API Key (get free at https://openweathermap.org/api)
 OPENWEATHERMAP_API_KEY = os.getenv("OPENWEATHERMAP_API_KEY", "")
 
+# Weather store: readings are shared per grid cell for WEATHER_CACHE_TTL seconds
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "3600"))
+WEATHER_GRID_DEGREES = float(os.getenv("WEATHER_GRID_DEGREES", "0.1"))  # ~11 km
+# Threads fetching weather while a prediction runs
+WEATHER_FETCH_WORKERS = int(os.getenv("WEATHER_FETCH_WORKERS", "4"))
+# Fixed per-location readings instead of the API (load tests, traffic replay)
+WEATHER_STUB = os.getenv("WEATHER_STUB", "False").lower() == "true"
+WEATHER_STUB_LATENCY_MS = float(os.getenv("WEATHER_STUB_LATENCY_MS", "0"))
+
+# Background weather prefetch (also available as `manage.py prefetch_weather`)
+WEATHER_PREFETCH_ENABLED = os.getenv("WEATHER_PREFETCH_ENABLED", "False").lower() == "true"
+WEATHER_PREFETCH_INTERVAL = int(os.getenv("WEATHER_PREFETCH_INTERVAL", "300"))
+WEATHER_PREFETCH_MARGIN = int(os.getenv("WEATHER_PREFETCH_MARGIN", "600"))
+WEATHER_PREFETCH_LOOKBACK_HOURS = int(os.getenv("WEATHER_PREFETCH_LOOKBACK_HOURS", "24"))
+WEATHER_PREFETCH_MAX_REGIONS = int(os.getenv("WEATHER_PREFETCH_MAX_REGIONS", "200"))
+# Free OpenWeatherMap tier: 60 calls/min, 1,000,000 calls/month (~1,300/hour)
+WEATHER_API_HOURLY_QUOTA = int(os.getenv("WEATHER_API_HOURLY_QUOTA", "1000"))
+# Fraction of the hourly quota kept back for cache misses on /api/predict/
+WEATHER_PREFETCH_RESERVE = float(os.getenv("WEATHER_PREFETCH_RESERVE", "0.25"))
+
 # Default settings
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
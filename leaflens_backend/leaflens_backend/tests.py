@@ -0,0 +1,70 @@
+"""
+LeafLens - Database Configuration Tests
+@Maharsh Doshi
+"""
+
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .database import REPLICA_ALIAS, PrimaryReplicaRouter, build_databases
+
+BASE_DIR = Path("/srv/leaflens")
+
+
+def _build(**env):
+    with mock.patch.dict("os.environ", env, clear=True):
+        return build_databases(BASE_DIR)
+
+
+class BuildDatabasesTests(SimpleTestCase):
+    def test_sqlite_default(self):
+        databases = _build()
+        self.assertEqual(list(databases), ["default"])
+        config = databases["default"]
+        self.assertEqual(config["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(config["NAME"], str(BASE_DIR / "db.sqlite3"))
+        self.assertEqual(config["OPTIONS"]["transaction_mode"], "IMMEDIATE")
+        self.assertEqual(config["OPTIONS"]["timeout"], 20)
+        self.assertIn("PRAGMA journal_mode=WAL;", config["OPTIONS"]["init_command"])
+        self.assertIn("PRAGMA synchronous=NORMAL;", config["OPTIONS"]["init_command"])
+
+    def test_sqlite_tuning(self):
+        config = _build(SQLITE_BUSY_TIMEOUT="5", SQLITE_SYNCHRONOUS="FULL")["default"]
+        self.assertEqual(config["OPTIONS"]["timeout"], 5)
+        self.assertIn("PRAGMA synchronous=FULL;", config["OPTIONS"]["init_command"])
+
+    def test_postgresql_persistent_connections(self):
+        config = _build(DB_ENGINE="PostgreSQL", DB_HOST="db", DB_CONN_MAX_AGE="120")["default"]
+        self.assertEqual(config["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual((config["HOST"], config["PORT"]), ("db", "5432"))
+        self.assertEqual(config["CONN_MAX_AGE"], 120)
+        self.assertTrue(config["CONN_HEALTH_CHECKS"])
+        self.assertNotIn("pool", config["OPTIONS"])
+
+    def test_postgresql_pool(self):
+        config = _build(DB_ENGINE="postgres", DB_POOL="True", DB_POOL_MAX_SIZE="4")["default"]
+        # A pool and persistent connections are mutually exclusive
+        self.assertEqual(config["CONN_MAX_AGE"], 0)
+        self.assertEqual(config["OPTIONS"]["pool"], {"min_size": 2, "max_size": 4, "timeout": 10})
+
+    def test_postgresql_replica(self):
+        databases = _build(DB_ENGINE="postgresql", DB_PORT="6432", DB_REPLICA_HOST="replica-1")
+        self.assertEqual(list(databases), ["default", REPLICA_ALIAS])
+        replica = databases[REPLICA_ALIAS]
+        self.assertEqual((replica["HOST"], replica["PORT"]), ("replica-1", "6432"))
+        self.assertEqual(replica["TEST"], {"MIRROR": "default"})
+
+    def test_unknown_engine(self):
+        with self.assertRaisesMessage(ValueError, "Unsupported DB_ENGINE: mysql"):
+            _build(DB_ENGINE="mysql")
+
+
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def test_routing(self):
+        router = PrimaryReplicaRouter()
+        self.assertIsNone(router.db_for_read(None))
+        self.assertEqual(router.db_for_write(None), "default")
+        self.assertTrue(router.allow_migrate("default", "prediction"))
+        self.assertFalse(router.allow_migrate(REPLICA_ALIAS, "prediction"))
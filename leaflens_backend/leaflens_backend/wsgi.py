@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'leaflens_backend.settings')
 
 application = get_wsgi_application()
+
+# Loads the inference stack ahead of the first prediction when
+# ML_WARMUP is "background" or "eager" (see prediction/warmup.py)
+from prediction.warmup import start_warmup  # noqa: E402
+
+start_warmup()
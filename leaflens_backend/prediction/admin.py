@@ -4,20 +4,35 @@ LeafLens - Admin Panel Configuration
 """
 
 from django.contrib import admin
+from django.utils.html import format_html
 from .models import ScanHistory
 
 
 @admin.register(ScanHistory)
 class ScanHistoryAdmin(admin.ModelAdmin):
     list_display = [
+        "thumbnail_preview",
         "disease_class",
         "confidence",
+        "source",
+        "verified_class",
         "city",
         "temperature",
         "humidity",
         "scanned_at",
     ]
-    list_filter = ["disease_class", "scanned_at"]
-    search_fields = ["disease_class", "city"]
-    readonly_fields = ["scanned_at"]
+    list_filter = ["disease_class", "source", "scanned_at"]
+    search_fields = ["disease_class", "city", "client_id"]
+    readonly_fields = ["scanned_at", "image_hash", "client_id", "thumbnail_preview"]
     ordering = ["-scanned_at"]
+
+    @admin.display(description="Image")
+    def thumbnail_preview(self, obj):
+        # Serve the small WebP thumbnail, never the multi-megabyte original
+        if not obj.thumbnail:
+            return "—"
+        return format_html(
+            '<a href="{}"><img src="{}" height="48" loading="lazy"></a>',
+            obj.image.url if obj.image else obj.thumbnail.url,
+            obj.thumbnail.url,
+        )
@@ -0,0 +1,308 @@
+"""
+LeafLens - Scan History Archive
+@Maharsh Doshi
+
+The ScanHistory table only keeps recent ("hot") scans. Each month older
+than SCAN_RETENTION_MONTHS is moved by `manage.py archive_scans` into
+zstd-compressed Parquet files, one directory per month:
+
+    scan_archive/month=2025-09/part-20261019T013000.parquet
+
+Months follow TIME_ZONE. A month is written to a temp file, which is
+renamed into place in the same transaction that deletes its rows, so a
+failed run leaves the rows in the table and no part behind.
+
+A month can have several parts. Phones sync old offline scans (see
+sync.py), and a scan that lands in an already archived month is
+archived as a new part on the next run. Re-sent scans are deduplicated
+by client_id against the table only, so phones should not hold scans
+longer than the retention period.
+
+Readers get rows in (scanned_at, id) order, filtered with the same
+lookups as the table (see history.scan_filters()). history.py merges
+them with the hot rows for /api/history/ pages and exports. Writing and
+reading archives needs pyarrow; without archive files it is never
+imported.
+"""
+
+import logging
+import os
+import tempfile
+from array import array
+from datetime import date, datetime, time
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ScanHistory
+
+logger = logging.getLogger(__name__)
+
+MONTH_PREFIX = "month="
+PART_SUFFIX = ".parquet"
+
+# Rows per Parquet row group (and per fetch from the table)
+ARCHIVE_BATCH_ROWS = 20000
+
+# SQLite allows a limited number of query parameters
+DELETE_CHUNK = 500
+
+# Django field type → Arrow type; anything else is stored as a string
+ARROW_TYPES = {
+    "AutoField": "int64",
+    "BigAutoField": "int64",
+    "IntegerField": "int64",
+    "BigIntegerField": "int64",
+    "FloatField": "float64",
+    "BooleanField": "bool",
+    "DateTimeField": "timestamp",
+}
+
+
+class ArchiveError(RuntimeError):
+    """The archive cannot be written or read."""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.dataset  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ArchiveError("The scan archive needs pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+# ─── Layout ──────────────────────────────────────────────────────────
+
+
+def archive_fields() -> list[str]:
+    """Archived columns: every ScanHistory column, id first."""
+    return [field.attname for field in ScanHistory._meta.concrete_fields]
+
+
+def arrow_schema():
+    pa = _pyarrow()
+    fields = []
+    for field in ScanHistory._meta.concrete_fields:
+        kind = ARROW_TYPES.get(field.get_internal_type(), "string")
+        arrow_type = pa.timestamp("us", tz="UTC") if kind == "timestamp" else pa.type_for_alias(kind)
+        fields.append(pa.field(field.attname, arrow_type))
+    return pa.schema(fields)
+
+
+def month_bounds(month: date) -> tuple[datetime, datetime]:
+    """[start, end) of a month in TIME_ZONE."""
+    following = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    tz = timezone.get_default_timezone()
+    return (
+        timezone.make_aware(datetime.combine(month, time.min), tz),
+        timezone.make_aware(datetime.combine(following, time.min), tz),
+    )
+
+
+def retention_cutoff(months: int) -> datetime:
+    """Start of the oldest month that stays in the table."""
+    today = timezone.localdate()
+    index = today.year * 12 + today.month - 1 - months
+    return month_bounds(date(index // 12, index % 12 + 1, 1))[0]
+
+
+def month_directory(month: date) -> str:
+    return os.path.join(str(settings.SCAN_ARCHIVE_DIR), f"{MONTH_PREFIX}{month:%Y-%m}")
+
+
+def archived_months() -> list[date]:
+    """Months with at least one archive part, oldest first."""
+    root = str(settings.SCAN_ARCHIVE_DIR)
+    if not os.path.isdir(root):
+        return []
+    months = []
+    for name in os.listdir(root):
+        if not name.startswith(MONTH_PREFIX):
+            continue
+        try:
+            month = datetime.strptime(name[len(MONTH_PREFIX) :], "%Y-%m").date()
+        except ValueError:
+            continue
+        if any(part.endswith(PART_SUFFIX) for part in os.listdir(os.path.join(root, name))):
+            months.append(month)
+    return sorted(months)
+
+
+def archive_horizon() -> datetime | None:
+    """End of the newest archived month: every archived scan is older."""
+    months = archived_months()
+    return month_bounds(months[-1])[1] if months else None
+
+
+# ─── Writing ─────────────────────────────────────────────────────────
+
+
+def months_to_archive(cutoff: datetime) -> list[date]:
+    """Months (TIME_ZONE) with scans in the table older than `cutoff`."""
+    return [
+        moment.date()
+        for moment in ScanHistory.objects.filter(scanned_at__lt=cutoff).datetimes(
+            "scanned_at", "month", tzinfo=timezone.get_default_timezone()
+        )
+    ]
+
+
+def _record_batch(rows: list[tuple], schema):
+    pa = _pyarrow()
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def archive_month(month: date, batch_size: int = ARCHIVE_BATCH_ROWS) -> dict:
+    """
+    Moves one month of scans from the table into a new archive part.
+
+    Returns:
+        {"month": "2025-09", "rows": 18233, "path": "…/part-….parquet", "bytes": 612044}
+    """
+    pa = _pyarrow()
+    start, end = month_bounds(month)
+    schema = arrow_schema()
+    rows = (
+        ScanHistory.objects.filter(scanned_at__gte=start, scanned_at__lt=end)
+        .order_by("scanned_at", "id")
+        .values_list(*archive_fields())
+        .iterator(chunk_size=batch_size)
+    )
+
+    directory = month_directory(month)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"part-{timezone.now():%Y%m%dT%H%M%S%f}{PART_SUFFIX}")
+    # A leading dot keeps readers from picking up an unfinished part
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    os.close(fd)
+
+    ids = array("q")
+    try:
+        with pa.parquet.ParquetWriter(
+            temp_path, schema, compression=settings.SCAN_ARCHIVE_COMPRESSION
+        ) as writer:
+            while batch := list(islice(rows, batch_size)):
+                writer.write_batch(_record_batch(batch, schema))
+                ids.extend(row[0] for row in batch)
+
+        written = pa.parquet.ParquetFile(temp_path).metadata.num_rows
+        if written != len(ids):
+            raise ArchiveError(f"{month:%Y-%m}: wrote {written} of {len(ids)} rows.")
+
+        if ids:
+            with transaction.atomic():
+                for offset in range(0, len(ids), DELETE_CHUNK):
+                    chunk = ids[offset : offset + DELETE_CHUNK].tolist()
+                    ScanHistory.objects.filter(pk__in=chunk).delete()
+                # Last step inside the transaction: the rows and the part
+                # never both exist, unless the commit itself fails (below)
+                os.replace(temp_path, path)
+    except BaseException:
+        # Renamed, but the commit failed: the rows are still in the table
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    if not ids:
+        return {"month": f"{month:%Y-%m}", "rows": 0, "path": None, "bytes": 0}
+    logger.info(f"Archived {len(ids)} scans of {month:%Y-%m} to {path}")
+    return {"month": f"{month:%Y-%m}", "rows": len(ids), "path": path, "bytes": os.path.getsize(path)}
+
+
+# ─── Reading ─────────────────────────────────────────────────────────
+
+
+def _filter_expression(lookups: dict, before: tuple[datetime, int] | None):
+    """history.scan_filters() lookups (plus a keyset cursor) as an Arrow filter."""
+    pa = _pyarrow()
+    ds, pc = pa.dataset, pa.compute
+
+    def scalar(name, value):
+        return pa.scalar(value, type=arrow_schema().field(name).type)
+
+    expression = None
+    for lookup, value in lookups.items():
+        name, _, operator = lookup.partition("__")
+        field = ds.field(name)
+        if operator in ("", "exact"):
+            term = field == scalar(name, value)
+        elif operator == "iexact":
+            term = pc.utf8_lower(field) == value.lower()
+        elif operator == "gte":
+            term = field >= scalar(name, value)
+        elif operator == "lt":
+            term = field < scalar(name, value)
+        elif operator == "lte":
+            term = field <= scalar(name, value)
+        else:
+            raise ArchiveError(f"Unsupported archive lookup: {lookup}")
+        expression = term if expression is None else expression & term
+
+    if before is not None:
+        scanned_at = scalar("scanned_at", before[0])
+        term = (ds.field("scanned_at") < scanned_at) | (
+            (ds.field("scanned_at") == scanned_at) & (ds.field("id") < before[1])
+        )
+        expression = term if expression is None else expression & term
+    return expression
+
+
+def _months_in_range(lookups: dict, before) -> list[date]:
+    """Archived months that can hold rows within the lookups' date range."""
+    low = lookups.get("scanned_at__gte")
+    highs = [lookups.get("scanned_at__lt"), lookups.get("scanned_at__lte")]
+    highs += [before[0]] if before is not None else []
+    high = min((bound for bound in highs if bound is not None), default=None)
+
+    months = []
+    for month in archived_months():
+        start, end = month_bounds(month)
+        if (low is None or end > low) and (high is None or start <= high):
+            months.append(month)
+    return months
+
+
+def iter_archived_rows(
+    lookups: dict,
+    fields: list[str] | None = None,
+    descending: bool = False,
+    before: tuple[datetime, int] | None = None,
+):
+    """
+    Yields archived rows (dicts) matching history lookups, in
+    (scanned_at, id) order. `before` keeps only rows older than a
+    (scanned_at, id) cursor. A month is read (and sorted) at a time.
+    """
+    months = _months_in_range(lookups, before)
+    if not months:
+        return
+
+    pa = _pyarrow()
+    schema = arrow_schema()
+    expression = _filter_expression(lookups, before)
+    order = "descending" if descending else "ascending"
+    for month in reversed(months) if descending else months:
+        # The current schema: columns added since a part was written read as null
+        dataset = pa.dataset.dataset(month_directory(month), format="parquet", schema=schema)
+        table = dataset.to_table(columns=fields, filter=expression)
+        table = table.sort_by([("scanned_at", order), ("id", order)])
+        for batch in table.to_batches(max_chunksize=ARCHIVE_BATCH_ROWS):
+            yield from batch.to_pylist()
+
+
+def archived_scans(lookups: dict, limit: int, before=None) -> list[ScanHistory]:
+    """The newest `limit` archived scans, as unsaved ScanHistory instances."""
+    rows = iter_archived_rows(lookups, descending=True, before=before)
+    return [ScanHistory(**row) for row in islice(rows, limit)]
@@ -0,0 +1,290 @@
+"""
+LeafLens - Model Benchmark Helpers
+@Maharsh Doshi
+
+Shared by the model-optimization and benchmark management commands:
+loading an evaluation image set, running Keras / SavedModel / TFLite
+variants on it, and timing them.
+
+Input scaling differs between our models: potatoes.h5 expects pixels
+in [0, 1] (rescaling was applied outside the model during training),
+while saved_models/* and the TFLite builds contain a Rescaling layer
+and expect raw 0-255 pixels. Every runner therefore takes uint8
+pixels and applies its own `input_scale`.
+"""
+
+import os
+import time
+
+import numpy as np
+
+from .datasets import iter_image_paths, label_for_path
+from .ml_model import decode_image
+from .metrics import summarize
+
+
+def load_eval_images(root: str, limit: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Decodes up to `limit` images under `root` to one (N, 256, 256, 3)
+    uint8 array. Labels come from the folder/file names (-1 if unknown).
+    """
+    images, labels = [], []
+    for path in iter_image_paths(root):
+        if limit is not None and len(images) >= limit:
+            break
+        try:
+            with open(path, "rb") as f:
+                images.append(decode_image(f.read()))
+        except Exception:
+            continue
+        label = label_for_path(path)
+        labels.append(-1 if label is None else label)
+
+    if not images:
+        raise ValueError(f"No readable images found under {root}")
+    return np.stack(images), np.array(labels)
+
+
+def input_scale_for(path: str) -> float:
+    """Pixel scale a model expects: 1/255 for the .h5 model, 1.0 otherwise."""
+    return 1.0 / 255.0 if str(path).endswith(".h5") else 1.0
+
+
+def time_calls(fn, repeats: int, warmup: int = 2) -> list[float]:
+    """Calls fn() warmup + repeats times and returns the timed latencies in ms."""
+    for _ in range(warmup):
+        fn()
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def latency_report(latencies_ms: list[float], batch_size: int) -> dict:
+    """Percentiles plus images/sec for a list of per-call latencies."""
+    report = summarize(latencies_ms)
+    report["images_per_sec"] = round(batch_size * 1000 / max(report["mean"], 1e-9), 1)
+    return report
+
+
+def file_size(path: str) -> int:
+    """Size of a model file, or of every file under a SavedModel directory."""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(dirpath, name))
+            for dirpath, _, names in os.walk(path)
+            for name in names
+        )
+    return os.path.getsize(path)
+
+
+class TFLiteRunner:
+    """
+    Runs a .tflite model on uint8 pixel batches, handling batch resizing
+    and quantized (int8/uint8) inputs and outputs.
+    """
+
+    def __init__(self, model_path=None, model_content=None, num_threads=None, input_scale=1.0):
+        import tensorflow as tf
+
+        self.interpreter = tf.lite.Interpreter(
+            model_path=model_path, model_content=model_content, num_threads=num_threads
+        )
+        self.interpreter.allocate_tensors()
+        self.input_scale = input_scale
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch_size = int(self._input["shape"][0])
+
+    def _resize(self, batch_size: int) -> None:
+        if batch_size != self._batch_size:
+            shape = [batch_size] + list(self._input["shape"][1:])
+            self.interpreter.resize_tensor_input(self._input["index"], shape)
+            self.interpreter.allocate_tensors()
+            self._input = self.interpreter.get_input_details()[0]
+            self._output = self.interpreter.get_output_details()[0]
+            self._batch_size = batch_size
+
+    def predict(self, pixels: np.ndarray) -> np.ndarray:
+        self._resize(len(pixels))
+        x = pixels.astype(np.float32) * self.input_scale
+
+        dtype = self._input["dtype"]
+        if dtype in (np.uint8, np.int8):
+            scale, zero_point = self._input["quantization"]
+            info = np.iinfo(dtype)
+            x = np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(dtype)
+
+        self.interpreter.set_tensor(self._input["index"], x)
+        self.interpreter.invoke()
+        y = self.interpreter.get_tensor(self._output["index"])
+
+        if self._output["dtype"] in (np.uint8, np.int8):
+            scale, zero_point = self._output["quantization"]
+            y = (y.astype(np.float32) - zero_point) * scale
+        return y
+
+
+class KerasRunner:
+    """Runs a Keras model (.h5 or SavedModel) on uint8 pixel batches."""
+
+    def __init__(self, model_path: str):
+        import tensorflow as tf
+
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+        self.input_scale = input_scale_for(model_path)
+
+    def predict(self, pixels: np.ndarray) -> np.ndarray:
+        x = pixels.astype(np.float32) * self.input_scale
+        return np.asarray(self.model(x, training=False))
+
+
+class SavedModelRunner:
+    """
+    Runs a SavedModel directory (saved_models/<n>) through its
+    serving_default signature. Keras 3 cannot load these TF2-era Keras
+    exports, and tf.saved_model.load() trips over their optimizer slots,
+    so the graph is loaded into a v1 session, which only needs the
+    signature (and takes its own thread counts).
+    """
+
+    def __init__(self, model_path: str, num_threads: int | None = None):
+        import tensorflow as tf
+
+        config = tf.compat.v1.ConfigProto()
+        if num_threads:
+            config.intra_op_parallelism_threads = num_threads
+            config.inter_op_parallelism_threads = 1
+        graph = tf.Graph()
+        with graph.as_default():
+            self.session = tf.compat.v1.Session(graph=graph, config=config)
+            meta_graph = tf.compat.v1.saved_model.loader.load(
+                self.session, ["serve"], model_path
+            )
+        signature = meta_graph.signature_def["serving_default"]
+        self._input = next(iter(signature.inputs.values())).name
+        self._output = next(iter(signature.outputs.values())).name
+        self.input_scale = input_scale_for(model_path)
+
+    def predict(self, pixels: np.ndarray) -> np.ndarray:
+        x = pixels.astype(np.float32) * self.input_scale
+        return self.session.run(self._output, {self._input: x})
+
+
+def model_kind(path: str) -> str:
+    if str(path).endswith(".tflite"):
+        return "tflite"
+    return "savedmodel" if os.path.isdir(path) else "keras"
+
+
+def load_runner(path: str, num_threads: int | None = None):
+    """A runner for any of our model formats (.h5, SavedModel dir, .tflite)."""
+    kind = model_kind(path)
+    if kind == "tflite":
+        return TFLiteRunner(model_path=path, num_threads=num_threads, input_scale=input_scale_for(path))
+    if kind == "savedmodel":
+        return SavedModelRunner(path, num_threads=num_threads)
+    if num_threads:
+        # Keras runs on the process-wide pools, which are sized only once
+        import tensorflow as tf
+
+        tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+    return KerasRunner(path)
+
+
+def predict_in_batches(runner, pixels: np.ndarray, batch_size: int) -> np.ndarray:
+    """Runs `runner` over all pixels in batches and returns stacked probabilities."""
+    outputs = [
+        runner.predict(pixels[start : start + batch_size])
+        for start in range(0, len(pixels), batch_size)
+    ]
+    return np.concatenate(outputs)
+
+
+def agreement(probs_a: np.ndarray, probs_b: np.ndarray) -> dict:
+    """Top-1 agreement rate and mean absolute probability difference."""
+    return {
+        "top1_agreement": round(float((probs_a.argmax(1) == probs_b.argmax(1)).mean()), 4),
+        "mean_abs_prob_diff": round(float(np.abs(probs_a - probs_b).mean()), 5),
+    }
+
+
+def accuracy(probs: np.ndarray, labels: np.ndarray) -> float | None:
+    """Top-1 accuracy over the labelled images, or None if none are labelled."""
+    labelled = labels >= 0
+    if not labelled.any():
+        return None
+    return round(float((probs[labelled].argmax(1) == labels[labelled]).mean()), 4)
+
+
+# ─── Model Variant Benchmark ─────────────────────────────────────────
+
+
+def discover_model_variants(project_root, model_path, tflite_dir) -> dict[str, str]:
+    """
+    Every model we ship or have shipped, by name:
+    "potatoes.h5", "saved_models/<n>", "tflite/<n>".
+    """
+    variants = {os.path.basename(str(model_path)): str(model_path)}
+    saved_models = os.path.join(str(project_root), "saved_models")
+    if os.path.isdir(saved_models):
+        for name in sorted(os.listdir(saved_models)):
+            path = os.path.join(saved_models, name)
+            if os.path.isfile(os.path.join(path, "saved_model.pb")):
+                variants[f"saved_models/{name}"] = path
+    if os.path.isdir(str(tflite_dir)):
+        for name in sorted(os.listdir(str(tflite_dir))):
+            if name.endswith(".tflite"):
+                variants[f"tflite/{name[: -len('.tflite')]}"] = os.path.join(str(tflite_dir), name)
+    return variants
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)  # KB on Linux
+
+
+def benchmark_variant(
+    path: str, eval_dir: str, limit: int, batch_sizes: list[int], num_threads: int, repeats: int
+) -> dict:
+    """
+    Loads one model and times it on the evaluation set at each batch
+    size. Meant to run in a fresh process per (model, thread count):
+    TensorFlow's thread pools can only be sized once per process, and
+    the peak RSS should belong to this model alone.
+
+    Returns latencies per batch size, load time, peak and model memory,
+    and the probabilities for the whole evaluation set.
+    """
+    import tensorflow as tf  # noqa: F401  (counted in the baseline, not the model)
+
+    pixels, _ = load_eval_images(eval_dir, limit)
+    baseline_rss = _peak_rss_mb()
+
+    start = time.perf_counter()
+    runner = load_runner(path, num_threads)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    probabilities = predict_in_batches(runner, pixels, max(batch_sizes))
+    latency = {}
+    for batch_size in batch_sizes:
+        # Small evaluation sets are tiled up to the batch size
+        batch = np.resize(pixels, (batch_size,) + pixels.shape[1:])
+        latency[batch_size] = latency_report(
+            time_calls(lambda: runner.predict(batch), repeats), batch_size
+        )
+
+    peak_rss = _peak_rss_mb()
+    return {
+        "load_ms": round(load_ms, 1),
+        "latency": latency,
+        "peak_rss_mb": peak_rss,
+        "model_rss_mb": round(peak_rss - baseline_rss, 1) if peak_rss is not None else None,
+        "probabilities": probabilities,
+    }
@@ -0,0 +1,15 @@
+"""
+LeafLens - Model Constants
+@Maharsh Doshi
+
+Constants describing the default (potato) model. Kept free of heavy
+imports so that treatment, history and crop endpoints can use them
+without loading NumPy, PIL or TensorFlow; ml_model re-exports them.
+asgi.py routes on LIVE_SCAN_PATH before live_scan is imported.
+"""
+
+CLASS_NAMES = ["Early Blight", "Late Blight", "Healthy"]
+IMAGE_SIZE = (256, 256)
+
+# WebSocket route of the live-scan endpoint (prediction/live_scan.py)
+LIVE_SCAN_PATH = "/ws/live-scan/"
@@ -0,0 +1,184 @@
+"""
+LeafLens - CPU Topology & Inference Thread Layout
+@Maharsh Doshi
+
+By default every Django worker's TensorFlow runtime sizes its
+intra-op and inter-op thread pools to the whole machine, so four
+workers on an 8-core container run 64+ compute threads and spend
+their time context-switching.
+
+This module works out how many CPUs the process may actually use
+(affinity mask and cgroup quota, not just os.cpu_count()), splits
+them between the web workers, and configures TensorFlow / TFLite to
+match. Optionally each worker pins itself to its own core slice.
+
+The layout is applied once, before TensorFlow is first initialised
+(see ml_model.get_model), and published under "cpu_layout" in
+/api/metrics/.
+"""
+
+import logging
+import math
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import locks
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+CGROUP_V2_CPU_MAX = "/sys/fs/cgroup/cpu.max"
+CGROUP_V1_QUOTA = "/sys/fs/cgroup/cpu/cpu.cfs_quota_us"
+CGROUP_V1_PERIOD = "/sys/fs/cgroup/cpu/cpu.cfs_period_us"
+
+_layout = None
+_slot_lock_file = None  # held open for the life of the process
+
+
+# ─── Discovery ───────────────────────────────────────────────────────
+
+
+def allowed_cpu_ids() -> list[int]:
+    """CPU ids in this process's affinity mask."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:  # not available on macOS
+        return list(range(os.cpu_count() or 1))
+
+
+def cgroup_cpu_limit() -> float | None:
+    """CPU quota from cgroup v2 or v1 (e.g. 2.5 CPUs), or None if unlimited."""
+    try:
+        with open(CGROUP_V2_CPU_MAX) as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+
+    try:
+        with open(CGROUP_V1_QUOTA) as f:
+            quota = int(f.read())
+        with open(CGROUP_V1_PERIOD) as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def effective_cpu_count() -> int:
+    """Usable CPUs: the affinity mask, further capped by any cgroup quota."""
+    count = len(allowed_cpu_ids())
+    limit = cgroup_cpu_limit()
+    if limit is not None:
+        count = min(count, max(math.floor(limit), 1))
+    return count
+
+
+# ─── Layout ──────────────────────────────────────────────────────────
+
+
+def _claim_worker_slot(workers: int) -> int | None:
+    """
+    Claims a unique slot 0..workers-1 among the workers on this host by
+    locking a per-slot file. The lock is released when the process exits.
+    """
+    global _slot_lock_file
+    lock_dir = os.path.join(tempfile.gettempdir(), "leaflens-cpu-slots")
+    os.makedirs(lock_dir, exist_ok=True)
+    for slot in range(workers):
+        handle = open(os.path.join(lock_dir, f"slot-{slot}.lock"), "w")
+        if locks.lock(handle, locks.LOCK_EX | locks.LOCK_NB):
+            _slot_lock_file = handle
+            return slot
+        handle.close()
+    return None
+
+
+def plan_layout() -> dict:
+    """
+    Computes the thread layout for this worker from the CPU budget and
+    settings. Explicit ML_INTRA_OP_THREADS / ML_INTER_OP_THREADS win.
+    """
+    cpu_ids = allowed_cpu_ids()
+    cpus = effective_cpu_count()
+    workers = max(settings.WEB_CONCURRENCY, 1)
+    inference_cpus = max(cpus - settings.ML_RESERVED_CPUS, 1)
+    per_worker = max(inference_cpus // workers, 1)
+
+    layout = {
+        "cpus_visible": os.cpu_count(),
+        "cpus_allowed": len(cpu_ids),
+        "cgroup_cpu_limit": cgroup_cpu_limit(),
+        "cpus_effective": cpus,
+        "web_workers": workers,
+        "reserved_cpus": settings.ML_RESERVED_CPUS,
+        "intra_op_threads": settings.ML_INTRA_OP_THREADS or per_worker,
+        # One small CNN graph has little inter-op parallelism to exploit
+        "inter_op_threads": settings.ML_INTER_OP_THREADS or 1,
+        "tflite_threads": settings.ML_INTRA_OP_THREADS or per_worker,
+        "pinned_cpus": None,
+        "worker_slot": None,
+        "pid": os.getpid(),
+    }
+
+    if settings.ML_PIN_CPUS and hasattr(os, "sched_setaffinity"):
+        slot = _claim_worker_slot(workers)
+        if slot is not None:
+            # Pin to this worker's slice of the inference cores
+            inference_ids = cpu_ids[settings.ML_RESERVED_CPUS :] or cpu_ids
+            start = (slot * per_worker) % len(inference_ids)
+            pinned = inference_ids[start : start + per_worker] or inference_ids[:per_worker]
+            layout["worker_slot"] = slot
+            layout["pinned_cpus"] = pinned
+
+    return layout
+
+
+def apply_layout() -> dict:
+    """
+    Applies the layout once per process: CPU pinning and TensorFlow thread
+    pools. Must run before TensorFlow executes its first op.
+    """
+    global _layout
+    if _layout is not None:
+        return _layout
+
+    layout = plan_layout()
+
+    if layout["pinned_cpus"]:
+        try:
+            os.sched_setaffinity(0, layout["pinned_cpus"])
+        except OSError as e:
+            logger.warning(f"CPU pinning failed: {e}")
+            layout["pinned_cpus"] = None
+
+    try:
+        import tensorflow as tf
+
+        tf.config.threading.set_intra_op_parallelism_threads(layout["intra_op_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(layout["inter_op_threads"])
+    except RuntimeError as e:
+        # TensorFlow was already initialised (e.g. by a management command)
+        logger.warning(f"Could not set TensorFlow thread pools: {e}")
+    except ImportError:
+        pass
+
+    _layout = layout
+    metrics.set_info("cpu_layout", layout)
+    logger.info(
+        f"CPU layout: {layout['cpus_effective']} usable CPUs, {layout['web_workers']} workers → "
+        f"intra_op={layout['intra_op_threads']}, inter_op={layout['inter_op_threads']}, "
+        f"pinned={layout['pinned_cpus']}"
+    )
+    return layout
+
+
+def get_layout() -> dict:
+    """The applied layout (applying it first if needed)."""
+    return apply_layout()
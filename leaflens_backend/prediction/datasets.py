@@ -0,0 +1,61 @@
+"""
+LeafLens - Local Labelled Image Sets
+@Maharsh Doshi
+
+Helpers for walking a local folder of labelled leaf images, used by
+the evaluation and benchmark management commands.
+
+Two layouts are recognised:
+    <root>/<Class Name>/*.jpg        e.g. PlantVillage "Potato___Early_blight/"
+    <root>/<class_name>_<n>.jpg      e.g. test_images_from_internet/early_blight_1.jpg
+"""
+
+import os
+
+from .constants import CLASS_NAMES
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp")
+
+
+def _normalize(name: str) -> str:
+    name = name.lower().replace("_", " ").replace("-", " ")
+    name = " ".join(name.split())
+    if name.startswith("potato "):
+        name = name[len("potato ") :]
+    return name
+
+
+_LABELS = {_normalize(name): index for index, name in enumerate(CLASS_NAMES)}
+
+
+def label_for_path(path: str) -> int | None:
+    """
+    Returns the class index for an image path, taken from its parent
+    folder or filename prefix, or None if it cannot be determined.
+    """
+    parent = _normalize(os.path.basename(os.path.dirname(path)))
+    if parent in _LABELS:
+        return _LABELS[parent]
+
+    stem = _normalize(os.path.splitext(os.path.basename(path))[0])
+    for label, index in _LABELS.items():
+        if stem.startswith(label):
+            return index
+    return None
+
+
+def iter_image_paths(root: str):
+    """Yields image paths under `root` in a stable (sorted) order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if filename.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, filename)
+
+
+def iter_labelled_images(root: str):
+    """Yields (path, class_index) for every labelled image under `root`."""
+    for path in iter_image_paths(root):
+        label = label_for_path(path)
+        if label is not None:
+            yield path, label
@@ -0,0 +1,174 @@
+"""
+LeafLens - Grad-CAM Explanations
+@Maharsh Doshi
+
+Shows where in the leaf the model found what it classified: a Grad-CAM
+heatmap over a convolutional layer (settings.ML_EXPLAIN_LAYER, by
+default the last one), returned as a small transparent PNG that the
+app lays over the photo.
+
+The explainer wraps the model in a two-output model (conv activations
+and class probabilities), so a single forward pass yields both the
+prediction and what Grad-CAM needs. The backward pass only runs from
+the output down to that layer, which sits near the top of the network,
+so an explained prediction costs far less than two predictions. Batches
+work the same way: the batcher runs one explained pass over all queued
+images when any of them asked for an explanation.
+
+    probabilities, heatmaps = get_explainer(model).run(img_batch)
+    explanation = explanation_payload(heatmaps[0], layer, class_name)
+"""
+
+import base64
+import logging
+import threading
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Overlay colour ramp: transparent yellow for low activation, opaque red for high
+OVERLAY_MAX_ALPHA = 170
+
+_explainers = {}  # id(model) -> GradCAMExplainer
+_explainers_lock = threading.Lock()
+
+
+def _find_layer(model, name: str | None):
+    if name:
+        return model.get_layer(name)
+    for layer in reversed(model.layers):
+        if len(layer.output.shape) == 4 and "conv" in type(layer).__name__.lower():
+            return layer
+    raise ValueError("Model has no convolutional layer to explain.")
+
+
+class GradCAMExplainer:
+    """Class probabilities and Grad-CAM heatmaps from one forward pass."""
+
+    def __init__(self, model, layer_name: str | None = None):
+        import tensorflow as tf
+
+        layer = _find_layer(model, layer_name)
+        self.layer_name = layer.name
+        self.grid = tuple(int(dim) for dim in layer.output.shape[1:3])
+        forward = self._two_output_forward(model, layer)
+
+        def explain(img_batch):
+            with tf.GradientTape() as tape:
+                activations, probabilities = forward(img_batch)
+                top = tf.argmax(probabilities, axis=1)
+                # Each image's score depends only on its own activations, so
+                # the gradient of the sum is every image's own gradient
+                scores = tf.gather(probabilities, top, axis=1, batch_dims=1)
+            grads = tape.gradient(scores, activations)
+
+            weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)
+            cams = tf.nn.relu(tf.reduce_sum(activations * weights, axis=-1))
+            peaks = tf.reduce_max(cams, axis=(1, 2), keepdims=True)
+            return probabilities, cams / tf.maximum(peaks, 1e-8)
+
+        input_shape = (None,) + tuple(model.input_shape[1:])
+        self._explain = tf.function(
+            explain, input_signature=[tf.TensorSpec(input_shape, tf.float32)]
+        )
+
+    @staticmethod
+    def _two_output_forward(model, layer):
+        """A callable returning (layer activations, probabilities) in one pass."""
+        import tensorflow as tf
+
+        if isinstance(model, tf.keras.Sequential):
+            # A Sequential model's layers run in order: split them at the layer
+            split = model.layers.index(layer) + 1
+            head, tail = model.layers[:split], model.layers[split:]
+
+            def forward(x):
+                for step in head:
+                    x = step(x, training=False)
+                activations = x
+                for step in tail:
+                    x = step(x, training=False)
+                return activations, x
+
+            return forward
+
+        grad_model = tf.keras.Model(model.inputs, [layer.output, *model.outputs])
+        return lambda x: grad_model(x, training=False)
+
+    def run(self, img_batch: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (probabilities (N, classes), heatmaps (N, rows, cols))
+        with each heatmap scaled to [0, 1].
+        """
+        probabilities, heatmaps = self._explain(img_batch)
+        metrics.increment("ml.explain.images", len(img_batch))
+        return np.asarray(probabilities), np.asarray(heatmaps)
+
+
+def get_explainer(model) -> GradCAMExplainer:
+    """The explainer for a loaded model, built (and traced) once."""
+    explainer = _explainers.get(id(model))
+    if explainer is None:
+        from django.conf import settings
+
+        with _explainers_lock:
+            explainer = _explainers.get(id(model))
+            if explainer is None:
+                explainer = GradCAMExplainer(model, settings.ML_EXPLAIN_LAYER or None)
+                _explainers[id(model)] = explainer
+                logger.info(
+                    f"Grad-CAM explainer ready on layer {explainer.layer_name} "
+                    f"({explainer.grid[0]}x{explainer.grid[1]})"
+                )
+    return explainer
+
+
+def forget_explainer(model) -> None:
+    """Drops a model's explainer (called when the model is evicted)."""
+    with _explainers_lock:
+        _explainers.pop(id(model), None)
+
+
+# ─── Rendering ───────────────────────────────────────────────────────
+
+
+def render_overlay(heatmap: np.ndarray, size: int) -> bytes:
+    """
+    Renders a [0, 1] heatmap as a size x size palette PNG with alpha,
+    to be stretched over the photo by the client.
+    """
+    heat = Image.fromarray(np.uint8(np.clip(heatmap, 0, 1) * 255), "L")
+    heat = np.asarray(heat.resize((size, size), Image.BILINEAR), dtype=np.float32) / 255
+
+    rgba = np.empty(heat.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 1] = np.clip(2 * (1 - heat), 0, 1) * 255
+    rgba[..., 2] = 0
+    rgba[..., 3] = heat * OVERLAY_MAX_ALPHA
+
+    # A 32-colour palette keeps the smooth ramp and makes the PNG a few KB
+    overlay = Image.fromarray(rgba, "RGBA").quantize(32, method=Image.Quantize.FASTOCTREE)
+    buffer = BytesIO()
+    overlay.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
+
+def explanation_payload(heatmap: np.ndarray, layer_name: str, explained_class: str) -> dict:
+    """The "explanation" object returned by the API."""
+    from django.conf import settings
+
+    png = render_overlay(heatmap, settings.ML_EXPLAIN_OVERLAY_SIZE)
+    row, col = np.unravel_index(int(np.argmax(heatmap)), heatmap.shape)
+    return {
+        "method": "grad-cam",
+        "class": explained_class,
+        "layer": layer_name,
+        "grid": list(heatmap.shape),
+        "peak": {"row": int(row), "col": int(col)},
+        "overlay_png": base64.b64encode(png).decode("ascii"),
+    }
@@ -0,0 +1,200 @@
+"""
+LeafLens - Spatial Grid & Nearby Outbreaks
+@Maharsh Doshi
+
+Answers "how much Late Blight was reported within 5 km in the last
+7 days" without scanning every ScanHistory row.
+
+Every scan with coordinates stores the id of the fixed lat/lon grid
+cell it falls in (ScanHistory.grid_cell, indexed with scanned_at).
+A radius query then:
+    1. Lists the cells overlapping the circle's bounding box
+    2. Fetches only scans in those cells (an indexed IN lookup)
+    3. Computes exact haversine distances over the candidates in one
+       vectorized NumPy pass and keeps those inside the radius
+"""
+
+import math
+from datetime import timedelta
+from typing import TYPE_CHECKING
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from leaflens_backend.database import read_database
+
+# NumPy is only needed for radius queries; models.py imports grid_cell()
+# at startup, so it is imported where it is used
+if TYPE_CHECKING:
+    import numpy as np
+
+# Cell size in degrees (~5.5 km of latitude). Changing it invalidates the
+# grid_cell values already stored.
+GRID_CELL_DEGREES = 0.05
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+GRID_COLS = round(360 / GRID_CELL_DEGREES)
+
+EARTH_RADIUS_KM = 6371.0088
+# On the same sphere as haversine_km(), so bounding boxes are never too small
+KM_PER_DEGREE_LAT = EARTH_RADIUS_KM * math.pi / 180
+
+OUTBREAK_CACHE_PREFIX = "leaflens:outbreaks"
+
+
+# ─── Grid Cells ──────────────────────────────────────────────────────
+
+
+def _row_col(latitude: float, longitude: float) -> tuple[int, int]:
+    row = min(int(math.floor((latitude + 90) / GRID_CELL_DEGREES)), GRID_ROWS - 1)
+    col = int(math.floor((longitude + 180) / GRID_CELL_DEGREES)) % GRID_COLS
+    return row, col
+
+
+def valid_coordinates(latitude: float, longitude: float) -> bool:
+    """Finite, with latitude within ±90 and longitude within ±180 ("nan" parses as a float)."""
+    return (
+        math.isfinite(latitude)
+        and math.isfinite(longitude)
+        and -90 <= latitude <= 90
+        and -180 <= longitude <= 180
+    )
+
+
+def grid_cell(latitude, longitude) -> int | None:
+    """Integer id of the grid cell containing the point (None without coordinates)."""
+    if latitude is None or longitude is None:
+        return None
+    row, col = _row_col(latitude, longitude)
+    return row * GRID_COLS + col
+
+
+def cell_center(cell: int) -> tuple[float, float]:
+    row, col = divmod(cell, GRID_COLS)
+    return (
+        round((row + 0.5) * GRID_CELL_DEGREES - 90, 6),
+        round((col + 0.5) * GRID_CELL_DEGREES - 180, 6),
+    )
+
+
+def cells_within(latitude: float, longitude: float, radius_km: float) -> list[int]:
+    """Ids of every cell overlapping the bounding box of the circle."""
+    lat_span = radius_km / KM_PER_DEGREE_LAT
+    min_row, _ = _row_col(max(latitude - lat_span, -90), 0)
+    max_row, _ = _row_col(min(latitude + lat_span, 90), 0)
+
+    # Longitude degrees shrink towards the poles; take the widest latitude.
+    # A circle reaching over a pole spans every longitude.
+    widest = abs(latitude) + lat_span
+    if widest >= 90:
+        lon_span = 180.0
+    else:
+        lon_span = radius_km / (KM_PER_DEGREE_LAT * math.cos(math.radians(widest)))
+    if lon_span >= 180:
+        cols = range(GRID_COLS)
+    else:
+        _, first_col = _row_col(0, longitude - lon_span)
+        span = int(math.ceil(2 * lon_span / GRID_CELL_DEGREES)) + 1
+        # Wraps around the antimeridian
+        cols = sorted({(first_col + i) % GRID_COLS for i in range(span)})
+
+    return [row * GRID_COLS + col for row in range(min_row, max_row + 1) for col in cols]
+
+
+def haversine_km(latitude: float, longitude: float, lats: "np.ndarray", lons: "np.ndarray") -> "np.ndarray":
+    """Great-circle distances (km) from one point to arrays of points."""
+    import numpy as np
+
+    lat1, lon1 = math.radians(latitude), math.radians(longitude)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+# ─── Queries ─────────────────────────────────────────────────────────
+
+
+def nearby_scans(
+    latitude: float,
+    longitude: float,
+    radius_km: float,
+    days: int,
+    queryset=None,
+) -> list[dict]:
+    """
+    Scans within `radius_km` of the point in the last `days` days,
+    nearest first. `queryset` may pre-filter (e.g. by disease).
+    """
+    import numpy as np
+
+    from .models import ScanHistory
+
+    if queryset is None:
+        queryset = ScanHistory.objects.using(read_database())
+
+    since = timezone.now() - timedelta(days=days)
+    rows = list(
+        queryset.filter(
+            grid_cell__in=cells_within(latitude, longitude, radius_km),
+            scanned_at__gte=since,
+        ).values_list("id", "latitude", "longitude", "disease_class", "scanned_at")
+    )
+    if not rows:
+        return []
+
+    ids, lats, lons, diseases, scanned = zip(*rows)
+    distances = haversine_km(
+        latitude, longitude, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+    )
+    inside = np.flatnonzero(distances <= radius_km)
+    inside = inside[np.argsort(distances[inside], kind="stable")]
+
+    return [
+        {
+            "id": ids[i],
+            "disease_class": diseases[i],
+            "distance_km": round(float(distances[i]), 3),
+            "scanned_at": scanned[i],
+        }
+        for i in inside
+    ]
+
+
+def count_by_disease(scans: list[dict]) -> dict:
+    counts = {}
+    for scan in scans:
+        counts[scan["disease_class"]] = counts.get(scan["disease_class"], 0) + 1
+    return counts
+
+
+def outbreak_summary(latitude: float, longitude: float) -> dict:
+    """
+    Disease counts around a scan location for the predict response.
+    Computed from the centre of the caller's grid cell and cached per cell
+    for OUTBREAK_CACHE_TTL seconds, so most requests cost one cache read.
+    """
+    cell = grid_cell(latitude, longitude)
+    key = f"{OUTBREAK_CACHE_PREFIX}:{cell}"
+    summary = cache.get(key)
+    if summary is None:
+        from .models import ScanHistory
+
+        center_lat, center_lon = cell_center(cell)
+        scans = nearby_scans(
+            center_lat,
+            center_lon,
+            settings.OUTBREAK_RADIUS_KM,
+            settings.OUTBREAK_DAYS,
+            queryset=ScanHistory.objects.using(read_database()).exclude(disease_class="Healthy"),
+        )
+        summary = {
+            "radius_km": settings.OUTBREAK_RADIUS_KM,
+            "days": settings.OUTBREAK_DAYS,
+            "counts": count_by_disease(scans),
+            "total": len(scans),
+        }
+        cache.set(key, summary, timeout=settings.OUTBREAK_CACHE_TTL)
+    return summary
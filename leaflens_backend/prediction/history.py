@@ -0,0 +1,233 @@
+"""
+LeafLens - Scan History Queries
+@Maharsh Doshi
+
+Query layer behind /api/history/ and /api/history/export/.
+
+Pagination is keyset-based on (scanned_at, id): each page is "the next
+N rows after this (scanned_at, id)", which the composite index answers
+directly however deep the client has paged. OFFSET pagination would
+scan and discard every earlier row.
+
+Exports stream rows through a chunked (server-side, on PostgreSQL)
+cursor, so memory stays flat for a full season of scans.
+
+Months moved out of the table by `manage.py archive_scans` are merged
+back in (scanned_at, id) order, so pages and exports read the same
+whether or not their months were archived (see archive.py).
+"""
+
+import base64
+import binascii
+import csv
+import heapq
+import json
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from leaflens_backend.database import read_database
+
+from . import archive
+from .model_router import get_router
+from .models import ScanHistory
+
+EXPORT_FIELDS = [
+    "id",
+    "scanned_at",
+    "crop",
+    "disease_class",
+    "confidence",
+    "source",
+    "model_version",
+    "latitude",
+    "longitude",
+    "city",
+    "temperature",
+    "humidity",
+    "weather_description",
+    "image_hash",
+]
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class HistoryQueryError(ValueError):
+    """Raised for malformed filters or cursors (a 400 for the client)."""
+
+
+# ─── Cursors ─────────────────────────────────────────────────────────
+
+
+def encode_cursor(scanned_at: datetime, scan_id: int) -> str:
+    payload = json.dumps([scanned_at.isoformat(), scan_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        scanned_at, scan_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(scanned_at), int(scan_id)
+    except (binascii.Error, ValueError, TypeError):
+        raise HistoryQueryError("Invalid cursor.")
+
+
+# ─── Filters ─────────────────────────────────────────────────────────
+
+
+def _parse_bound(value: str, end: bool) -> tuple[datetime, bool]:
+    """
+    Parses an ISO date or datetime. A bare date as the upper bound means
+    "up to the end of that day". Also returns whether `value` was a
+    datetime, which makes an upper bound inclusive.
+    """
+    try:
+        # parse_datetime() also accepts a bare date, as midnight
+        day = parse_date(value)
+        parsed = parse_datetime(value) if day is None else None
+        if day is not None and end:
+            day += timedelta(days=1)
+    except (ValueError, OverflowError):
+        # Well-formed but impossible: 2026-02-30, 9999-12-31 as date_to
+        raise HistoryQueryError(f"Invalid date: {value}")
+    if parsed is None and day is None:
+        raise HistoryQueryError(f"Invalid date: {value}")
+
+    bound = parsed if parsed is not None else datetime.combine(day, time.min)
+    if timezone.is_naive(bound):
+        bound = timezone.make_aware(bound)
+    return bound, parsed is not None
+
+
+def scan_filters(params) -> dict:
+    """
+    Validates the history filters in query params and returns them as
+    ORM lookups (also applied to archived months, see archive.py):
+    crop, disease, city, source ("server" or "device"),
+    date_from, date_to (ISO dates or datetimes).
+    """
+    lookups = {}
+    crop = params.get("crop")
+    if crop:
+        lookups["crop"] = crop.lower()
+
+    source = params.get("source")
+    if source:
+        if source not in dict(ScanHistory.SOURCE_CHOICES):
+            raise HistoryQueryError(f"Unknown source: {source}")
+        lookups["source"] = source
+
+    disease = params.get("disease")
+    if disease:
+        # Accept "late blight" / "Late_Blight" for "Late Blight"
+        wanted = disease.replace("_", " ").lower()
+        known = {name for spec in get_router().specs().values() for name in spec.class_names}
+        matches = [name for name in known if name.lower() == wanted]
+        if not matches:
+            raise HistoryQueryError(f"Unknown disease: {disease}")
+        lookups["disease_class"] = matches[0]
+
+    city = params.get("city")
+    if city:
+        lookups["city__iexact"] = city
+
+    date_from = params.get("date_from")
+    if date_from:
+        lookups["scanned_at__gte"], _ = _parse_bound(date_from, end=False)
+
+    date_to = params.get("date_to")
+    if date_to:
+        bound, inclusive = _parse_bound(date_to, end=True)
+        # A datetime upper bound is inclusive, a bare date covers that day
+        lookup = "scanned_at__lte" if inclusive else "scanned_at__lt"
+        lookups[lookup] = bound
+
+    return lookups
+
+
+def filter_scans(queryset, params) -> "QuerySet":
+    """Applies the history filters from query params (see scan_filters())."""
+    return queryset.filter(**scan_filters(params))
+
+
+# ─── Pages & Exports ─────────────────────────────────────────────────
+
+
+def _keyset(row: dict):
+    return row["scanned_at"], row["id"]
+
+
+def _scan_keyset(scan: ScanHistory):
+    return scan.scanned_at, scan.id
+
+
+def history_page(params, limit: int) -> tuple[list, str | None]:
+    """
+    Returns (scans, next_cursor) for one page, newest first.
+    next_cursor is None on the last page.
+
+    Archived months are read only when the page reaches back into them;
+    archived scans come back as unsaved ScanHistory instances.
+    """
+    lookups = scan_filters(params)
+    queryset = ScanHistory.objects.using(read_database()).filter(**lookups)
+
+    before = None
+    cursor = params.get("cursor")
+    if cursor:
+        before = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(scanned_at__lt=before[0]) | Q(scanned_at=before[0], id__lt=before[1])
+        )
+
+    # One extra row tells us whether another page exists
+    scans = list(queryset.order_by("-scanned_at", "-id")[: limit + 1])
+    horizon = archive.archive_horizon()
+    if horizon is not None and (len(scans) <= limit or scans[-1].scanned_at < horizon):
+        archived = archive.archived_scans(lookups, limit + 1, before=before)
+        scans = list(heapq.merge(scans, archived, key=_scan_keyset, reverse=True))[: limit + 1]
+
+    if len(scans) <= limit:
+        return scans, None
+    scans = scans[:limit]
+    return scans, encode_cursor(scans[-1].scanned_at, scans[-1].id)
+
+
+def iter_export_rows(params):
+    """Yields export rows (dicts of EXPORT_FIELDS), oldest first, archive included."""
+    lookups = scan_filters(params)
+    hot = (
+        ScanHistory.objects.using(read_database())
+        .filter(**lookups)
+        .order_by("scanned_at", "id")
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    # Both sides are in (scanned_at, id) order; a month can be in both
+    # when old offline scans were synced after it was archived
+    archived = archive.iter_archived_rows(lookups, fields=EXPORT_FIELDS)
+    yield from heapq.merge(archived, hot, key=_keyset)
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        row["scanned_at"] = row["scanned_at"].isoformat()
+        yield writer.writerow([row[field] for field in EXPORT_FIELDS])
+
+
+def stream_ndjson(rows):
+    for row in rows:
+        row["scanned_at"] = row["scanned_at"].isoformat()
+        yield json.dumps(row) + "\n"
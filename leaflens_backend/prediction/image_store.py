@@ -0,0 +1,122 @@
+"""
+LeafLens - Background Scan Image Writer
+@Maharsh Doshi
+
+Persisting a multi-megabyte upload and generating derived images
+does not need to hold up the prediction response. The predict view
+hands the raw bytes to this module, which on a small worker pool:
+
+    1. Stores the original under its content hash (once per unique image)
+    2. Generates a compact WebP thumbnail for the admin and history APIs
+    3. Generates a 256x256 model-ready copy for re-scoring and training
+    4. Points the ScanHistory row at the three files
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image
+
+from .constants import IMAGE_SIZE
+from .storage import content_name, scan_image_storage
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+# ─── Singleton Worker Pool ───────────────────────────────────────────
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_STORE_WORKERS,
+                    thread_name_prefix="leaflens-image-store",
+                )
+    return _executor
+
+
+def schedule_scan_image(scan_id: int, image_bytes: bytes, digest: str):
+    """Queues the image for storage; returns immediately with a Future."""
+    return _get_executor().submit(store_scan_image, scan_id, image_bytes, digest)
+
+
+def schedule_scan_pixels(scan_id: int, pixels, digest: str):
+    """
+    Like schedule_scan_image() for an upload that arrived as decoded
+    pixels (see tensor_payload.py); they are stored as a PNG original.
+    """
+
+    def encode_and_store():
+        buffer = BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        return store_scan_image(scan_id, buffer.getvalue(), digest)
+
+    return _get_executor().submit(encode_and_store)
+
+
+def _encode_webp(image: Image.Image, **options) -> ContentFile:
+    buffer = BytesIO()
+    image.save(buffer, format="WEBP", **options)
+    return ContentFile(buffer.getvalue())
+
+
+def store_scan_image(scan_id: int, image_bytes: bytes, digest: str) -> dict:
+    """
+    Stores the original plus derived images and updates the scan row.
+    Derived images are only generated the first time a digest is seen.
+
+    Returns:
+        dict with the storage names: image, thumbnail, model_image
+    """
+    from .models import ScanHistory
+
+    try:
+        image = Image.open(BytesIO(image_bytes))
+        extension = EXTENSIONS.get(image.format, ".img")
+
+        names = {
+            "image": content_name("scans/originals", digest, extension),
+            "thumbnail": content_name("scans/thumbnails", digest, ".webp"),
+            "model_image": content_name("scans/model", digest, ".webp"),
+        }
+
+        if not scan_image_storage.exists(names["image"]):
+            scan_image_storage.save(names["image"], ContentFile(image_bytes))
+
+        if not scan_image_storage.exists(names["thumbnail"]):
+            rgb = image.convert("RGB")
+
+            thumbnail = rgb.copy()
+            size = settings.SCAN_THUMBNAIL_SIZE
+            thumbnail.thumbnail((size, size))
+            scan_image_storage.save(
+                names["thumbnail"],
+                _encode_webp(thumbnail, quality=settings.SCAN_THUMBNAIL_QUALITY),
+            )
+
+            # Lossless so re-scoring sees exactly what the model saw
+            model_ready = rgb.resize(IMAGE_SIZE)
+            scan_image_storage.save(
+                names["model_image"], _encode_webp(model_ready, lossless=True)
+            )
+
+        ScanHistory.objects.filter(pk=scan_id).update(**names)
+        return names
+
+    except Exception as e:
+        logger.error(f"Failed to store image for scan {scan_id}: {e}", exc_info=True)
+        return {}
+    finally:
+        # Worker threads hold their own DB connections
+        connection.close()
@@ -24,6 +24,54 @@ MIN_GREEN_RATIO = 1.05  # Green channel must be at least 5% higher than avg of R
 SATURATION_THRESHOLD = 0.15  # Min average saturation (filters out grayscale images)
 
 
+def compute_leaf_statistics(pixels: np.ndarray) -> tuple:
+    """
+    Computes the green-dominance statistics over the last three axes
+    (height, width, RGB) of a float32 pixel array. Leading axes are kept,
+    so a stack of tiles (..., H, W, 3) is scored in one vectorized pass.
+
+    Returns:
+        (green_fraction, green_ratio, avg_saturation) — scalars for a
+        single image, arrays matching the leading axes for a stack
+    """
+    r_channel = pixels[..., 0]
+    g_channel = pixels[..., 1]
+    b_channel = pixels[..., 2]
+    spatial_axes = (-2, -1)
+
+    # ── Check 1: Green channel dominance ──
+    # A pixel is "green-ish" if green > red AND green > blue
+    green_dominant_pixels = np.logical_and(g_channel > r_channel, g_channel > b_channel)
+    green_fraction = np.mean(green_dominant_pixels, axis=spatial_axes)
+
+    # ── Check 2: Green-to-other ratio ──
+    avg_green = np.mean(g_channel, axis=spatial_axes)
+    avg_red = np.mean(r_channel, axis=spatial_axes)
+    avg_blue = np.mean(b_channel, axis=spatial_axes)
+    avg_other = (avg_red + avg_blue) / 2.0
+
+    green_ratio = avg_green / np.maximum(avg_other, 1.0)
+
+    # ── Check 3: Saturation check (filters grayscale) ──
+    max_channel = np.maximum(np.maximum(r_channel, g_channel), b_channel)
+    min_channel = np.minimum(np.minimum(r_channel, g_channel), b_channel)
+    saturation = np.where(
+        max_channel > 0, (max_channel - min_channel) / np.maximum(max_channel, 1.0), 0
+    )
+    avg_saturation = np.mean(saturation, axis=spatial_axes)
+
+    return green_fraction, green_ratio, avg_saturation
+
+
+def passes_leaf_thresholds(green_fraction, green_ratio, avg_saturation):
+    """True (or a boolean array) where all three leaf checks pass."""
+    return (
+        (green_fraction >= GREEN_DOMINANCE_THRESHOLD)
+        & (green_ratio >= MIN_GREEN_RATIO)
+        & (avg_saturation >= SATURATION_THRESHOLD)
+    )
+
+
 def validate_leaf_image(image_bytes: bytes) -> dict:
     """
     Analyzes the image to determine if it likely contains a plant leaf.
@@ -38,33 +86,28 @@ def validate_leaf_image(image_bytes: bytes) -> dict:
         image = Image.open(BytesIO(image_bytes)).convert("RGB")
         image = image.resize((128, 128))  # Small size is enough for color analysis
         img_array = np.array(image, dtype=np.float32)
+    except Exception as e:
+        return _fail_open(e)
 
-        r_channel = img_array[:, :, 0]
-        g_channel = img_array[:, :, 1]
-        b_channel = img_array[:, :, 2]
+    return validate_leaf_array(img_array)
 
-        # ── Check 1: Green channel dominance ──
-        # A pixel is "green-ish" if green > red AND green > blue
-        green_dominant_pixels = np.logical_and(
-            g_channel > r_channel, g_channel > b_channel
-        )
-        green_fraction = np.mean(green_dominant_pixels)
 
-        # ── Check 2: Green-to-other ratio ──
-        avg_green = np.mean(g_channel)
-        avg_red = np.mean(r_channel)
-        avg_blue = np.mean(b_channel)
-        avg_other = (avg_red + avg_blue) / 2.0
+def validate_leaf_array(img_array: np.ndarray) -> dict:
+    """
+    Same checks as validate_leaf_image() on an already-decoded RGB array
+    (uint8 or float32, 0-255). Arrays larger than 128x128 are subsampled
+    with a strided view, so no resize or decode is needed.
 
-        green_ratio = avg_green / max(avg_other, 1.0)
+    Returns:
+        dict with keys: is_leaf, confidence, reason
+    """
+    try:
+        step = max(min(img_array.shape[0], img_array.shape[1]) // 128, 1)
+        img_array = img_array[::step, ::step].astype(np.float32, copy=False)
 
-        # ── Check 3: Saturation check (filters grayscale) ──
-        max_channel = np.maximum(np.maximum(r_channel, g_channel), b_channel)
-        min_channel = np.minimum(np.minimum(r_channel, g_channel), b_channel)
-        saturation = np.where(
-            max_channel > 0, (max_channel - min_channel) / max_channel, 0
+        green_fraction, green_ratio, avg_saturation = (
+            float(value) for value in compute_leaf_statistics(img_array)
         )
-        avg_saturation = np.mean(saturation)
 
         # ── Compute leaf confidence score ──
         # Weighted combination of the three checks
@@ -75,11 +118,7 @@ def validate_leaf_image(image_bytes: bytes) -> dict:
         )
         score = round(float(score), 3)
 
-        is_leaf = (
-            green_fraction >= GREEN_DOMINANCE_THRESHOLD
-            and green_ratio >= MIN_GREEN_RATIO
-            and avg_saturation >= SATURATION_THRESHOLD
-        )
+        is_leaf = bool(passes_leaf_thresholds(green_fraction, green_ratio, avg_saturation))
 
         if is_leaf:
             reason = "Image appears to contain a plant leaf."
@@ -112,10 +151,14 @@ def validate_leaf_image(image_bytes: bytes) -> dict:
         }
 
     except Exception as e:
-        logger.error(f"Image validation failed: {e}")
-        # If validation fails, allow the image through (fail-open)
-        return {
-            "is_leaf": True,
-            "confidence": 0.0,
-            "reason": "Validation skipped due to an error.",
-        }
+        return _fail_open(e)
+
+
+def _fail_open(error: Exception) -> dict:
+    logger.error(f"Image validation failed: {error}")
+    # If validation fails, allow the image through (fail-open)
+    return {
+        "is_leaf": True,
+        "confidence": 0.0,
+        "reason": "Validation skipped due to an error.",
+    }
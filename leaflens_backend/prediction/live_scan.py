@@ -0,0 +1,230 @@
+"""
+LeafLens - Live-Scan WebSocket Endpoint
+@Maharsh Doshi
+
+    ws://<host>/ws/live-scan/
+
+The mobile app streams camera frames (one JPEG/PNG/WebP per binary
+message) and receives predictions as JSON text messages as soon as
+each one completes.
+
+Live scanning would otherwise multiply inference load by the frame
+rate, so every frame first gets a 64-bit perceptual hash (dHash).
+Frames within LIVE_SCAN_HASH_DISTANCE bits of the last classified
+frame are skipped — the camera is still pointing at the same leaf.
+The rest go through the leaf pre-check and into the shared
+inference batcher alongside regular /api/predict/ traffic.
+
+Server → client messages:
+    {"type": "prediction", "frame": 12, "is_leaf": true,
+     "disease_class": "Late Blight", "confidence": 97.4, "latency_ms": 41.2}
+    {"type": "skipped", "frame": 13, "same_as": 12, "distance": 3}
+    {"type": "dropped", "frame": 14, "reason": "busy"}
+    {"type": "error", "frame": 15, "error": "..."}
+
+Client → server text messages:
+    {"type": "reset"}   — forget the last frame (e.g. user moved to a new plant)
+    {"type": "ping"}    — answered with {"type": "pong"}
+"""
+
+import asyncio
+import json
+import logging
+import time
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from . import metrics
+from .batcher import get_batcher
+from .constants import LIVE_SCAN_PATH
+from .image_validator import validate_leaf_array
+from .ml_model import CLASS_NAMES, IMAGE_SIZE
+
+logger = logging.getLogger(__name__)
+
+# dHash compares (HASH_SIZE + 1) x HASH_SIZE neighbours → 64-bit hash
+HASH_SIZE = 8
+
+
+# ─── Frame Helpers ───────────────────────────────────────────────────
+
+
+def decode_frame(frame_bytes: bytes) -> np.ndarray:
+    """Decodes a camera frame to a (256, 256, 3) uint8 RGB array."""
+    image = Image.open(BytesIO(frame_bytes))
+    image.draft("RGB", IMAGE_SIZE)  # JPEG: decode at a reduced scale, much cheaper
+    return np.asarray(image.convert("RGB").resize(IMAGE_SIZE))
+
+
+def difference_hash(img_array: np.ndarray) -> int:
+    """
+    64-bit difference hash: each bit records whether a pixel of a 9x8
+    grayscale thumbnail is brighter than its right-hand neighbour.
+    Robust to small camera shake, exposure shifts and recompression.
+    """
+    gray = Image.fromarray(img_array).convert("L").resize((HASH_SIZE + 1, HASH_SIZE))
+    pixels = np.asarray(gray, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def _prepare_frame(frame_bytes: bytes) -> tuple[np.ndarray, int]:
+    img_array = decode_frame(frame_bytes)
+    return img_array, difference_hash(img_array)
+
+
+# ─── Session ─────────────────────────────────────────────────────────
+
+
+class LiveScanSession:
+    """State for one WebSocket connection."""
+
+    def __init__(self, send):
+        self._send = send
+        self._send_lock = asyncio.Lock()
+        self._tasks = set()
+        self.frame_count = 0
+        self.in_flight = 0
+        self.last_hash = None
+        self.last_classified_frame = None
+
+    async def send_json(self, payload: dict) -> None:
+        async with self._send_lock:
+            await self._send({"type": "websocket.send", "text": json.dumps(payload)})
+
+    def reset(self) -> None:
+        self.last_hash = None
+        self.last_classified_frame = None
+
+    async def handle_frame(self, frame_bytes: bytes) -> None:
+        self.frame_count += 1
+        frame_id = self.frame_count
+        metrics.increment("live_scan.frames")
+
+        if len(frame_bytes) > settings.LIVE_SCAN_MAX_FRAME_BYTES:
+            await self.send_json(
+                {"type": "error", "frame": frame_id, "error": "Frame too large."}
+            )
+            return
+
+        # Never queue behind a slow model: drop frames instead of lagging
+        if self.in_flight >= settings.LIVE_SCAN_MAX_IN_FLIGHT:
+            metrics.increment("live_scan.dropped")
+            await self.send_json({"type": "dropped", "frame": frame_id, "reason": "busy"})
+            return
+
+        self.in_flight += 1
+        task = asyncio.create_task(self._process(frame_id, frame_bytes))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, frame_id: int, frame_bytes: bytes) -> None:
+        start = time.perf_counter()
+        try:
+            img_array, frame_hash = await asyncio.to_thread(_prepare_frame, frame_bytes)
+
+            # ── Near-duplicate check (no await between check and update) ──
+            if self.last_hash is not None:
+                distance = (frame_hash ^ self.last_hash).bit_count()
+                if distance <= settings.LIVE_SCAN_HASH_DISTANCE:
+                    metrics.increment("live_scan.skipped")
+                    await self.send_json(
+                        {
+                            "type": "skipped",
+                            "frame": frame_id,
+                            "same_as": self.last_classified_frame,
+                            "distance": distance,
+                        }
+                    )
+                    return
+            self.last_hash = frame_hash
+            self.last_classified_frame = frame_id
+
+            validation = await asyncio.to_thread(validate_leaf_array, img_array)
+            if not validation["is_leaf"]:
+                await self.send_json(
+                    {
+                        "type": "prediction",
+                        "frame": frame_id,
+                        "is_leaf": False,
+                        "disease_class": "Not a Leaf",
+                        "confidence": 0,
+                        "validation_message": validation["reason"],
+                        "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                    }
+                )
+                return
+
+            # uint8 pixels are scaled straight into the batcher's buffer
+            future = get_batcher().submit(img_array)
+            probabilities = await asyncio.wrap_future(future)
+            predicted_index = int(np.argmax(probabilities))
+
+            metrics.increment("live_scan.classified")
+            latency_ms = (time.perf_counter() - start) * 1000
+            metrics.observe("live_scan.latency_ms", latency_ms)
+            await self.send_json(
+                {
+                    "type": "prediction",
+                    "frame": frame_id,
+                    "is_leaf": True,
+                    "disease_class": CLASS_NAMES[predicted_index],
+                    "confidence": round(float(probabilities[predicted_index]) * 100, 2),
+                    "latency_ms": round(latency_ms, 1),
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Live-scan frame {frame_id} failed: {e}")
+            await self.send_json({"type": "error", "frame": frame_id, "error": str(e)})
+        finally:
+            self.in_flight -= 1
+
+    async def handle_text(self, text: str) -> None:
+        try:
+            message = json.loads(text)
+        except ValueError:
+            message = None
+        if not isinstance(message, dict):
+            await self.send_json({"type": "error", "error": "Invalid JSON message."})
+            return
+
+        if message.get("type") == "reset":
+            self.reset()
+        elif message.get("type") == "ping":
+            await self.send_json({"type": "pong"})
+
+    def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+
+# ─── ASGI Application ────────────────────────────────────────────────
+
+
+async def live_scan_application(scope, receive, send):
+    """Raw ASGI WebSocket handler mounted at LIVE_SCAN_PATH (see asgi.py)."""
+    session = None
+    while True:
+        message = await receive()
+
+        if message["type"] == "websocket.connect":
+            await send({"type": "websocket.accept"})
+            session = LiveScanSession(send)
+            metrics.increment("live_scan.connections")
+
+        elif message["type"] == "websocket.receive":
+            if message.get("bytes") is not None:
+                await session.handle_frame(message["bytes"])
+            elif message.get("text") is not None:
+                await session.handle_text(message["text"])
+
+        elif message["type"] == "websocket.disconnect":
+            if session is not None:
+                session.close()
+                logger.info(
+                    f"Live-scan session closed after {session.frame_count} frames"
+                )
+            return
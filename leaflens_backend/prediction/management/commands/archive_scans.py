@@ -0,0 +1,84 @@
+"""
+LeafLens - Scan History Archival Command
+@Maharsh Doshi
+
+Moves months older than SCAN_RETENTION_MONTHS out of the ScanHistory
+table into compressed Parquet files (see prediction/archive.py). Safe to
+run repeatedly, e.g. nightly from cron; run it from one host at a time.
+
+    python manage.py archive_scans                # SCAN_RETENTION_MONTHS
+    python manage.py archive_scans --months 6 --dry-run
+"""
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.archive import (
+    ARCHIVE_BATCH_ROWS,
+    ArchiveError,
+    archive_month,
+    month_bounds,
+    months_to_archive,
+    retention_cutoff,
+)
+from prediction.models import ScanHistory
+
+
+class Command(BaseCommand):
+    help = "Archive scan history older than the retention period to Parquet files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months", type=int,
+            help="Months kept in the table (default: SCAN_RETENTION_MONTHS).",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Only report what would be archived."
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=ARCHIVE_BATCH_ROWS,
+            help="Rows per Parquet row group.",
+        )
+
+    def handle(self, *args, **options):
+        months = options["months"]
+        if months is None:
+            months = settings.SCAN_RETENTION_MONTHS
+        if months < 1:
+            raise CommandError("Retention is off (SCAN_RETENTION_MONTHS=0); pass --months N.")
+
+        cutoff = retention_cutoff(months)
+        pending = months_to_archive(cutoff)
+        if not pending:
+            self.stdout.write(f"No scans before {cutoff:%Y-%m-%d}; nothing to archive.")
+            return
+
+        total_rows = total_bytes = 0
+        for month in pending:
+            if options["dry_run"]:
+                start, end = month_bounds(month)
+                rows = ScanHistory.objects.filter(scanned_at__gte=start, scanned_at__lt=end).count()
+                self.stdout.write(f"{month:%Y-%m}: {rows} scans would be archived")
+                total_rows += rows
+                continue
+            try:
+                result = archive_month(month, batch_size=options["batch_size"])
+            except ArchiveError as e:
+                raise CommandError(str(e))
+            total_rows += result["rows"]
+            total_bytes += result["bytes"]
+            self.stdout.write(
+                f"{result['month']}: {result['rows']} scans → {result['path']} "
+                f"({result['bytes'] / 1024:.1f} KB)"
+            )
+
+        if options["dry_run"]:
+            self.stdout.write(f"Dry run: {total_rows} scans before {cutoff:%Y-%m-%d}.")
+            return
+        remaining = ScanHistory.objects.count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {total_rows} scans from {len(pending)} months "
+                f"({total_bytes / 1024 / 1024:.2f} MB); {remaining} remain in the table."
+            )
+        )
@@ -0,0 +1,314 @@
+"""
+LeafLens - Model Variant Regression Benchmark
+@Maharsh Doshi
+
+Runs every model variant we ship (potatoes.h5, saved_models/<n>,
+tf-lite-models/<n>.tflite) on the same labelled images, at several
+batch sizes and thread counts, and reports for each:
+
+    latency (p50/p95/p99) and throughput per batch size and thread count
+    load time, peak process memory and memory added by the model
+    file size, accuracy and top-1 agreement with every other variant
+
+    python manage.py benchmark_models
+    python manage.py benchmark_models --batch-sizes 1,8 --threads 1,4 --variants tflite
+    python manage.py benchmark_models --model candidate=/tmp/new.tflite
+    python manage.py benchmark_models --save-baseline ../benchmarks/models.json
+    python manage.py benchmark_models --compare ../benchmarks/models.json
+
+With --compare the command fails (nonzero exit) when a variant got
+slower than the baseline by more than --latency-tolerance, lost
+accuracy beyond --accuracy-tolerance, or changed size or checksum
+without the baseline being re-saved. Latencies are only compared
+between runs on the same host.
+
+Each (variant, thread count) runs in a fresh process: TensorFlow sizes
+its thread pools once per process, and peak memory should belong to
+that variant alone.
+"""
+
+import hashlib
+import json
+import os
+import platform
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.benchmarking import (
+    accuracy,
+    agreement,
+    benchmark_variant,
+    discover_model_variants,
+    file_size,
+    load_eval_images,
+    model_kind,
+)
+from prediction.cpu_topology import effective_cpu_count
+
+
+def _file_digest(path: str) -> str:
+    """sha256 of a model file, or of every file in a SavedModel directory."""
+    digest = hashlib.sha256()
+    paths = [path]
+    if os.path.isdir(path):
+        paths = sorted(
+            os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+        )
+    for name in paths:
+        digest.update(os.path.relpath(name, path).encode())
+        with open(name, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+class Command(BaseCommand):
+    help = "Benchmark every model variant and gate regressions against a stored baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--eval-dir",
+            default=str(settings.PROJECT_ROOT / "test_images_from_internet"),
+            help="Labelled images (class from folder or file name).",
+        )
+        parser.add_argument("--limit", type=int, default=500, help="Images to evaluate.")
+        parser.add_argument("--batch-sizes", default="1,8,32")
+        parser.add_argument(
+            "--threads",
+            default=f"1,{effective_cpu_count()}",
+            help="Comma-separated intra-op thread counts.",
+        )
+        parser.add_argument("--repeats", type=int, default=30, help="Timed runs per batch size.")
+        parser.add_argument(
+            "--variants", help="Only variants whose name contains one of these (comma-separated)."
+        )
+        parser.add_argument(
+            "--model", action="append", default=[], metavar="NAME=PATH",
+            help="Add or override a variant (repeatable).",
+        )
+        parser.add_argument("--output", help="Write the full report as JSON.")
+        parser.add_argument("--save-baseline", help="Write the report as the new baseline.")
+        parser.add_argument("--compare", help="Baseline JSON to gate regressions against.")
+        parser.add_argument(
+            "--latency-tolerance", type=float, default=0.15,
+            help="Allowed p50 slowdown against the baseline (0.15 = 15%%).",
+        )
+        parser.add_argument(
+            "--accuracy-tolerance", type=float, default=0.0,
+            help="Allowed accuracy drop against the baseline.",
+        )
+
+    # ── Variants ──
+
+    def _variants(self, options) -> dict[str, str]:
+        variants = discover_model_variants(
+            settings.PROJECT_ROOT, settings.ML_MODEL_PATH, settings.TFLITE_MODELS_DIR
+        )
+        if options["variants"]:
+            wanted = options["variants"].split(",")
+            variants = {
+                name: path for name, path in variants.items() if any(w in name for w in wanted)
+            }
+        for spec in options["model"]:
+            name, sep, path = spec.partition("=")
+            if not sep:
+                raise CommandError(f"--model expects NAME=PATH, got {spec!r}")
+            variants[name] = os.path.abspath(path)
+
+        missing = [path for path in variants.values() if not os.path.exists(path)]
+        if missing:
+            raise CommandError(f"Model not found: {', '.join(missing)}")
+        if not variants:
+            raise CommandError("No model variants to benchmark.")
+        return variants
+
+    # ── Benchmark ──
+
+    def _run(self, path: str, threads: int, options, batch_sizes: list[int]) -> dict:
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=get_context("spawn"), initializer=django.setup
+        ) as pool:
+            return pool.submit(
+                benchmark_variant, path, options["eval_dir"], options["limit"],
+                batch_sizes, threads, options["repeats"],
+            ).result()
+
+    def handle(self, *args, **options):
+        batch_sizes = _int_list(options["batch_sizes"])
+        thread_counts = _int_list(options["threads"])
+        if not batch_sizes or not thread_counts:
+            raise CommandError("--batch-sizes and --threads need at least one value.")
+        variants = self._variants(options)
+
+        try:
+            _, labels = load_eval_images(options["eval_dir"], options["limit"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(
+            f"Evaluation: {len(labels)} images ({int((labels >= 0).sum())} labelled) | "
+            f"variants: {', '.join(variants)}"
+        )
+
+        report = {
+            "host": {
+                "machine": platform.machine(),
+                "processor": platform.processor() or platform.machine(),
+                "cpus": effective_cpu_count(),
+                "python": platform.python_version(),
+            },
+            "eval": {
+                "dir": options["eval_dir"],
+                "images": len(labels),
+                "labelled_images": int((labels >= 0).sum()),
+            },
+            "batch_sizes": batch_sizes,
+            "threads": thread_counts,
+            "variants": {},
+        }
+        probabilities = {}
+
+        for name, path in variants.items():
+            result = {
+                "path": path,
+                "kind": model_kind(path),
+                "size_bytes": file_size(path),
+                "sha256": _file_digest(path),
+                "runs": [],
+            }
+            for threads in thread_counts:
+                self.stdout.write(f"{name}: {threads} thread(s) ...")
+                try:
+                    measured = self._run(path, threads, options, batch_sizes)
+                except Exception as e:
+                    self.stdout.write(self.style.ERROR(f"  {name} failed: {e}"))
+                    result["error"] = str(e)
+                    break
+                # Load time and memory are reported for the largest thread count
+                for key in ("load_ms", "peak_rss_mb", "model_rss_mb"):
+                    result[key] = measured[key]
+                for batch_size, latency in measured["latency"].items():
+                    result["runs"].append({"threads": threads, "batch_size": batch_size, **latency})
+                probabilities[name] = measured["probabilities"]
+
+            if name in probabilities:
+                result["accuracy"] = accuracy(probabilities[name], labels)
+            report["variants"][name] = result
+
+        for name, probs in probabilities.items():
+            report["variants"][name]["divergence"] = {
+                other: agreement(probs, other_probs)
+                for other, other_probs in probabilities.items()
+                if other != name
+            }
+
+        self._print(report)
+        for path in (options["output"], options["save_baseline"]):
+            if path:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                with open(path, "w") as f:
+                    json.dump(report, f, indent=2)
+                self.stdout.write(self.style.SUCCESS(f"Report written to {path}"))
+
+        if options["compare"]:
+            self._compare(report, options)
+
+    # ── Regression Gate ──
+
+    def _compare(self, report: dict, options) -> None:
+        try:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read baseline {options['compare']}: {e}")
+
+        same_host = baseline.get("host") == report["host"]
+        if not same_host:
+            self.stdout.write(
+                self.style.WARNING("Baseline was recorded on another host; latency is not compared.")
+            )
+
+        regressions = []
+        for name, result in report["variants"].items():
+            base = baseline.get("variants", {}).get(name)
+            if base is None or "error" in base:
+                continue
+            if "error" in result:
+                regressions.append(f"{name}: failed ({result['error']})")
+                continue
+            if result["sha256"] != base.get("sha256"):
+                regressions.append(
+                    f"{name}: model changed ({base.get('size_bytes')} → {result['size_bytes']} bytes); "
+                    "re-save the baseline if intended"
+                )
+            if result.get("accuracy") is not None and base.get("accuracy") is not None:
+                if result["accuracy"] < base["accuracy"] - options["accuracy_tolerance"]:
+                    regressions.append(
+                        f"{name}: accuracy {base['accuracy']} → {result['accuracy']}"
+                    )
+            if not same_host:
+                continue
+            base_runs = {(run["threads"], run["batch_size"]): run for run in base.get("runs", [])}
+            for run in result["runs"]:
+                base_run = base_runs.get((run["threads"], run["batch_size"]))
+                if base_run is None:
+                    continue
+                limit = base_run["p50"] * (1 + options["latency_tolerance"])
+                if run["p50"] > limit:
+                    regressions.append(
+                        f"{name}: p50 at batch {run['batch_size']}, {run['threads']} thread(s) "
+                        f"{base_run['p50']} → {run['p50']} ms"
+                    )
+
+        if regressions:
+            for line in regressions:
+                self.stdout.write(self.style.ERROR(f"  {line}"))
+            raise CommandError(f"{len(regressions)} regression(s) against {options['compare']}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {options['compare']}."))
+
+    # ── Output ──
+
+    def _print(self, report: dict) -> None:
+        self.stdout.write(
+            f"\n{'variant':<18}{'size KB':>10}{'load ms':>10}{'peak MB':>10}"
+            f"{'model MB':>10}{'accuracy':>10}"
+        )
+        for name, result in report["variants"].items():
+            if "error" in result:
+                self.stdout.write(f"{name:<18}{'failed':>10}")
+                continue
+            self.stdout.write(
+                f"{name:<18}{result['size_bytes'] / 1024:>10.0f}{result['load_ms']:>10.0f}"
+                f"{result['peak_rss_mb'] or 0:>10.0f}{result['model_rss_mb'] or 0:>10.0f}"
+                f"{'—' if result.get('accuracy') is None else result['accuracy']:>10}"
+            )
+
+        self.stdout.write(
+            f"\n{'variant':<18}{'threads':>8}{'batch':>6}{'p50 ms':>10}{'p95 ms':>10}"
+            f"{'p99 ms':>10}{'img/s':>10}"
+        )
+        for name, result in report["variants"].items():
+            for run in result["runs"]:
+                self.stdout.write(
+                    f"{name:<18}{run['threads']:>8}{run['batch_size']:>6}{run['p50']:>10}"
+                    f"{run['p95']:>10}{run['p99']:>10}{run['images_per_sec']:>10}"
+                )
+
+        names = [name for name, result in report["variants"].items() if "divergence" in result]
+        if len(names) > 1:
+            self.stdout.write("\nTop-1 agreement")
+            self.stdout.write(f"{'':<18}" + "".join(f"{name[:14]:>15}" for name in names))
+            for name in names:
+                divergence = report["variants"][name]["divergence"]
+                cells = [
+                    "—" if other == name else f"{divergence[other]['top1_agreement']}"
+                    for other in names
+                ]
+                self.stdout.write(f"{name:<18}" + "".join(f"{cell:>15}" for cell in cells))
@@ -0,0 +1,63 @@
+"""
+LeafLens - Keras Serving Mode Benchmark
+@Maharsh Doshi
+
+Compares the per-call latency of the Keras serving modes
+(model.predict vs. traced graph vs. XLA-compiled graph) on the
+configured model, at several batch sizes.
+
+    python manage.py benchmark_serving
+    python manage.py benchmark_serving --batch-sizes 1,3,8 --repeats 200
+"""
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from prediction.benchmarking import latency_report, time_calls
+from prediction.ml_model import IMAGE_SIZE, SERVING_MODES, run_model, warm_up_serving_graph
+
+
+class Command(BaseCommand):
+    help = "Benchmark Keras serving modes (predict / function / xla)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-sizes", default="1,4,16")
+        parser.add_argument("--repeats", type=int, default=100)
+        parser.add_argument(
+            "--modes", default=",".join(SERVING_MODES), help="Comma-separated modes."
+        )
+
+    def handle(self, *args, **options):
+        batch_sizes = [int(size) for size in options["batch_sizes"].split(",")]
+        modes = options["modes"].split(",")
+        rng = np.random.default_rng(0)
+        batches = {
+            size: rng.random((size,) + IMAGE_SIZE + (3,), dtype=np.float32)
+            for size in batch_sizes
+        }
+
+        reference = {}
+        self.stdout.write(
+            f"{'mode':<10}{'batch':>6}{'p50 ms':>10}{'p95 ms':>10}{'img/s':>10}{'max |Δp|':>11}"
+        )
+        for mode in modes:
+            try:
+                warm_up_serving_graph(mode)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{mode}: unavailable ({e})"))
+                continue
+
+            for batch_size in batch_sizes:
+                batch = batches[batch_size]
+                probs = run_model(batch, mode=mode)
+                reference.setdefault(batch_size, probs)
+                diff = float(np.abs(probs - reference[batch_size]).max())
+
+                report = latency_report(
+                    time_calls(lambda: run_model(batch, mode=mode), options["repeats"]),
+                    batch_size,
+                )
+                self.stdout.write(
+                    f"{mode:<10}{batch_size:>6}{report['p50']:>10.2f}{report['p95']:>10.2f}"
+                    f"{report['images_per_sec']:>10.1f}{diff:>11.2e}"
+                )
@@ -0,0 +1,98 @@
+"""
+LeafLens - Test-Time Augmentation Evaluation Command
+@Maharsh Doshi
+
+Measures what adaptive TTA buys on a labelled local image set:
+accuracy without TTA, with TTA on every image, and with TTA only
+below the confidence threshold — plus the latency each costs.
+
+    python manage.py evaluate_tta ../test_images_from_internet
+    python manage.py evaluate_tta /data/PlantVillage --threshold 60
+"""
+
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.datasets import iter_labelled_images
+from prediction.ml_model import apply_tta, preprocess_image, run_model
+
+
+class Command(BaseCommand):
+    help = "Report accuracy gain and latency overhead of test-time augmentation."
+
+    def add_arguments(self, parser):
+        parser.add_argument("image_dir", help="Folder of labelled leaf images.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=None,
+            help="Confidence %% below which TTA is applied "
+            "(default: ML_TTA_CONFIDENCE_THRESHOLD).",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None, help="Evaluate at most N images."
+        )
+
+    def handle(self, *args, **options):
+        threshold = options["threshold"]
+        if threshold is None:
+            threshold = settings.ML_TTA_CONFIDENCE_THRESHOLD
+
+        correct_base = correct_tta = correct_adaptive = 0
+        base_ms, tta_ms = [], []
+        triggered = 0
+        total = 0
+
+        for path, label in iter_labelled_images(options["image_dir"]):
+            if options["limit"] is not None and total >= options["limit"]:
+                break
+            with open(path, "rb") as f:
+                img_batch = preprocess_image(f.read())
+
+            start = time.perf_counter()
+            base = run_model(img_batch)[0]
+            base_ms.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            averaged = apply_tta(img_batch, base)
+            tta_ms.append((time.perf_counter() - start) * 1000)
+
+            base_pred = int(np.argmax(base))
+            tta_pred = int(np.argmax(averaged))
+            use_tta = float(base.max()) * 100 < threshold
+            adaptive_pred = tta_pred if use_tta else base_pred
+
+            total += 1
+            triggered += use_tta
+            correct_base += base_pred == label
+            correct_tta += tta_pred == label
+            correct_adaptive += adaptive_pred == label
+
+        if total == 0:
+            raise CommandError("No labelled images found.")
+
+        mean_base = float(np.mean(base_ms))
+        mean_tta = float(np.mean(tta_ms))
+        trigger_rate = triggered / total
+
+        self.stdout.write(f"Images evaluated:         {total}")
+        self.stdout.write(f"Confidence threshold:     {threshold:.1f}%")
+        self.stdout.write(f"Accuracy (single pass):   {correct_base / total:.2%}")
+        self.stdout.write(f"Accuracy (TTA always):    {correct_tta / total:.2%}")
+        self.stdout.write(f"Accuracy (adaptive TTA):  {correct_adaptive / total:.2%}")
+        self.stdout.write(f"TTA trigger rate:         {trigger_rate:.1%}")
+        self.stdout.write(f"Single pass latency:      {mean_base:.1f} ms")
+        self.stdout.write(f"TTA pass latency:         {mean_tta:.1f} ms")
+        self.stdout.write(
+            f"Adaptive mean overhead:   {mean_tta * trigger_rate:.1f} ms/image "
+            f"(+{mean_tta * trigger_rate / max(mean_base, 1e-9):.0%})"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Adaptive TTA accuracy gain: "
+                f"{(correct_adaptive - correct_base) / total:+.2%}"
+            )
+        )
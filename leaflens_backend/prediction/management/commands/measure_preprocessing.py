@@ -0,0 +1,102 @@
+"""
+LeafLens - Preprocessing Allocation Measurement
+@Maharsh Doshi
+
+Measures the memory each request's preprocessing allocates, comparing
+the original path (uint8 array → float64 "/ 255.0" → expand_dims) with
+the pooled path (uint8 array scaled straight into a reused float32
+buffer, see prediction/buffers.py).
+
+    python manage.py measure_preprocessing
+    python manage.py measure_preprocessing --image leaf.jpg --iterations 500
+
+Reports the peak traced bytes per call (tracemalloc) and the latency.
+Decoding (PIL) is measured separately, since both paths share it.
+"""
+
+import tracemalloc
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from prediction.benchmarking import latency_report, time_calls
+from prediction.buffers import get_input_pool
+from prediction.datasets import iter_image_paths
+from prediction.ml_model import IMAGE_SIZE, decode_image, normalize_image
+
+
+def _legacy_preprocess(image_bytes: bytes) -> np.ndarray:
+    """The original preprocess_image(), kept here as the baseline."""
+    image = Image.open(BytesIO(image_bytes)).convert("RGB")
+    image = image.resize(IMAGE_SIZE)
+    img_array = np.array(image) / 255.0
+    return np.expand_dims(img_array, axis=0)
+
+
+def _pooled_preprocess(image_bytes: bytes) -> None:
+    pixels = decode_image(image_bytes)
+    with get_input_pool().borrow() as img_batch:
+        normalize_image(pixels, out=img_batch)
+
+
+def _peak_bytes(fn, iterations: int) -> int:
+    """Largest peak of traced memory above the starting point over the calls."""
+    fn()  # warm-up: fills the pool, loads the model for its input scale
+    tracemalloc.start()
+    try:
+        worst = 0
+        for _ in range(iterations):
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn()
+            worst = max(worst, tracemalloc.get_traced_memory()[1] - baseline)
+        return worst
+    finally:
+        tracemalloc.stop()
+
+
+class Command(BaseCommand):
+    help = "Measure per-request preprocessing allocations (original vs pooled)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--image", help="Image to preprocess (default: first sample image).")
+        parser.add_argument("--iterations", type=int, default=200)
+
+    def handle(self, *args, **options):
+        path = options["image"] or next(
+            iter_image_paths(str(settings.PROJECT_ROOT / "test_images_from_internet")), None
+        )
+        if path is None:
+            raise CommandError("No image found; pass --image.")
+        with open(path, "rb") as f:
+            image_bytes = f.read()
+
+        iterations = options["iterations"]
+        stages = [
+            ("decode only (shared)", lambda: decode_image(image_bytes)),
+            ("original", lambda: _legacy_preprocess(image_bytes)),
+            ("pooled", lambda: _pooled_preprocess(image_bytes)),
+        ]
+
+        self.stdout.write(f"Image: {path} | {iterations} iterations")
+        self.stdout.write(f"{'path':<22}{'peak KB/call':>14}{'p50 ms':>10}{'p95 ms':>10}")
+        peaks = {}
+        for name, fn in stages:
+            peaks[name] = _peak_bytes(fn, iterations)
+            report = latency_report(time_calls(fn, iterations), 1)
+            self.stdout.write(
+                f"{name:<22}{peaks[name] / 1024:>14.1f}{report['p50']:>10.3f}{report['p95']:>10.3f}"
+            )
+
+        decode = peaks["decode only (shared)"]
+        saved = peaks["original"] - peaks["pooled"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Pooled path allocates {saved / 1024:.1f} KB less per request "
+                f"({(peaks['pooled'] - decode) / 1024:.1f} KB beyond decoding, vs "
+                f"{(peaks['original'] - decode) / 1024:.1f} KB originally)."
+            )
+        )
@@ -0,0 +1,232 @@
+"""
+LeafLens - Model Quantization & Optimization Command
+@Maharsh Doshi
+
+Reproducible replacement for the training/tf-lite-conversion-*.ipynb
+notebooks. Converts a source model into TFLite variants and reports
+the speed / size / accuracy trade-off of each:
+
+    float32        — plain conversion, used as the reference
+    float16        — weights stored as float16
+    dynamic_range  — int8 weights, float activations
+    full_integer   — int8 weights and activations, uint8 input/output,
+                     calibrated on local images
+
+    python manage.py optimize_model --source ../potatoes.h5
+    python manage.py optimize_model --source ../saved_models/3 \\
+        --calibration-dir /data/PlantVillage --eval-dir /data/holdout
+
+Writes <output-dir>/<variant>.tflite plus report.json and report.md.
+"""
+
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.benchmarking import (
+    TFLiteRunner,
+    accuracy,
+    agreement,
+    input_scale_for,
+    latency_report,
+    load_eval_images,
+    predict_in_batches,
+    time_calls,
+)
+
+VARIANTS = ["float32", "float16", "dynamic_range", "full_integer"]
+
+
+class Command(BaseCommand):
+    help = "Convert a model to quantized TFLite variants and benchmark them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--source",
+            default=settings.ML_MODEL_PATH,
+            help="potatoes.h5 or a saved_models/<n> directory (default: ML_MODEL_PATH).",
+        )
+        parser.add_argument(
+            "--calibration-dir",
+            default=str(settings.PROJECT_ROOT / "test_images_from_internet"),
+            help="Images for full-integer calibration.",
+        )
+        parser.add_argument("--calibration-size", type=int, default=200)
+        parser.add_argument(
+            "--eval-dir",
+            help="Images for agreement/accuracy (default: the calibration dir).",
+        )
+        parser.add_argument("--eval-size", type=int, default=500)
+        parser.add_argument("--output-dir", help="Where to write variants and reports.")
+        parser.add_argument("--threads", type=int, default=None, help="Interpreter threads.")
+        parser.add_argument("--repeats", type=int, default=50, help="Timed runs per variant.")
+        parser.add_argument("--batch-size", type=int, default=8, help="Throughput batch size.")
+
+    # ── Conversion ──
+
+    def _converter(self, source: str):
+        import tensorflow as tf
+
+        if os.path.isdir(source):
+            return tf.lite.TFLiteConverter.from_saved_model(source)
+        model = tf.keras.models.load_model(source, compile=False)
+        return tf.lite.TFLiteConverter.from_keras_model(model)
+
+    def _convert(self, source: str, variant: str, calibration: np.ndarray) -> bytes:
+        import tensorflow as tf
+
+        converter = self._converter(source)
+        input_scale = input_scale_for(source)
+
+        if variant == "float16":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == "dynamic_range":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        elif variant == "full_integer":
+
+            def representative_dataset():
+                for pixels in calibration:
+                    yield [pixels[np.newaxis].astype(np.float32) * input_scale]
+
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.uint8
+            converter.inference_output_type = tf.uint8
+
+        return converter.convert()
+
+    # ── Benchmark ──
+
+    def _benchmark(self, runner, size_bytes, eval_pixels, labels, reference, options):
+        single = eval_pixels[:1]
+        batch = eval_pixels[: options["batch_size"]]
+        probs = predict_in_batches(runner, eval_pixels, options["batch_size"])
+
+        result = {
+            "size_bytes": size_bytes,
+            "size_kb": round(size_bytes / 1024, 1),
+            "latency_batch1_ms": latency_report(
+                time_calls(lambda: runner.predict(single), options["repeats"]), 1
+            ),
+            "batch_size": len(batch),
+            "latency_batch_ms": latency_report(
+                time_calls(lambda: runner.predict(batch), max(options["repeats"] // 5, 3)),
+                len(batch),
+            ),
+            "accuracy": accuracy(probs, labels),
+        }
+        if reference is not None:
+            result.update(agreement(probs, reference))
+        return result, probs
+
+    def handle(self, *args, **options):
+        source = os.path.abspath(options["source"])
+        if not os.path.exists(source):
+            raise CommandError(f"Source model not found: {source}")
+
+        tag = os.path.basename(source.rstrip("/")).replace(".", "_")
+        output_dir = options["output_dir"] or os.path.join(
+            settings.TFLITE_MODELS_DIR, "optimized", tag
+        )
+        os.makedirs(output_dir, exist_ok=True)
+
+        try:
+            calibration, _ = load_eval_images(
+                options["calibration_dir"], options["calibration_size"]
+            )
+            eval_pixels, labels = load_eval_images(
+                options["eval_dir"] or options["calibration_dir"], options["eval_size"]
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if not options["eval_dir"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    "Evaluating on the calibration images; pass --eval-dir for a held-out set."
+                )
+            )
+        self.stdout.write(
+            f"Source: {source} | calibration: {len(calibration)} images | "
+            f"evaluation: {len(eval_pixels)} images"
+        )
+
+        report = {
+            "source": source,
+            "reference": "float32",
+            "calibration_images": len(calibration),
+            "eval_images": len(eval_pixels),
+            "labelled_eval_images": int((labels >= 0).sum()),
+            "threads": options["threads"],
+            "variants": {},
+        }
+        reference = None
+
+        for variant in VARIANTS:
+            self.stdout.write(f"Converting {variant} ...")
+            try:
+                content = self._convert(source, variant, calibration)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"  {variant} conversion failed: {e}"))
+                report["variants"][variant] = {"error": str(e)}
+                continue
+
+            path = os.path.join(output_dir, f"{variant}.tflite")
+            with open(path, "wb") as f:
+                f.write(content)
+
+            runner = TFLiteRunner(
+                model_content=content,
+                num_threads=options["threads"],
+                input_scale=input_scale_for(source),
+            )
+            result, probs = self._benchmark(
+                runner, len(content), eval_pixels, labels, reference, options
+            )
+            if variant == "float32":
+                reference = probs
+                result.update(agreement(probs, probs))
+            result["path"] = path
+            report["variants"][variant] = result
+            self.stdout.write(
+                f"  {result['size_kb']} KB, p50 {result['latency_batch1_ms']['p50']} ms, "
+                f"agreement {result.get('top1_agreement')}"
+            )
+
+        with open(os.path.join(output_dir, "report.json"), "w") as f:
+            json.dump(report, f, indent=2)
+        with open(os.path.join(output_dir, "report.md"), "w") as f:
+            f.write(self._markdown(report, options["batch_size"]))
+
+        self.stdout.write(self.style.SUCCESS(f"Report written to {output_dir}/report.md"))
+        self.stdout.write(self._markdown(report, options["batch_size"]))
+
+    def _markdown(self, report: dict, batch_size: int) -> str:
+        lines = [
+            f"# Model optimization report: `{os.path.basename(report['source'])}`",
+            "",
+            f"Calibration images: {report['calibration_images']} · "
+            f"evaluation images: {report['eval_images']} "
+            f"({report['labelled_eval_images']} labelled) · reference: float32",
+            "",
+            f"| Variant | Size (KB) | p50 / p95 batch 1 (ms) | Throughput batch {batch_size} (img/s) "
+            "| Top-1 agreement | Mean \\|Δp\\| | Accuracy |",
+            "|---|---|---|---|---|---|---|",
+        ]
+        for variant, result in report["variants"].items():
+            if "error" in result:
+                lines.append(f"| {variant} | — | conversion failed | — | — | — | — |")
+                continue
+            single = result["latency_batch1_ms"]
+            batched = result["latency_batch_ms"]
+            lines.append(
+                f"| {variant} | {result['size_kb']} | {single['p50']} / {single['p95']} "
+                f"| {batched['images_per_sec']} | {result.get('top1_agreement', '—')} "
+                f"| {result.get('mean_abs_prob_diff', '—')} | {result['accuracy'] if result['accuracy'] is not None else '—'} |"
+            )
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,47 @@
+"""
+LeafLens - Weather Prefetch Command
+@Maharsh Doshi
+
+Runs the weather prefetcher as a standalone process (recommended in
+production, so the web workers never spend time on it).
+
+    python manage.py prefetch_weather            # loop forever
+    python manage.py prefetch_weather --once     # single refresh cycle
+"""
+
+from django.core.management.base import BaseCommand
+
+from prediction.weather_prefetch import WeatherPrefetcher
+
+
+class Command(BaseCommand):
+    help = "Refresh cached weather for regions with recent scans."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Run a single cycle and exit."
+        )
+        parser.add_argument("--interval", type=int, help="Seconds between cycles.")
+        parser.add_argument(
+            "--lookback-hours", type=int, help="How far back to look for active regions."
+        )
+        parser.add_argument(
+            "--max-regions", type=int, help="Maximum regions refreshed per cycle."
+        )
+
+    def handle(self, *args, **options):
+        prefetcher = WeatherPrefetcher(
+            interval=options["interval"],
+            lookback_hours=options["lookback_hours"],
+            max_regions=options["max_regions"],
+        )
+
+        if options["once"]:
+            summary = prefetcher.run_once()
+            self.stdout.write(self.style.SUCCESS(f"Prefetch complete: {summary}"))
+            return
+
+        try:
+            prefetcher.run_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Weather prefetcher stopped.")
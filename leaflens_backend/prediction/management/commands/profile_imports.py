@@ -0,0 +1,157 @@
+"""
+LeafLens - Import-Time Profile
+@Maharsh Doshi
+
+Reports what a cold worker spends importing, using Python's
+`-X importtime` in a fresh interpreter. Imports are split into the
+phases a worker goes through:
+
+    startup           — interpreter, settings, installed apps, models
+    urlconf           — URLconf and views (everything before the first request)
+    inference         — what the first prediction imports (see warmup.py)
+
+    python manage.py profile_imports
+    python manage.py profile_imports --by module --top 25
+    python manage.py profile_imports --check     (fail if startup loads NumPy/PIL/TF)
+
+Each module is counted in the first phase that imports it.
+"""
+
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Modules the first prediction imports (views.py and warmup.py import them lazily)
+INFERENCE_MODULES = [
+    "prediction.image_store",
+    "prediction.image_validator",
+    "prediction.ml_model",
+    "prediction.tiling",
+    "prediction.weather_service",
+    "tensorflow",
+]
+
+# Packages that must not load before the first inference request.
+# (requests is not listed: Django REST framework imports it itself.)
+INFERENCE_ONLY_PACKAGES = ("numpy", "PIL", "tensorflow", "keras")
+
+REPORTED_PACKAGES = INFERENCE_ONLY_PACKAGES + ("requests",)
+
+PHASE_MARKER = "leaflens-phase"
+
+PROFILE_SCRIPT = """
+import importlib, sys, time
+start = time.perf_counter()
+def phase(name):
+    global start
+    sys.stderr.write(f"{marker} {{name}} {{(time.perf_counter() - start) * 1000:.1f}}\\n")
+    start = time.perf_counter()
+import django
+django.setup()
+phase("startup")
+from django.conf import settings
+importlib.import_module(settings.ROOT_URLCONF)
+phase("urlconf")
+for name in {modules!r}:
+    importlib.import_module(name)
+phase("inference")
+"""
+
+
+def parse_importtime(output: str) -> list[dict]:
+    """
+    Splits `-X importtime` output into phases:
+    [{"name", "wall_ms", "imports": [(module, self_us), ...]}, ...]
+    """
+    phases, imports = [], []
+    for line in output.splitlines():
+        if line.startswith(PHASE_MARKER):
+            name, wall_ms = line[len(PHASE_MARKER) + 1 :].rsplit(" ", 1)
+            phases.append({"name": name, "wall_ms": float(wall_ms), "imports": imports})
+            imports = []
+        elif line.startswith("import time:"):
+            self_us, _, module = line[len("import time:") :].split("|")
+            if self_us.strip().isdigit():
+                imports.append((module.strip(), int(self_us)))
+    return phases
+
+
+class Command(BaseCommand):
+    help = "Profile module import times for a cold worker (startup, urlconf, inference)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=12, help="Rows per phase.")
+        parser.add_argument(
+            "--by", choices=["package", "module"], default="package",
+            help="Group import time by top-level package or list single modules.",
+        )
+        parser.add_argument(
+            "--skip-tensorflow", action="store_true",
+            help="Leave TensorFlow out of the inference phase (it takes seconds).",
+        )
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Exit with an error if NumPy, PIL or TensorFlow load before inference.",
+        )
+
+    def handle(self, *args, **options):
+        modules = [
+            name for name in INFERENCE_MODULES
+            if not (options["skip_tensorflow"] and name == "tensorflow")
+        ]
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": os.environ.get(
+                "DJANGO_SETTINGS_MODULE", "leaflens_backend.settings"
+            ),
+            "TF_CPP_MIN_LOG_LEVEL": "2",
+        }
+        result = subprocess.run(
+            [
+                sys.executable, "-X", "importtime", "-c",
+                PROFILE_SCRIPT.format(marker=PHASE_MARKER, modules=modules),
+            ],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Profiling interpreter failed:\n{result.stderr[-2000:]}")
+
+        early_heavy = set()
+        for phase in parse_importtime(result.stderr):
+            totals = defaultdict(int)
+            for module, self_us in phase["imports"]:
+                key = module if options["by"] == "module" else module.split(".")[0]
+                totals[key] += self_us
+            import_ms = sum(totals.values()) / 1000
+            packages = {module.split(".")[0] for module, _ in phase["imports"]}
+            heavy = [name for name in REPORTED_PACKAGES if name in packages]
+            if phase["name"] != "inference":
+                early_heavy.update(packages.intersection(INFERENCE_ONLY_PACKAGES))
+
+            self.stdout.write(
+                self.style.MIGRATE_HEADING(
+                    f"{phase['name']}: {phase['wall_ms']:.0f} ms wall, "
+                    f"{import_ms:.0f} ms importing {len(phase['imports'])} modules"
+                )
+            )
+            if heavy:
+                self.stdout.write(f"  loads: {', '.join(heavy)}")
+            ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+            for name, self_us in ranked[: options["top"]]:
+                share = 100 * self_us / 1000 / import_ms if import_ms else 0
+                self.stdout.write(f"  {name:<48}{self_us / 1000:>9.1f} ms{share:>6.1f}%")
+
+        if early_heavy:
+            message = f"Loaded before the first inference request: {', '.join(sorted(early_heavy))}"
+            if options["check"]:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS("No inference-only packages load at startup."))
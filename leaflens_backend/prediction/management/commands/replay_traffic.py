@@ -0,0 +1,277 @@
+"""
+LeafLens - Captured Traffic Replay
+@Maharsh Doshi
+
+Re-drives requests recorded by the traffic capture (see
+prediction/traffic_capture.py) against a running instance, in their
+original order and spacing (or scaled with --speed), and reports the
+latency distribution. Run the target with WEATHER_STUB=true so the
+weather API neither adds noise nor spends quota, and give the replay
+an API key with a 0 rate-limit multiplier:
+
+    RATE_LIMIT_API_KEYS=replay=0 WEATHER_STUB=true python manage.py runserver
+
+The target answers an image it has seen from the result cache, so
+restart it (or clear its cache) before each replay, or the second run
+measures cache hits.
+
+    python manage.py replay_traffic traffic_capture/ --api-key replay --output before.json
+    python manage.py replay_traffic traffic_capture/ --api-key replay --speed 4 \\
+        --compare before.json --max-regression 0.10
+
+Three latencies are reported per request:
+
+    latency     request sent → response body read
+    ttfb        request sent → response headers (first event when streamed)
+    scheduled   when the capture says the request should have been sent →
+                response body read; includes queueing when the replay
+                cannot keep up, so overload is not hidden
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.metrics import summarize
+from prediction.traffic_capture import REPLAY_HEADER, load_capture
+
+COMPARED_PERCENTILES = ("p50", "p95", "p99")
+
+
+def _answered_from_cache(body: bytes, content_type: str) -> bool:
+    """Whether a predict response (JSON, or any of its SSE/NDJSON events) says "cached"."""
+    try:
+        if content_type.startswith("text/event-stream"):
+            messages = [json.loads(line[5:]) for line in body.splitlines() if line.startswith(b"data:")]
+        elif content_type.startswith("application/x-ndjson"):
+            messages = [json.loads(line)["data"] for line in body.splitlines() if line.strip()]
+        else:
+            messages = [json.loads(body)]
+    except (ValueError, KeyError, TypeError):
+        return False
+    return any(isinstance(message, dict) and message.get("cached") is True for message in messages)
+
+
+class Command(BaseCommand):
+    help = "Replay captured /api/predict/ traffic against an instance and compare latencies."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths", nargs="*",
+            help="Capture files or directories (default: TRAFFIC_CAPTURE_DIR).",
+        )
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Target instance.")
+        parser.add_argument(
+            "--speed", type=float, default=1.0,
+            help="Replay rate relative to capture (2 = twice as fast, 0 = as fast as possible).",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight.")
+        parser.add_argument("--limit", type=int, help="Replay only the first N requests.")
+        parser.add_argument("--api-key", help="Sent as X-API-Key (see RATE_LIMIT_API_KEYS).")
+        parser.add_argument("--timeout", type=float, default=60.0, help="Per-request seconds.")
+        parser.add_argument("--label", default="", help="Build name stored in the report.")
+        parser.add_argument("--output", help="Write the report as JSON.")
+        parser.add_argument("--compare", help="Report JSON of a previous replay.")
+        parser.add_argument(
+            "--max-regression", type=float, default=None,
+            help="Fail if p50 or p95 latency grew by more than this fraction (0.1 = 10%%).",
+        )
+
+    # ── Replay ──
+
+    def _send(self, session_for, url, meta, payload, headers, timeout, scheduled_at):
+        session = session_for()
+        query = f"?{meta['query']}" if meta.get("query") else ""
+        if meta.get("filename") is None:
+            # A raw tensor upload: the payload is the body as received
+            send = {"data": payload, "headers": {**headers, "Content-Type": meta["content_type"]}}
+        else:
+            files = {"file": (meta["filename"], payload, meta["content_type"])}
+            send = {"data": meta.get("fields", {}), "files": files, "headers": headers}
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                f"{url}{meta['path']}{query}",
+                timeout=timeout,
+                stream=True,
+                **send,
+            )
+            ttfb = time.perf_counter() - start
+            body = response.content  # The whole body, streamed or not
+            status = response.status_code
+            response_type = response.headers.get("Content-Type", "")
+        except requests.RequestException as e:
+            ttfb, status, body, response_type = None, type(e).__name__, b"", ""
+        end = time.perf_counter()
+        return {
+            "status": status,
+            "content_type": meta["content_type"].split(";")[0],  # without tensor parameters
+            "latency_ms": (end - start) * 1000,
+            "ttfb_ms": ttfb * 1000 if ttfb is not None else None,
+            "scheduled_ms": (end - scheduled_at) * 1000,
+            "captured_ms": meta.get("duration_ms"),
+            "cached": _answered_from_cache(body, response_type),
+        }
+
+    def _replay(self, records, options) -> tuple[list[dict], float]:
+        local = threading.local()
+
+        def session_for():
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            return local.session
+
+        headers = {REPLAY_HEADER: "1"}
+        if options["api_key"]:
+            headers["X-API-Key"] = options["api_key"]
+        url = options["url"].rstrip("/")
+        speed = options["speed"]
+        first = records[0][0]["received_at"]
+
+        futures = []
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            for meta, payload in records:
+                scheduled_at = started
+                if speed > 0:
+                    scheduled_at = started + (meta["received_at"] - first) / speed
+                    delay = scheduled_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                futures.append(
+                    pool.submit(
+                        self._send, session_for, url, meta, payload, headers,
+                        options["timeout"], scheduled_at,
+                    )
+                )
+        return [future.result() for future in futures], time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or [str(settings.TRAFFIC_CAPTURE_DIR)]
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            raise CommandError(f"Not found: {', '.join(missing)}")
+        try:
+            records = load_capture(paths)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options["limit"]:
+            records = records[: options["limit"]]
+        if not records:
+            raise CommandError("No captured requests to replay.")
+
+        span = records[-1][0]["received_at"] - records[0][0]["received_at"]
+        self.stdout.write(
+            f"Replaying {len(records)} requests captured over {span:.0f} s "
+            f"against {options['url']} (speed {options['speed'] or 'max'}, "
+            f"concurrency {options['concurrency']})"
+        )
+        results, elapsed = self._replay(records, options)
+        report = self._report(results, elapsed, options)
+        self._print(report)
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}"))
+        if options["compare"]:
+            self._compare(report, options)
+
+    # ── Report ──
+
+    def _report(self, results: list[dict], elapsed: float, options) -> dict:
+        ok = [result for result in results if result["status"] == 200]
+        by_type = defaultdict(list)
+        for result in ok:
+            by_type[result["content_type"]].append(result["latency_ms"])
+        return {
+            "label": options["label"],
+            "url": options["url"],
+            "speed": options["speed"],
+            "concurrency": options["concurrency"],
+            "requests": len(results),
+            "duration_s": round(elapsed, 2),
+            "achieved_rps": round(len(results) / max(elapsed, 1e-9), 2),
+            "status": dict(Counter(str(result["status"]) for result in results)),
+            "cached": sum(result["cached"] for result in ok),
+            "latency_ms": summarize([result["latency_ms"] for result in ok]),
+            "ttfb_ms": summarize([result["ttfb_ms"] for result in ok]),
+            "scheduled_ms": summarize([result["scheduled_ms"] for result in ok]),
+            "captured_ms": summarize(
+                [result["captured_ms"] for result in ok if result["captured_ms"] is not None]
+            ),
+            "by_content_type": {name: summarize(values) for name, values in by_type.items()},
+        }
+
+    def _print(self, report: dict) -> None:
+        statuses = ", ".join(f"{status}: {count}" for status, count in report["status"].items())
+        self.stdout.write(
+            f"{report['requests']} requests in {report['duration_s']} s "
+            f"({report['achieved_rps']} req/s) | {statuses} | {report['cached']} cached"
+        )
+        self.stdout.write(f"{'':<22}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        rows = [(name, report[name]) for name in ("latency_ms", "ttfb_ms", "scheduled_ms", "captured_ms")]
+        rows += [(f"  {name}", summary) for name, summary in report["by_content_type"].items()]
+        for name, summary in rows:
+            if not summary.get("count"):
+                continue
+            self.stdout.write(
+                f"{name:<22}{summary['p50']:>10}{summary['p95']:>10}"
+                f"{summary['p99']:>10}{summary['max']:>10}"
+            )
+
+    def _compare(self, report: dict, options) -> None:
+        try:
+            with open(options["compare"]) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {options['compare']}: {e}")
+
+        if baseline["requests"] != report["requests"] or baseline["speed"] != report["speed"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Baseline replayed {baseline['requests']} requests at speed "
+                    f"{baseline['speed']}; this run {report['requests']} at {report['speed']}."
+                )
+            )
+
+        if baseline.get("cached") != report["cached"]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Cached predictions differ: {baseline.get('cached')} in the baseline, "
+                    f"{report['cached']} now. Restart the target (or clear its cache) "
+                    "before each replay."
+                )
+            )
+
+        name = baseline.get("label") or options["compare"]
+        self.stdout.write(f"\nvs {name}{'base ms':>16}{'this ms':>10}{'change':>9}")
+        regressions = []
+        for metric in ("latency_ms", "ttfb_ms", "scheduled_ms"):
+            base, current = baseline.get(metric, {}), report[metric]
+            if not base.get("count") or not current.get("count"):
+                continue
+            for percentile in COMPARED_PERCENTILES:
+                change = current[percentile] / max(base[percentile], 1e-9) - 1
+                self.stdout.write(
+                    f"{metric + ' ' + percentile:<22}{base[percentile]:>10}"
+                    f"{current[percentile]:>10}{change:>+9.1%}"
+                )
+                limit = options["max_regression"]
+                if (
+                    limit is not None
+                    and metric == "latency_ms"
+                    and percentile in ("p50", "p95")
+                    and change > limit
+                ):
+                    regressions.append(f"{metric} {percentile} {change:+.1%}")
+
+        if regressions:
+            raise CommandError(f"Latency regressed against {name}: {', '.join(regressions)}")
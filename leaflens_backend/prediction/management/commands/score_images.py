@@ -0,0 +1,342 @@
+"""
+LeafLens - Offline Bulk Scoring Command
+@Maharsh Doshi
+
+Re-scores an archive of scan images without going through HTTP.
+
+    python manage.py score_images /data/scans --output scores.csv
+    python manage.py score_images manifest.txt --output scores_parquet/ --format parquet
+    python manage.py score_images /data/scans --output scores.csv --resume
+
+Pipeline:
+    paths (streamed, never listed in full)
+      → process pool: decode + resize + leaf check, one chunk of paths per task
+      → main process: fixed-size batches through the model backend
+      → CSV rows / Parquet part files written incrementally
+      → checkpoint after every flush, so --resume continues where it stopped
+
+Only a bounded window of decoded chunks is in flight at any time, so
+memory stays flat no matter how large the archive is.
+"""
+
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from prediction.datasets import IMAGE_EXTENSIONS, iter_image_paths
+from prediction.buffers import fill_input
+from prediction.image_validator import validate_leaf_array
+from prediction.ml_model import (
+    CLASS_NAMES,
+    IMAGE_SIZE,
+    decode_image,
+    model_input_scale,
+    run_model,
+)
+
+OUTPUT_COLUMNS = ["path", "status", "disease_class", "confidence", "leaf_score", "error"] + [
+    f"p_{name.lower().replace(' ', '_')}" for name in CLASS_NAMES
+]
+
+STRING_COLUMNS = {"path", "status", "disease_class", "error"}
+
+# Seconds between progress lines
+PROGRESS_INTERVAL = 10
+
+
+# ─── Worker Side (runs in the process pool) ──────────────────────────
+
+
+def _decode_chunk(paths: list[str], validate: bool):
+    """
+    Decodes and validates a chunk of images.
+
+    Returns:
+        (pixels, rows) where pixels is a (k, 256, 256, 3) uint8 array of the
+        images to score and rows is one partial result dict per input path
+        (rows with status "ok" line up with pixels in order).
+    """
+    images, rows = [], []
+    for path in paths:
+        row = {"path": path, "status": "ok", "leaf_score": None, "error": None}
+        try:
+            with open(path, "rb") as f:
+                img_array = decode_image(f.read())
+            if validate:
+                validation = validate_leaf_array(img_array)
+                row["leaf_score"] = validation["confidence"]
+                if not validation["is_leaf"]:
+                    row["status"] = "not_leaf"
+            if row["status"] == "ok":
+                images.append(img_array)
+        except Exception as e:
+            row["status"] = "error"
+            row["error"] = str(e)[:200]
+        rows.append(row)
+
+    pixels = (
+        np.stack(images) if images else np.empty((0,) + IMAGE_SIZE + (3,), np.uint8)
+    )
+    return pixels, rows
+
+
+# ─── Output Writers ──────────────────────────────────────────────────
+
+
+class CsvWriter:
+    """Appends rows to one CSV file; truncates to the checkpoint on resume."""
+
+    def __init__(self, path: str, resume_state: dict | None):
+        if os.path.exists(path):
+            # Drop anything written after the last checkpoint (or everything)
+            os.truncate(path, resume_state.get("output_bytes", 0) if resume_state else 0)
+        self._file = open(path, "a", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=OUTPUT_COLUMNS)
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._writer.writeheader()
+
+    def write(self, rows: list[dict]) -> None:
+        self._writer.writerows(rows)
+
+    def flush(self) -> dict:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"output_bytes": os.fstat(self._file.fileno()).st_size}
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+    """Writes a directory of Parquet part files, one per flush."""
+
+    def __init__(self, path: str, resume_state: dict | None):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise CommandError("Parquet output requires pyarrow: pip install pyarrow")
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._part = (resume_state or {}).get("next_part", 0)
+        if not resume_state:
+            for name in os.listdir(path):
+                if name.startswith("part-") and name.endswith(".parquet"):
+                    os.remove(os.path.join(path, name))
+        self._rows = []
+
+    def write(self, rows: list[dict]) -> None:
+        self._rows.extend(rows)
+
+    def flush(self) -> dict:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._rows:
+            schema = pa.schema(
+                [
+                    (name, pa.string() if name in STRING_COLUMNS else pa.float64())
+                    for name in OUTPUT_COLUMNS
+                ]
+            )
+            table = pa.Table.from_pylist(self._rows, schema=schema)
+            part_path = os.path.join(self.path, f"part-{self._part:05d}.parquet")
+            pq.write_table(table, part_path + ".tmp", compression="zstd")
+            os.replace(part_path + ".tmp", part_path)
+            self._part += 1
+            self._rows = []
+        return {"next_part": self._part}
+
+    def close(self) -> None:
+        self.flush()
+
+
+# ─── Command ─────────────────────────────────────────────────────────
+
+
+class Command(BaseCommand):
+    help = "Score a directory or manifest of images offline, with checkpoint/resume."
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="Image directory, or a manifest file with one path per line.")
+        parser.add_argument("--output", required=True, help="CSV file or Parquet directory.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "parquet"],
+            help="Output format (default: from the --output extension).",
+        )
+        parser.add_argument("--batch-size", type=int, default=32)
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=max((os.cpu_count() or 2) - 1, 1),
+            help="Decode processes (default: all cores but one, which runs the model).",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file (default: <output>.checkpoint.json).",
+        )
+        parser.add_argument(
+            "--resume", action="store_true", help="Continue from the checkpoint."
+        )
+        parser.add_argument(
+            "--flush-every",
+            type=int,
+            default=2000,
+            help="Rows between output flushes / checkpoints.",
+        )
+        parser.add_argument(
+            "--no-validate", action="store_true", help="Skip the leaf pre-check."
+        )
+
+    # ── Path streaming ──
+
+    def _iter_paths(self, source: str):
+        if os.path.isdir(source):
+            yield from iter_image_paths(source)
+            return
+        if not os.path.isfile(source):
+            raise CommandError(f"Source not found: {source}")
+
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as manifest:
+            for line in manifest:
+                path = line.strip()
+                if path and not path.startswith("#") and path.lower().endswith(IMAGE_EXTENSIONS):
+                    yield path if os.path.isabs(path) else os.path.join(base, path)
+
+    # ── Main loop ──
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        output = options["output"]
+        batch_size = options["batch_size"]
+        output_format = options["format"] or (
+            "parquet" if output.endswith(".parquet") or output.endswith("/") else "csv"
+        )
+        checkpoint_path = options["checkpoint"] or output.rstrip("/") + ".checkpoint.json"
+
+        resume_state = None
+        if options["resume"] and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                resume_state = json.load(f)
+            if resume_state.get("source") != os.path.abspath(source):
+                raise CommandError("Checkpoint was written for a different source.")
+            self.stdout.write(f"Resuming after {resume_state['processed']} images.")
+
+        writer_class = ParquetWriter if output_format == "parquet" else CsvWriter
+        writer = writer_class(output, resume_state)
+
+        already_done = resume_state["processed"] if resume_state else 0
+        paths = itertools.islice(self._iter_paths(source), already_done, None)
+        chunks = iter(lambda: list(itertools.islice(paths, batch_size)), [])
+
+        self.processed = already_done
+        self.scored = 0
+        self.started = time.perf_counter()
+        self._last_progress = self.started
+
+        pending_rows = []  # rows waiting for their batch to be scored
+        pending_pixels = []  # uint8 arrays for the "ok" rows above
+        rows_since_flush = 0
+
+        def checkpoint(state: dict) -> None:
+            state.update(
+                {"source": os.path.abspath(source), "processed": self.processed, "output": output}
+            )
+            with open(checkpoint_path + ".tmp", "w") as f:
+                json.dump(state, f)
+            os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+        def score_pending(force: bool) -> None:
+            """Scores full batches (or everything, if force) and writes rows in order."""
+            nonlocal pending_rows, pending_pixels, rows_since_flush
+            pixels = np.concatenate(pending_pixels) if pending_pixels else None
+            ok_count = 0 if pixels is None else len(pixels)
+            n_batches = ok_count // batch_size if not force else -(-ok_count // batch_size)
+            if n_batches == 0 and not force:
+                return
+
+            scored = n_batches * batch_size if not force else ok_count
+            probabilities = np.empty((scored, len(CLASS_NAMES)), dtype=np.float32)
+            batch = np.empty((batch_size,) + IMAGE_SIZE + (3,), dtype=np.float32)
+            for start in range(0, scored, batch_size):
+                n = min(batch_size, scored - start)
+                fill_input(pixels[start : start + n], batch[:n], model_input_scale())
+                probabilities[start : start + n] = run_model(batch[:n])
+
+            # Emit rows up to the last scored image; keep the rest pending
+            emitted, ok_seen = 0, 0
+            for row in pending_rows:
+                if row["status"] == "ok":
+                    if ok_seen == scored:
+                        break
+                    probs = probabilities[ok_seen]
+                    index = int(np.argmax(probs))
+                    row["disease_class"] = CLASS_NAMES[index]
+                    row["confidence"] = round(float(probs[index]) * 100, 2)
+                    for name, p in zip(CLASS_NAMES, probs):
+                        row[f"p_{name.lower().replace(' ', '_')}"] = round(float(p), 5)
+                    ok_seen += 1
+                emitted += 1
+
+            writer.write(pending_rows[:emitted])
+            pending_rows = pending_rows[emitted:]
+            pending_pixels = [pixels[scored:]] if pixels is not None and scored < ok_count else []
+            self.processed += emitted
+            self.scored += scored
+            rows_since_flush += emitted
+
+            if rows_since_flush >= options["flush_every"] or force:
+                checkpoint(writer.flush())
+                rows_since_flush = 0
+
+        # Decode in worker processes; spawn (not fork) keeps TensorFlow out of them
+        context = multiprocessing.get_context("spawn")
+        window = deque()
+        validate = not options["no_validate"]
+
+        with ProcessPoolExecutor(options["workers"], mp_context=context) as pool:
+            for chunk in itertools.islice(chunks, options["workers"] * 2):
+                window.append(pool.submit(_decode_chunk, chunk, validate))
+
+            while window:
+                pixels, rows = window.popleft().result()
+                next_chunk = next(chunks, None)
+                if next_chunk is not None:
+                    window.append(pool.submit(_decode_chunk, next_chunk, validate))
+
+                pending_rows.extend(rows)
+                if len(pixels):
+                    pending_pixels.append(pixels)
+                score_pending(force=False)
+                self._report_progress()
+
+        score_pending(force=True)
+        writer.close()
+
+        elapsed = time.perf_counter() - self.started
+        done_now = self.processed - already_done
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done: {done_now} images in {elapsed:.1f}s "
+                f"({done_now / max(elapsed, 1e-9):.1f} images/sec), "
+                f"{self.scored} scored → {output}"
+            )
+        )
+
+    def _report_progress(self) -> None:
+        now = time.perf_counter()
+        if now - self._last_progress < PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        rate = self.scored / max(now - self.started, 1e-9)
+        self.stdout.write(f"{self.processed} processed, {rate:.1f} images/sec")
@@ -0,0 +1,93 @@
+"""
+LeafLens - In-Process Metrics
+@Maharsh Doshi
+
+Lightweight counters and latency summaries for the prediction engine,
+exposed as JSON at GET /api/metrics/. Values are per worker process.
+"""
+
+import threading
+from collections import deque
+
+_lock = threading.Lock()
+_counters: dict[str, int] = {}
+_observations: dict[str, deque] = {}
+_info: dict[str, dict] = {}
+_ratios: dict[str, tuple[str, str]] = {}
+
+# Number of recent samples kept per observation for percentiles
+WINDOW_SIZE = 1024
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """Adds `amount` to a named counter."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def observe(name: str, value: float) -> None:
+    """Records one sample (e.g. a latency in ms) for a named series."""
+    with _lock:
+        series = _observations.get(name)
+        if series is None:
+            series = _observations[name] = deque(maxlen=WINDOW_SIZE)
+        series.append(value)
+
+
+def set_info(name: str, info: dict) -> None:
+    """Publishes a static description (e.g. the active configuration)."""
+    with _lock:
+        _info[name] = dict(info)
+
+
+def ratio(numerator: str, denominator: str) -> float | None:
+    """Returns counter[numerator] / counter[denominator], or None if empty."""
+    with _lock:
+        total = _counters.get(denominator, 0)
+        return _counters.get(numerator, 0) / total if total else None
+
+
+def register_ratio(name: str, numerator: str, denominator: str) -> None:
+    """Reports counter[numerator] / counter[denominator] as `name` in snapshots."""
+    with _lock:
+        _ratios[name] = (numerator, denominator)
+
+
+def summarize(samples) -> dict:
+    """Count / mean / p50 / p95 / p99 / max for a sequence of samples."""
+    # Imported here so that recording metrics never pulls in NumPy
+    import numpy as np
+
+    values = np.asarray(samples, dtype=np.float64)
+    if values.size == 0:
+        return {"count": 0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(values.size),
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(p50), 3),
+        "p95": round(float(p95), 3),
+        "p99": round(float(p99), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def snapshot() -> dict:
+    """Returns all counters, latency summaries, ratios and info blocks."""
+    with _lock:
+        counters = dict(_counters)
+        observations = {name: list(series) for name, series in _observations.items()}
+        info = {name: dict(block) for name, block in _info.items()}
+        ratios = {
+            name: round(counters.get(num, 0) / counters[den], 4) if counters.get(den) else None
+            for name, (num, den) in _ratios.items()
+        }
+
+    return {
+        "counters": counters,
+        "observations": {
+            name: summarize(samples) for name, samples in observations.items()
+        },
+        "ratios": ratios,
+        "info": info,
+    }
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:59
+
+import prediction.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanhistory',
+            name='image_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the upload', max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='scanhistory',
+            name='model_image',
+            field=models.ImageField(blank=True, help_text='256x256 copy as fed to the model', null=True, storage=prediction.storage.get_scan_image_storage, upload_to='scans/model/'),
+        ),
+        migrations.AddField(
+            model_name='scanhistory',
+            name='thumbnail',
+            field=models.ImageField(blank=True, null=True, storage=prediction.storage.get_scan_image_storage, upload_to='scans/thumbnails/'),
+        ),
+        migrations.AlterField(
+            model_name='scanhistory',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=prediction.storage.get_scan_image_storage, upload_to='scans/originals/'),
+        ),
+    ]
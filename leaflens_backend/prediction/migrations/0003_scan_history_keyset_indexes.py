@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0002_scan_image_storage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='scanhistory',
+            index=models.Index(fields=['scanned_at', 'id'], name='scan_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scanhistory',
+            index=models.Index(fields=['disease_class', 'scanned_at', 'id'], name='scan_disease_keyset_idx'),
+        ),
+    ]
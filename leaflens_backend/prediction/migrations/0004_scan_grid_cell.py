@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:10
+
+import math
+
+from django.db import migrations, models
+
+# The grid as of this migration, frozen: later changes to prediction.geo
+# must not change what it writes
+GRID_CELL_DEGREES = 0.05
+GRID_ROWS = round(180 / GRID_CELL_DEGREES)
+GRID_COLS = round(360 / GRID_CELL_DEGREES)
+
+
+def _row_col(latitude, longitude):
+    row = min(int(math.floor((latitude + 90) / GRID_CELL_DEGREES)), GRID_ROWS - 1)
+    col = int(math.floor((longitude + 180) / GRID_CELL_DEGREES)) % GRID_COLS
+    return row, col
+
+
+def grid_cell(latitude, longitude):
+    row, col = _row_col(latitude, longitude)
+    return row * GRID_COLS + col
+
+
+def fill_grid_cells(apps, schema_editor):
+    ScanHistory = apps.get_model("prediction", "ScanHistory")
+    scans = ScanHistory.objects.filter(latitude__isnull=False, longitude__isnull=False)
+    batch = []
+    for scan in scans.only("id", "latitude", "longitude").iterator(chunk_size=2000):
+        scan.grid_cell = grid_cell(scan.latitude, scan.longitude)
+        batch.append(scan)
+        if len(batch) >= 2000:
+            ScanHistory.objects.bulk_update(batch, ["grid_cell"])
+            batch = []
+    if batch:
+        ScanHistory.objects.bulk_update(batch, ["grid_cell"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0003_scan_history_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanhistory',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, editable=False, help_text='Spatial grid cell id, set on save (see geo.py)', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='scanhistory',
+            index=models.Index(fields=['grid_cell', 'scanned_at'], name='scan_cell_time_idx'),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
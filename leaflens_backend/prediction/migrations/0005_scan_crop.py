@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0004_scan_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanhistory',
+            name='crop',
+            field=models.CharField(default='potato', help_text='Crop model used', max_length=30),
+        ),
+    ]
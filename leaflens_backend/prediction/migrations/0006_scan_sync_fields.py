@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0005_scan_crop'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scanhistory',
+            name='client_id',
+            field=models.CharField(blank=True, help_text='Scan id chosen by the phone; makes re-sent batches idempotent', max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='scanhistory',
+            name='model_version',
+            field=models.CharField(blank=True, help_text='TFLite model version (on-device scans)', max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='scanhistory',
+            name='source',
+            field=models.CharField(choices=[('server', 'Server inference'), ('device', 'On-device (TFLite), synced')], default='server', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='scanhistory',
+            name='verified_class',
+            field=models.CharField(blank=True, help_text='Server re-check of a sampled synced scan', max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='scanhistory',
+            name='verified_confidence',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='scanhistory',
+            name='scanned_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
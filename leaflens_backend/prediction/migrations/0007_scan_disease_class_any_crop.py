@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0006_scan_sync_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='scanhistory',
+            name='disease_class',
+            field=models.CharField(max_length=50),
+        ),
+    ]
@@ -8,17 +8,38 @@ of loading a ~2MB model on every single API call.
 """
 
 import logging
+import random
+import threading
+import time
 import numpy as np
 from PIL import Image
 from io import BytesIO
 
+from . import metrics
+from .buffers import get_input_pool
+from .constants import CLASS_NAMES, IMAGE_SIZE
+
 logger = logging.getLogger(__name__)
 
 # ─── Singleton Model Instance ────────────────────────────────────────
 _model = None
+_input_scale = None  # 1/255, or 1.0 when the model has a Rescaling layer
+
+# Traced serving graphs, one concrete function per batch-size bucket
+_serving_fns = {}
+_serving_lock = threading.Lock()
+
+SERVING_MODES = ("predict", "function", "xla")
+
+# Test-time augmentation: crops keep this fraction of each side
+TTA_CROP_SCALE = 0.875
 
-CLASS_NAMES = ["Early Blight", "Late Blight", "Healthy"]
-IMAGE_SIZE = (256, 256)
+# Cascade fast model: TFLite interpreters are not thread-safe, so each
+# thread gets its own
+_fast_runners = threading.local()
+
+metrics.register_ratio("ml.cascade.escalation_rate", "ml.cascade.escalated", "ml.cascade.requests")
+metrics.register_ratio("ml.cascade.agreement_rate", "ml.cascade.agreed", "ml.cascade.compared")
 
 
 def get_model():
@@ -29,9 +50,15 @@ def get_model():
     global _model
     if _model is None:
         try:
-            import tensorflow as tf
             from django.conf import settings
 
+            from .cpu_topology import apply_layout
+
+            # Thread pools must be sized before TensorFlow runs its first op
+            apply_layout()
+
+            import tensorflow as tf
+
             model_path = settings.ML_MODEL_PATH
             logger.info(f"Loading ML model from: {model_path}")
             _model = tf.keras.models.load_model(model_path, compile=False)
@@ -42,42 +69,419 @@ def get_model():
     return _model
 
 
+def decode_image(image_bytes: bytes) -> np.ndarray:
+    """
+    Decodes an uploaded image to a (256, 256, 3) uint8 RGB array.
+    """
+    image = Image.open(BytesIO(image_bytes)).convert("RGB")
+    image = image.resize(IMAGE_SIZE)
+    return np.asarray(image)
+
+
+def _has_rescaling_layer(model) -> bool:
+    """True if the model's input stage (possibly a nested Sequential) rescales."""
+    for layer in getattr(model, "layers", [])[:3]:
+        if type(layer).__name__ == "Rescaling" or _has_rescaling_layer(layer):
+            return True
+    return False
+
+
+def model_input_scale() -> float:
+    """
+    Factor applied to uint8 pixels before they reach the model.
+
+    NOTE: The saved .h5 model does NOT include a Rescaling layer
+    (it was applied externally during training), so we must scale by
+    1/255 here. The saved_models/* exports rescale internally and take
+    raw 0-255 values.
+    """
+    global _input_scale
+    if _input_scale is None:
+        _input_scale = 1.0 if _has_rescaling_layer(get_model()) else 1.0 / 255.0
+    return _input_scale
+
+
+def normalize_image(img_array: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Converts a (256, 256, 3) uint8 array to a float32 batch of one in
+    the range the model expects, in a single pass. Writes into `out`
+    (e.g. a pooled buffer, see buffers.py) when given.
+    """
+    from .buffers import fill_input
+
+    if out is None:
+        out = np.empty((1,) + img_array.shape, dtype=np.float32)
+    fill_input(img_array, out[0], model_input_scale())
+    return out
+
+
 def preprocess_image(image_bytes: bytes) -> np.ndarray:
     """
     Preprocesses an uploaded image for model inference.
     - Opens the image from bytes
     - Converts to RGB
     - Resizes to 256x256
-    - Normalizes pixel values to [0, 1]
+    - Scales pixel values to the model's input range
     - Adds batch dimension
+    """
+    return normalize_image(decode_image(image_bytes))
 
-    NOTE: The saved .h5 model does NOT include a Rescaling layer
-    (it was applied externally during training), so we must
-    normalize here.
+
+# ─── Serving Modes ───────────────────────────────────────────────────
+#
+# "predict"  — model.predict(): built for large datasets, it runs Keras'
+#              data adapter and callback machinery on every call
+# "function" — a tf.function traced once per batch-size bucket with a
+#              fixed input signature; each call is a single graph execution
+# "xla"      — same, compiled with XLA (jit_compile=True)
+
+
+def _bucket_for(batch_size: int, buckets: list[int]) -> int:
+    """Smallest configured bucket that fits `batch_size`."""
+    for bucket in buckets:
+        if bucket >= batch_size:
+            return bucket
+    return buckets[-1]
+
+
+def _get_serving_fn(bucket: int, xla: bool):
     """
-    image = Image.open(BytesIO(image_bytes)).convert("RGB")
-    image = image.resize(IMAGE_SIZE)
-    img_array = np.array(image) / 255.0  # Normalize to [0, 1]
-    img_batch = np.expand_dims(img_array, axis=0)  # Add batch dimension
-    return img_batch
+    Returns the concrete function for a (bucket, xla) pair, tracing it on
+    first use. Tracing with a fully fixed shape means no retracing later.
+    """
+    key = (bucket, xla)
+    fn = _serving_fns.get(key)
+    if fn is None:
+        import tensorflow as tf
+
+        with _serving_lock:
+            fn = _serving_fns.get(key)
+            if fn is None:
+                model = get_model()
+                traced = tf.function(
+                    lambda x: model(x, training=False), jit_compile=xla
+                )
+                spec = tf.TensorSpec((bucket,) + IMAGE_SIZE + (3,), tf.float32)
+                fn = traced.get_concrete_function(spec)
+                _serving_fns[key] = fn
+                logger.info(f"Traced serving graph: batch={bucket}, xla={xla}")
+    return fn
+
+
+def _run_compiled(img_batch: np.ndarray, xla: bool) -> np.ndarray:
+    """
+    Runs the batch through the traced graph, padding each chunk up to
+    its bucket (and splitting batches larger than the biggest bucket).
+    """
+    from django.conf import settings
 
+    buckets = sorted(settings.ML_BATCH_BUCKETS)
+    outputs = []
+    for start in range(0, len(img_batch), buckets[-1]):
+        chunk = img_batch[start : start + buckets[-1]]
+        bucket = _bucket_for(len(chunk), buckets)
+        if len(chunk) < bucket:
+            padded = np.zeros((bucket,) + chunk.shape[1:], dtype=np.float32)
+            padded[: len(chunk)] = chunk
+            chunk_input = padded
+        else:
+            chunk_input = np.asarray(chunk, dtype=np.float32)
+        result = _get_serving_fn(bucket, xla)(chunk_input)
+        outputs.append(result.numpy()[: len(chunk)])
+    return np.concatenate(outputs)
 
-def predict_disease(image_bytes: bytes) -> dict:
+
+def run_model(img_batch: np.ndarray, mode: str | None = None) -> np.ndarray:
     """
-    Runs inference on an image and returns the prediction.
+    Runs one forward pass over a preprocessed batch (N, 256, 256, 3)
+    and returns the class probabilities as an (N, num_classes) array.
+
+    `mode` defaults to settings.ML_KERAS_SERVING_MODE (see SERVING_MODES).
+    """
+    if mode is None:
+        from django.conf import settings
+
+        mode = settings.ML_KERAS_SERVING_MODE
+
+    if mode == "predict":
+        model = get_model()
+        return np.asarray(model.predict(img_batch))
+    if mode in ("function", "xla"):
+        return _run_compiled(img_batch, xla=mode == "xla")
+    raise ValueError(f"Unknown serving mode: {mode}. Valid options: {SERVING_MODES}")
+
+
+def warm_up_serving_graph(mode: str | None = None) -> None:
+    """Traces (and for XLA, compiles) every bucket ahead of the first request."""
+    from django.conf import settings
+
+    mode = mode or settings.ML_KERAS_SERVING_MODE
+    get_model()
+    if mode in ("function", "xla"):
+        for bucket in settings.ML_BATCH_BUCKETS:
+            batch = np.zeros((bucket,) + IMAGE_SIZE + (3,), dtype=np.float32)
+            _run_compiled(batch, xla=mode == "xla")
+
+
+# ─── Test-Time Augmentation ──────────────────────────────────────────
+
+
+def build_tta_batch(img_batch: np.ndarray) -> np.ndarray:
+    """
+    Builds the augmented views of a single preprocessed image
+    (batch of 1) as one contiguous batch:
+    - horizontal and vertical flips
+    - 90° and 270° rotations
+    - centre and four corner crops, scaled back up to 256x256
+    The original view is not included (its probabilities are already known).
+    """
+    image = img_batch[0]
+    height, width = image.shape[:2]
+    crop_h = int(height * TTA_CROP_SCALE)
+    crop_w = int(width * TTA_CROP_SCALE)
+
+    # Nearest-neighbour index maps that stretch a crop back to full size
+    rows = (np.arange(height) * crop_h // height)
+    cols = (np.arange(width) * crop_w // width)
+    offsets = [
+        ((height - crop_h) // 2, (width - crop_w) // 2),  # centre
+        (0, 0),
+        (0, width - crop_w),
+        (height - crop_h, 0),
+        (height - crop_h, width - crop_w),
+    ]
+
+    batch = np.empty((4 + len(offsets),) + image.shape, dtype=np.float32)
+    batch[0] = image[:, ::-1]  # horizontal flip
+    batch[1] = image[::-1, :]  # vertical flip
+    batch[2] = np.rot90(image, k=1)
+    batch[3] = np.rot90(image, k=3)
+    for i, (top, left) in enumerate(offsets, start=4):
+        batch[i] = image[np.ix_(top + rows, left + cols)]
+    return batch
+
+
+def apply_tta(img_batch: np.ndarray, base_probabilities: np.ndarray) -> np.ndarray:
+    """
+    Runs all augmented views in a single batched forward pass and
+    returns the probabilities averaged with the original view.
+    """
+    augmented = run_model(build_tta_batch(img_batch))
+    return (augmented.sum(axis=0) + base_probabilities) / (len(augmented) + 1)
+
+
+# ─── Model Cascade ───────────────────────────────────────────────────
+#
+# The quantized TFLite model answers most images on its own at a fraction
+# of the cost; only when it is unsure (low top-class confidence, or a small
+# margin over the runner-up) is the full Keras model consulted. A small
+# sample of confident answers is also re-checked by the full model so the
+# agreement rate covers the whole confidence range, not just doubtful images.
+
+
+def _get_fast_runner():
+    """This thread's interpreter for settings.ML_CASCADE_MODEL_PATH."""
+    runner = getattr(_fast_runners, "runner", None)
+    if runner is None:
+        from django.conf import settings
+
+        from .benchmarking import TFLiteRunner, input_scale_for
+        from .cpu_topology import get_layout
+
+        path = settings.ML_CASCADE_MODEL_PATH
+        runner = TFLiteRunner(
+            model_path=path,
+            num_threads=get_layout()["tflite_threads"],
+            input_scale=input_scale_for(path),
+        )
+        _fast_runners.runner = runner
+        logger.info(f"Cascade fast model loaded from: {path}")
+    return runner
+
+
+def needs_escalation(probabilities: np.ndarray) -> bool:
+    """True if the fast model's answer is too uncertain to serve."""
+    from django.conf import settings
+
+    runner_up, top = np.sort(probabilities)[-2:] * 100
+    return bool(
+        top < settings.ML_CASCADE_CONFIDENCE_THRESHOLD
+        or top - runner_up < settings.ML_CASCADE_MARGIN_THRESHOLD
+    )
+
+
+def _run_full_model(pixels: np.ndarray, model_input) -> np.ndarray:
+    """
+    Full-model probabilities for one image. The batcher takes the uint8
+    pixels (and scales them into its own batch buffer); otherwise the
+    float32 batch from `model_input()` is run directly.
+    """
+    from django.conf import settings
+
+    start = time.perf_counter()
+    if settings.ML_BATCHING_ENABLED:
+        from .batcher import get_batcher
+
+        probabilities = get_batcher().submit(pixels).result()
+    else:
+        probabilities = run_model(model_input())[0]
+    metrics.observe("ml.inference_ms", (time.perf_counter() - start) * 1000)
+    return probabilities
+
+
+def _run_explained(pixels: np.ndarray, model_input) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Full-model probabilities and the Grad-CAM heatmap for one image, from
+    the same forward pass (through the batcher when batching is enabled).
+    """
+    from django.conf import settings
+
+    from .explain import get_explainer
+
+    start = time.perf_counter()
+    if settings.ML_BATCHING_ENABLED:
+        from .batcher import get_batcher
+
+        probabilities, heatmap = get_batcher().submit(pixels, explain=True).result()
+    else:
+        probabilities, heatmaps = get_explainer(get_model()).run(model_input())
+        probabilities, heatmap = probabilities[0], heatmaps[0]
+    metrics.observe("ml.explain.inference_ms", (time.perf_counter() - start) * 1000)
+    return probabilities, heatmap
+
+
+def _run_cascade(pixels: np.ndarray, model_input) -> tuple[np.ndarray, dict]:
+    """
+    Scores with the fast model and escalates to the full model when needed.
+    Returns (probabilities, report).
+    """
+    from django.conf import settings
+
+    runner = _get_fast_runner()
+    start = time.perf_counter()
+    fast = runner.predict(pixels[np.newaxis])[0]
+    metrics.observe("ml.cascade.fast_ms", (time.perf_counter() - start) * 1000)
+    metrics.increment("ml.cascade.requests")
+
+    escalated = needs_escalation(fast)
+    audited = not escalated and random.random() < settings.ML_CASCADE_AUDIT_RATE
+    report = {"escalated": escalated, "fast_class": CLASS_NAMES[int(np.argmax(fast))]}
+    if not escalated and not audited:
+        return fast, report
+
+    full = _run_full_model(pixels, model_input)
+    metrics.increment("ml.cascade.escalated" if escalated else "ml.cascade.audited")
+    metrics.increment("ml.cascade.compared")
+    if int(np.argmax(full)) == int(np.argmax(fast)):
+        metrics.increment("ml.cascade.agreed")
+    return full, report
+
+
+def predict_disease(
+    image_bytes: bytes | None,
+    tta: bool | None = None,
+    crop: str | None = None,
+    explain: bool = False,
+    pixels: np.ndarray | None = None,
+) -> dict:
+    """
+    Runs inference on an image and returns the prediction. Instead of
+    encoded `image_bytes`, already decoded (256, 256, 3) uint8 `pixels`
+    can be given (a client-sent tensor, see tensor_payload.py).
+
+    `crop` selects another crop's model through the model router
+    (see model_router.py); the default crop is served here.
+
+    In cascade mode (settings.ML_CASCADE_ENABLED) the quantized TFLite
+    model answers first and the full model only runs when it is unsure.
+
+    With `explain`, the prediction and a Grad-CAM heatmap of the predicted
+    class come from one full-model pass (see explain.py); the cascade is
+    skipped, since the heatmap needs the full model's activations.
+
+    If test-time augmentation is enabled (`tta`, defaulting to
+    settings.ML_TTA_ENABLED) and the first pass is less confident than
+    settings.ML_TTA_CONFIDENCE_THRESHOLD, the augmented views are
+    scored in one extra batched pass and their probabilities averaged.
 
     Returns:
         dict with keys: class, confidence, class_index
+        (+ "tta" with base confidence and overhead when TTA ran,
+         + "cascade" with whether the full model was consulted,
+         + "explanation" with the overlay PNG when `explain` is set)
     """
-    model = get_model()
-    img_batch = preprocess_image(image_bytes)
+    from django.conf import settings
+
+    if crop and crop.lower() != settings.ML_DEFAULT_CROP:
+        from .model_router import get_router
+
+        return get_router().predict(crop, image_bytes, explain=explain, pixels=pixels)
+
+    if tta is None:
+        tta = settings.ML_TTA_ENABLED
+
+    if pixels is None:
+        pixels = decode_image(image_bytes)
+    # The float input lives in a pooled buffer, returned after inference.
+    # It is only filled when read: the batcher and the cascade's fast
+    # model take the uint8 pixels and scale them themselves.
+    with get_input_pool().borrow() as img_batch:
+        filled = False
+
+        def model_input():
+            nonlocal filled
+            if not filled:
+                normalize_image(pixels, out=img_batch)
+                filled = True
+            return img_batch
 
-    predictions = model.predict(img_batch)
-    predicted_index = int(np.argmax(predictions[0]))
-    confidence = float(np.max(predictions[0]))
+        cascade_report = heatmap = None
+        if explain:
+            probabilities, heatmap = _run_explained(pixels, model_input)
+        elif settings.ML_CASCADE_ENABLED:
+            probabilities, cascade_report = _run_cascade(pixels, model_input)
+        else:
+            probabilities = _run_full_model(pixels, model_input)
 
-    return {
+        base_index = int(np.argmax(probabilities))
+        base_confidence = float(probabilities[base_index])
+        tta_report = None
+
+        if tta and base_confidence * 100 < settings.ML_TTA_CONFIDENCE_THRESHOLD:
+            tta_start = time.perf_counter()
+            probabilities = apply_tta(model_input(), probabilities)
+            overhead_ms = (time.perf_counter() - tta_start) * 1000
+
+            metrics.increment("ml.tta.triggered")
+            metrics.observe("ml.tta.overhead_ms", overhead_ms)
+            if int(np.argmax(probabilities)) != base_index:
+                metrics.increment("ml.tta.changed_class")
+
+            tta_report = {
+                "applied": True,
+                "base_class": CLASS_NAMES[base_index],
+                "base_confidence": round(base_confidence * 100, 2),
+                "overhead_ms": round(overhead_ms, 1),
+            }
+
+    metrics.increment("ml.predictions")
+    predicted_index = int(np.argmax(probabilities))
+    confidence = float(np.max(probabilities))
+
+    result = {
         "class": CLASS_NAMES[predicted_index],
         "confidence": round(confidence * 100, 2),
         "class_index": predicted_index,
     }
+    if tta_report is not None:
+        result["tta"] = tta_report
+    if cascade_report is not None:
+        result["cascade"] = cascade_report
+    if heatmap is not None:
+        from .explain import explanation_payload, get_explainer
+
+        # The heatmap explains the first pass, before any TTA re-scoring
+        result["explanation"] = explanation_payload(
+            heatmap, get_explainer(get_model()).layer_name, CLASS_NAMES[base_index]
+        )
+    return result
@@ -0,0 +1,368 @@
+"""
+LeafLens - Multi-Crop Model Router
+@Maharsh Doshi
+
+Serves several crop models from one backend. Each crop besides the
+built-in default is declared by a JSON manifest in
+settings.ML_CROP_MANIFESTS_DIR:
+
+    crop_models/tomato.json
+    {
+        "crop": "tomato",
+        "model_path": "tomato.h5",              (relative to the manifest)
+        "class_names": ["Bacterial Spot", "Early Blight", "Healthy"],
+        "image_size": [256, 256],
+        "input_scale": 0.00392156862745098,     (1/255; 1.0 if the model rescales)
+        "healthy_class": "Healthy",
+        "treatments": {"Bacterial Spot": { ...same shape as treatment_data... }}
+    }
+
+Models load lazily on first use; concurrent first requests for a crop
+share one load. Loaded models are kept in LRU order and the least
+recently used are evicted once their weights exceed
+settings.ML_MODEL_MEMORY_BUDGET_MB.
+
+The default crop (settings.ML_DEFAULT_CROP, potato) is built in: it is
+the get_model() instance with its treatment_data.py recommendations
+and serving options (batcher, cascade, TTA), and it is never evicted.
+
+Listing crops and looking up treatments never imports NumPy, PIL or
+TensorFlow; they load with the first model.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from io import BytesIO
+
+from django.conf import settings
+
+from . import metrics
+from .constants import CLASS_NAMES, IMAGE_SIZE
+from .treatment_data import (
+    TREATMENT_DATABASE,
+    get_crop_weather_risk,
+    get_treatment,
+    get_weather_risk_assessment,
+)
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_KEYS = ("crop", "model_path", "class_names")
+
+
+class UnknownCropError(ValueError):
+    """Raised when a request names a crop with no model."""
+
+
+class CropSpec:
+    """Everything needed to serve one crop's model."""
+
+    def __init__(
+        self,
+        crop: str,
+        model_path: str,
+        class_names: list[str],
+        image_size=IMAGE_SIZE,
+        input_scale: float = 1.0 / 255.0,
+        healthy_class: str = "Healthy",
+        treatments: dict | None = None,
+    ):
+        self.crop = crop
+        self.model_path = model_path
+        self.class_names = list(class_names)
+        self.image_size = tuple(image_size)
+        self.input_scale = float(input_scale)
+        self.healthy_class = healthy_class
+        self.treatments = treatments or {}
+
+    @classmethod
+    def from_manifest(cls, path: str) -> "CropSpec":
+        with open(path) as f:
+            manifest = json.load(f)
+        missing = [key for key in MANIFEST_KEYS if key not in manifest]
+        if missing:
+            raise ValueError(f"{path}: missing {', '.join(missing)}")
+
+        model_path = manifest["model_path"]
+        if not os.path.isabs(model_path):
+            model_path = os.path.join(os.path.dirname(os.path.abspath(path)), model_path)
+        return cls(
+            crop=manifest["crop"].lower(),
+            model_path=model_path,
+            class_names=manifest["class_names"],
+            image_size=manifest.get("image_size", IMAGE_SIZE),
+            input_scale=manifest.get("input_scale", 1.0 / 255.0),
+            healthy_class=manifest.get("healthy_class", "Healthy"),
+            treatments=manifest.get("treatments"),
+        )
+
+    def describe(self) -> dict:
+        return {
+            "crop": self.crop,
+            "classes": self.class_names,
+            "image_size": list(self.image_size),
+            "model": os.path.basename(self.model_path),
+        }
+
+
+def _default_spec() -> CropSpec:
+    return CropSpec(
+        crop=settings.ML_DEFAULT_CROP,
+        model_path=str(settings.ML_MODEL_PATH),
+        class_names=CLASS_NAMES,
+        image_size=IMAGE_SIZE,
+        treatments=TREATMENT_DATABASE,
+    )
+
+
+def _loaded_default_model():
+    """
+    The default crop's model if predict_disease() has loaded it, else None.
+    Looks ml_model up without importing it (and NumPy/PIL with it).
+    """
+    ml_model = sys.modules.get(f"{__package__}.ml_model")
+    return getattr(ml_model, "_model", None)
+
+
+def _weights_bytes(model) -> int:
+    """Memory held by a Keras model's weights."""
+    import numpy as np
+
+    # Keras 3 reports dtypes as strings, tf.keras 2 as tf.DType
+    return int(
+        sum(
+            np.prod(w.shape) * np.dtype(getattr(w.dtype, "name", w.dtype)).itemsize
+            for w in model.weights
+        )
+    )
+
+
+class ModelRouter:
+    """Lazily loads crop models and keeps them under a memory budget."""
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._specs = None
+        self._resident = OrderedDict()  # crop -> (model, weights_bytes), LRU first
+        self._loading = {}  # crop -> Future shared by concurrent first requests
+        self._lock = threading.Lock()
+
+    # ── Manifests ──
+
+    def specs(self) -> dict[str, CropSpec]:
+        if self._specs is None:
+            specs = {settings.ML_DEFAULT_CROP: _default_spec()}
+            directory = settings.ML_CROP_MANIFESTS_DIR
+            if os.path.isdir(directory):
+                for name in sorted(os.listdir(directory)):
+                    if not name.endswith(".json"):
+                        continue
+                    try:
+                        spec = CropSpec.from_manifest(os.path.join(directory, name))
+                    except (OSError, ValueError) as e:
+                        logger.error(f"Skipping crop manifest {name}: {e}")
+                        continue
+                    if spec.crop in specs:
+                        logger.warning(f"Ignoring duplicate crop manifest {name}")
+                        continue
+                    specs[spec.crop] = spec
+            self._specs = specs
+            logger.info(f"Crop models available: {', '.join(specs)}")
+        return self._specs
+
+    def spec(self, crop: str | None) -> CropSpec:
+        crop = (crop or settings.ML_DEFAULT_CROP).lower()
+        try:
+            return self.specs()[crop]
+        except KeyError:
+            raise UnknownCropError(
+                f"Unknown crop: {crop}. Available: {', '.join(self.specs())}"
+            )
+
+    # ── Residency ──
+
+    def get_model(self, crop: str):
+        """Returns the crop's model, loading it (once) if not resident."""
+        spec = self.spec(crop)
+        with self._lock:
+            entry = self._resident.get(spec.crop)
+            if entry is not None:
+                self._resident.move_to_end(spec.crop)
+                return entry[0]
+            future = self._loading.get(spec.crop)
+            owner = future is None
+            if owner:
+                future = self._loading[spec.crop] = Future()
+
+        if not owner:
+            metrics.increment("ml.router.load_waits")
+            return future.result()
+
+        try:
+            start = time.perf_counter()
+            model = self._load(spec)
+            size = _weights_bytes(model)
+            metrics.observe("ml.router.load_ms", (time.perf_counter() - start) * 1000)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[spec.crop]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._resident[spec.crop] = (model, size)
+            del self._loading[spec.crop]
+            self._evict(keep=spec.crop)
+            self._publish()
+        future.set_result(model)
+        return model
+
+    def _load(self, spec: CropSpec):
+        metrics.increment("ml.router.loads")
+        if spec.crop == settings.ML_DEFAULT_CROP:
+            from .ml_model import get_model
+
+            return get_model()
+
+        from .cpu_topology import apply_layout
+
+        apply_layout()
+        import tensorflow as tf
+
+        logger.info(f"Loading {spec.crop} model from: {spec.model_path}")
+        return tf.keras.models.load_model(spec.model_path, compile=False)
+
+    def _resident_bytes(self) -> int:
+        total = sum(size for _, size in self._resident.values())
+        default_model = _loaded_default_model()
+        if settings.ML_DEFAULT_CROP not in self._resident and default_model is not None:
+            # Loaded directly by predict_disease(); it still occupies the budget
+            total += _weights_bytes(default_model)
+        return total
+
+    def _evict(self, keep: str) -> None:
+        """Drops least recently used models until under budget (lock held)."""
+        total = self._resident_bytes()
+        for crop in list(self._resident):
+            if total <= self.budget_bytes:
+                break
+            if crop in (keep, settings.ML_DEFAULT_CROP):
+                continue
+            model, size = self._resident.pop(crop)
+            total -= size
+            explain = sys.modules.get(f"{__package__}.explain")
+            if explain is not None:
+                # Its traced explainer would otherwise keep the model alive
+                explain.forget_explainer(model)
+            metrics.increment("ml.router.evictions")
+            logger.info(f"Evicted {crop} model (resident weights now {total / 2**20:.1f} MB)")
+
+    def _publish(self) -> None:
+        metrics.set_info(
+            "model_router",
+            {
+                "budget_mb": round(self.budget_bytes / 2**20, 1),
+                "resident_mb": round(self._resident_bytes() / 2**20, 1),
+                "resident": list(self._resident),
+            },
+        )
+
+    def is_resident(self, crop: str) -> bool:
+        if crop == settings.ML_DEFAULT_CROP and _loaded_default_model() is not None:
+            return True
+        return crop in self._resident
+
+    # ── Inference ──
+
+    def predict(
+        self, crop: str, image_bytes: bytes | None, explain: bool = False, pixels=None
+    ) -> dict:
+        """
+        Classifies an image (encoded bytes, or decoded uint8 `pixels`)
+        with a non-default crop's model.
+        Returns the same dict shape as ml_model.predict_disease().
+        """
+        import numpy as np
+        from PIL import Image
+
+        spec = self.spec(crop)
+        model = self.get_model(spec.crop)
+
+        height, width = spec.image_size
+        if pixels is None or pixels.shape[:2] != (height, width):
+            if pixels is not None:
+                image = Image.fromarray(pixels)
+            else:
+                image = Image.open(BytesIO(image_bytes))
+            pixels = np.asarray(image.convert("RGB").resize((width, height)))
+        img_batch = np.empty((1, height, width, 3), dtype=np.float32)
+        np.multiply(pixels, spec.input_scale, out=img_batch[0], casting="unsafe")
+
+        start = time.perf_counter()
+        if explain:
+            from .explain import explanation_payload, get_explainer
+
+            explainer = get_explainer(model)
+            probabilities, heatmaps = explainer.run(img_batch)
+            probabilities = probabilities[0]
+        else:
+            probabilities = np.asarray(model(img_batch, training=False))[0]
+        metrics.observe(f"ml.router.{spec.crop}.inference_ms", (time.perf_counter() - start) * 1000)
+        metrics.increment("ml.predictions")
+
+        predicted_index = int(np.argmax(probabilities))
+        result = {
+            "class": spec.class_names[predicted_index],
+            "confidence": round(float(probabilities[predicted_index]) * 100, 2),
+            "class_index": predicted_index,
+            "crop": spec.crop,
+        }
+        if explain:
+            result["explanation"] = explanation_payload(
+                heatmaps[0], explainer.layer_name, result["class"]
+            )
+        return result
+
+    # ── Treatment data ──
+
+    def treatment(self, crop: str | None, disease: str) -> dict:
+        spec = self.spec(crop)
+        if spec.crop == settings.ML_DEFAULT_CROP:
+            return get_treatment(disease)
+        info = spec.treatments.get(disease, {})
+        return {
+            "disease": disease,
+            "scientific_name": info.get("scientific_name", ""),
+            "symptoms": info.get("symptoms", []),
+            "causes": info.get("causes", []),
+            "treatment": info.get("treatment", []),
+            "prevention": info.get("prevention", []),
+            "severity": info.get("severity", "Unknown"),
+        }
+
+    def weather_risk(self, crop: str | None, disease: str, temperature: float, humidity: float) -> dict:
+        spec = self.spec(crop)
+        if spec.crop == settings.ML_DEFAULT_CROP:
+            return get_weather_risk_assessment(disease, temperature, humidity)
+        return get_crop_weather_risk(
+            spec.treatments, spec.healthy_class, disease, temperature, humidity
+        )
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter(int(settings.ML_MODEL_MEMORY_BUDGET_MB * 2**20))
+    return _router
@@ -6,25 +6,56 @@ Stores scan history so users can track disease progression over time.
 """
 
 from django.db import models
+from django.utils import timezone
+
+from .geo import grid_cell
+from .storage import get_scan_image_storage
 
 
 class ScanHistory(models.Model):
     """Records each disease scan performed through the API."""
 
-    DISEASE_CHOICES = [
-        ("Early Blight", "Early Blight"),
-        ("Late Blight", "Late Blight"),
-        ("Healthy", "Healthy"),
+    SOURCE_SERVER = "server"
+    SOURCE_DEVICE = "device"
+    SOURCE_CHOICES = [
+        (SOURCE_SERVER, "Server inference"),
+        (SOURCE_DEVICE, "On-device (TFLite), synced"),
     ]
 
     # Prediction results
-    disease_class = models.CharField(max_length=50, choices=DISEASE_CHOICES)
+    crop = models.CharField(max_length=30, default="potato", help_text="Crop model used")
+    # No choices: each crop has its own classes, validated against its
+    # model spec by the API (see model_router.py and sync.py)
+    disease_class = models.CharField(max_length=50)
     confidence = models.FloatField(help_text="Confidence percentage (0-100)")
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES, default=SOURCE_SERVER)
+    model_version = models.CharField(
+        max_length=50, null=True, blank=True, help_text="TFLite model version (on-device scans)"
+    )
+
+    # Offline scans synced from phones (see sync.py)
+    client_id = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        unique=True,
+        help_text="Scan id chosen by the phone; makes re-sent batches idempotent",
+    )
+    verified_class = models.CharField(
+        max_length=50, null=True, blank=True, help_text="Server re-check of a sampled synced scan"
+    )
+    verified_confidence = models.FloatField(null=True, blank=True)
 
     # Location (optional)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
     city = models.CharField(max_length=100, null=True, blank=True)
+    grid_cell = models.IntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Spatial grid cell id, set on save (see geo.py)",
+    )
 
     # Weather at the time of scan (optional)
     temperature = models.FloatField(
@@ -34,13 +65,52 @@ class ScanHistory(models.Model):
     weather_description = models.CharField(max_length=100, null=True, blank=True)
 
     # Metadata
-    scanned_at = models.DateTimeField(auto_now_add=True)
-    image = models.ImageField(upload_to="scans/%Y/%m/%d/", null=True, blank=True)
+    # A default rather than auto_now_add, so synced scans keep their phone time
+    scanned_at = models.DateTimeField(default=timezone.now)
+
+    # Images are content-addressed (see storage.py) and written off the
+    # request thread by image_store.py, so they may appear a moment later
+    image_hash = models.CharField(
+        max_length=64, null=True, blank=True, db_index=True, help_text="SHA-256 of the upload"
+    )
+    image = models.ImageField(
+        upload_to="scans/originals/",
+        storage=get_scan_image_storage,
+        null=True,
+        blank=True,
+    )
+    thumbnail = models.ImageField(
+        upload_to="scans/thumbnails/",
+        storage=get_scan_image_storage,
+        null=True,
+        blank=True,
+    )
+    model_image = models.ImageField(
+        upload_to="scans/model/",
+        storage=get_scan_image_storage,
+        null=True,
+        blank=True,
+        help_text="256x256 copy as fed to the model",
+    )
 
     class Meta:
         ordering = ["-scanned_at"]
+        indexes = [
+            # Keyset pagination / exports walk (scanned_at, id)
+            models.Index(fields=["scanned_at", "id"], name="scan_keyset_idx"),
+            models.Index(
+                fields=["disease_class", "scanned_at", "id"], name="scan_disease_keyset_idx"
+            ),
+            # Nearby-outbreak queries: cells in the search box, recent first
+            models.Index(fields=["grid_cell", "scanned_at"], name="scan_cell_time_idx"),
+        ]
         verbose_name = "Scan History"
         verbose_name_plural = "Scan Histories"
 
+    def save(self, *args, **kwargs):
+        # bulk_create() and update() skip save(); set grid_cell there too
+        self.grid_cell = grid_cell(self.latitude, self.longitude)
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.disease_class} ({self.confidence}%) - {self.scanned_at.strftime('%Y-%m-%d %H:%M')}"
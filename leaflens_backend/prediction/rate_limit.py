@@ -0,0 +1,298 @@
+"""
+LeafLens - Shared-Memory Rate Limiting
+@Maharsh Doshi
+
+Token buckets per client and budget, kept in one block of shared memory
+that every worker process on the host maps. A client looping on
+/api/predict/ is limited host-wide, and a check is a hash, a lock and a
+few loads and stores (no cache round trip).
+
+Every API endpoint draws tokens from one budget (settings.RATE_LIMIT_COSTS):
+
+    predict, upload finalize     "inference", 1 token
+    tiled prediction             "inference", 4 tokens (scores dozens of tiles)
+    offline history sync         "inference", 4 tokens (bulk insert, sampled re-scoring)
+    TFLite download, export      "download",  1 token
+    everything else              "api",       1 token
+
+Budgets are "capacity/seconds" (settings.RATE_LIMIT_BUDGETS) and refill
+continuously. Clients are identified by a configured API key (X-API-Key,
+whose budget multiplier is in RATE_LIMIT_API_KEYS; 0 exempts the key) or
+else by IP address.
+
+Responses carry X-RateLimit-Limit, X-RateLimit-Remaining and
+X-RateLimit-Reset (seconds until the bucket is full); rejected requests
+get 429 with Retry-After.
+
+Table layout: RATE_LIMIT_SLOTS slots of three 8-byte fields (key hash,
+tokens, last update), in groups of PROBE_WINDOW. A key lives anywhere in
+its group; a slot idle long enough for any bucket to have refilled is
+free, and a full group evicts its least recently used slot. Each group is
+guarded by a striped thread lock within the process and an fcntl
+byte-range lock across processes.
+"""
+
+import atexit
+import hashlib
+import logging
+import math
+import os
+import tempfile
+import threading
+import time
+from functools import lru_cache
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: the table is per process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SLOT_FIELDS = 3  # key hash, tokens, updated (time.monotonic() seconds)
+PROBE_WINDOW = 8
+LOCK_STRIPES = 64
+TABLE_VERSION = 1
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int
+
+
+def parse_budget(value: str) -> tuple[float, float]:
+    """'60/60' → (capacity 60 tokens, refilled over 60 seconds)."""
+    capacity, _, seconds = value.partition("/")
+    capacity, seconds = float(capacity), float(seconds or 1)
+    if capacity <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate-limit budget: {value!r}")
+    return capacity, seconds
+
+
+@lru_cache(maxsize=4096)
+def _key_hash(text: str) -> int:
+    """Stable across processes (unlike hash()); 0 marks an empty slot."""
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little") or 1
+
+
+# ─── Shared Table ────────────────────────────────────────────────────
+
+
+def _attach_shared_memory(name: str, size: int):
+    """Creates the named block, or attaches to the one another worker created."""
+    from multiprocessing import resource_tracker, shared_memory
+
+    try:
+        block = shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        block = shared_memory.SharedMemory(name=name)
+    # The table outlives any one worker; don't let this process's exit unlink it
+    resource_tracker.unregister(block._name, "shared_memory")
+    if block.size < size:
+        raise ValueError(f"Shared memory block {name} is smaller than expected")
+    return block
+
+
+class BucketTable:
+    """Token buckets keyed by 64-bit hashes, in shared (or local) memory."""
+
+    def __init__(self, slots: int, idle_after: float, shared_name: str | None = None):
+        self.groups = max(1, slots // PROBE_WINDOW)
+        self.idle_after = idle_after
+        size = self.groups * PROBE_WINDOW * SLOT_FIELDS * 8
+
+        self._block = None
+        self._lock_fd = None
+        if shared_name and fcntl is not None:
+            try:
+                lock_path = os.path.join(tempfile.gettempdir(), f"{shared_name}.lock")
+                self._lock_fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+                self._block = _attach_shared_memory(shared_name, size)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Rate limits fall back to per-process buckets: {e}")
+                self._lock_fd = None
+        self.shared = self._block is not None
+
+        self._buffer = memoryview(self._block.buf if self._block is not None else bytearray(size))
+        self._keys = self._buffer.cast("Q")
+        self._values = self._buffer.cast("d")
+        self._thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        if self._block is not None:
+            atexit.register(self._close)
+
+    def _close(self) -> None:
+        # The block can only be unmapped once no views of it remain
+        for view in (self._keys, self._values, self._buffer):
+            view.release()
+        self._block.close()
+
+    def take(self, key: int, cost: float, capacity: float, rate: float) -> tuple[bool, float]:
+        """
+        Refills the key's bucket, then removes `cost` tokens if it holds that
+        many. Returns (allowed, tokens left).
+        """
+        group = key % self.groups
+        stripe = group % LOCK_STRIPES
+        keys, values = self._keys, self._values
+
+        with self._thread_locks[stripe]:
+            # fcntl locks belong to the process, so threads also need the lock above
+            if self._lock_fd is not None:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                now = time.monotonic()
+                first = group * PROBE_WINDOW
+                slot = free = oldest = None
+                for candidate in range(first, first + PROBE_WINDOW):
+                    index = candidate * SLOT_FIELDS
+                    if keys[index] == key:
+                        slot = candidate
+                        break
+                    updated = values[index + 2]
+                    if free is None and (keys[index] == 0 or now - updated >= self.idle_after):
+                        free = candidate
+                    elif oldest is None or updated < values[oldest * SLOT_FIELDS + 2]:
+                        oldest = candidate
+
+                if slot is None:
+                    if free is None:
+                        metrics.increment("ratelimit.evictions")
+                    slot = free if free is not None else oldest
+                    index = slot * SLOT_FIELDS
+                    keys[index] = key
+                    tokens = capacity
+                else:
+                    index = slot * SLOT_FIELDS
+                    tokens = min(capacity, values[index + 1] + (now - values[index + 2]) * rate)
+
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                values[index + 1] = tokens
+                values[index + 2] = now
+            finally:
+                if self._lock_fd is not None:
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+        return allowed, tokens
+
+
+# ─── Limiter ─────────────────────────────────────────────────────────
+
+
+class RateLimiter:
+    def __init__(self, table: BucketTable, budgets: dict[str, tuple[float, float]]):
+        self.table = table
+        self.budgets = budgets
+
+    def check(self, client: str, budget: str, cost: float, multiplier: float = 1.0) -> RateLimitDecision:
+        capacity, seconds = self.budgets[budget]
+        capacity *= multiplier
+        rate = capacity / seconds
+        allowed, tokens = self.table.take(_key_hash(f"{budget}|{client}"), cost, capacity, rate)
+        return RateLimitDecision(
+            allowed=allowed,
+            limit=int(capacity),
+            remaining=max(0, int(tokens)),
+            reset=math.ceil((capacity - tokens) / rate),
+            retry_after=0 if allowed else math.ceil((cost - tokens) / rate),
+        )
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                budgets = {name: parse_budget(value) for name, value in settings.RATE_LIMIT_BUDGETS.items()}
+                # Names are per project directory, so two checkouts don't share limits
+                project = hashlib.blake2b(str(settings.BASE_DIR).encode(), digest_size=4).hexdigest()
+                table = BucketTable(
+                    slots=settings.RATE_LIMIT_SLOTS,
+                    idle_after=max(seconds for _, seconds in budgets.values()),
+                    shared_name=f"leaflens-rl{TABLE_VERSION}-{settings.RATE_LIMIT_SLOTS}-{project}",
+                )
+                metrics.set_info(
+                    "rate_limit",
+                    {
+                        "shared": table.shared,
+                        "slots": table.groups * PROBE_WINDOW,
+                        "budgets": dict(settings.RATE_LIMIT_BUDGETS),
+                    },
+                )
+                _limiter = RateLimiter(table, budgets)
+    return _limiter
+
+
+# ─── Middleware ──────────────────────────────────────────────────────
+
+
+def client_identity(request) -> tuple[str, float]:
+    """(client id, budget multiplier) for a request."""
+    api_key = request.headers.get("X-API-Key")
+    if api_key and api_key in settings.RATE_LIMIT_API_KEYS:
+        return f"key:{api_key}", settings.RATE_LIMIT_API_KEYS[api_key]
+
+    address = request.META.get("REMOTE_ADDR", "")
+    if settings.RATE_LIMIT_TRUST_X_FORWARDED_FOR:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            address = forwarded.split(",")[0].strip()
+    return f"ip:{address}", 1.0
+
+
+class RateLimitMiddleware:
+    """Applies the token buckets to every /api/ view (see module docstring)."""
+
+    def __init__(self, get_response):
+        if not settings.RATE_LIMIT_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        decision = getattr(request, "rate_limit", None)
+        if decision is not None:
+            response["X-RateLimit-Limit"] = str(decision.limit)
+            response["X-RateLimit-Remaining"] = str(decision.remaining)
+            response["X-RateLimit-Reset"] = str(decision.reset)
+            if not decision.allowed:
+                response["Retry-After"] = str(decision.retry_after)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if request.method == "OPTIONS" or match is None or match.app_name != "prediction":
+            return None
+
+        client, multiplier = client_identity(request)
+        if multiplier == 0:
+            return None
+        budget, cost = settings.RATE_LIMIT_COSTS.get(match.url_name, ("api", 1))
+        decision = get_limiter().check(client, budget, cost, multiplier)
+        request.rate_limit = decision
+        if decision.allowed:
+            return None
+
+        metrics.increment(f"ratelimit.rejected.{budget}")
+        return JsonResponse(
+            {
+                "error": f"Rate limit exceeded for {budget} requests. "
+                f"Retry in {decision.retry_after} s.",
+                "retry_after": decision.retry_after,
+            },
+            status=429,
+        )
@@ -0,0 +1,44 @@
+"""
+LeafLens - Streamed Response Renderers
+@Maharsh Doshi
+
+Lets the prediction views accept `Accept: text/event-stream` and
+`Accept: application/x-ndjson` (DRF answers 406 to media types no
+renderer offers). The streamed body itself is a StreamingHttpResponse
+built in views.py; these renderers only format the ordinary Responses
+such views can still return (e.g. a 400 before streaming starts).
+"""
+
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.settings import api_settings
+
+
+class EventStreamRenderer(BaseRenderer):
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return f"event: error\ndata: {json.dumps(data)}\n\n".encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps({"event": "error", "data": data}) + "\n").encode()
+
+
+# The default renderers first, so a plain request still gets JSON
+STREAMING_RENDERERS = [
+    *api_settings.DEFAULT_RENDERER_CLASSES,
+    EventStreamRenderer,
+    NDJSONRenderer,
+]
+STREAM_CONTENT_TYPES = {
+    renderer.format: renderer.media_type for renderer in (EventStreamRenderer, NDJSONRenderer)
+}
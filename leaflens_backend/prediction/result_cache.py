@@ -0,0 +1,80 @@
+"""
+LeafLens - Prediction Result Cache
+@Maharsh Doshi
+
+Predictions are deterministic for a given image and model, so they
+are cached by the image's content hash (the same SHA-256 used by the
+scan image storage). Re-uploads, retried requests and finalized
+chunked uploads of an already-seen image skip validation and
+inference entirely.
+
+The key includes the model file name (and the crop, for models other
+than the default), so deploying a new model naturally invalidates old
+answers. For the default crop it also names the inference mode: TTA
+with its confidence threshold, and the cascade's TFLite file (with its
+modification time) and thresholds, since any of them can change the
+answer and all are switched by settings alone.
+
+Grad-CAM explanations are stored under their own key next to the
+prediction, so plain predictions stay small in the cache.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+
+PREDICTION_CACHE_PREFIX = "leaflens:prediction"
+
+
+def _mode_tag() -> str:
+    """The default model's settings that change its answers (see ml_model.predict_disease)."""
+    tag = f":tta-{settings.ML_TTA_CONFIDENCE_THRESHOLD:g}" if settings.ML_TTA_ENABLED else ""
+    if settings.ML_CASCADE_ENABLED:
+        path = str(settings.ML_CASCADE_MODEL_PATH)
+        try:
+            # A replaced file keeps its name
+            version = int(os.stat(path).st_mtime)
+        except OSError:
+            version = 0
+        tag += (
+            f":cascade-{os.path.basename(path)}-{version}"
+            f"-{settings.ML_CASCADE_CONFIDENCE_THRESHOLD:g}-{settings.ML_CASCADE_MARGIN_THRESHOLD:g}"
+        )
+    return tag
+
+
+def _cache_key(digest: str, crop: str | None = None) -> str:
+    if crop and crop.lower() != settings.ML_DEFAULT_CROP:
+        from .model_router import get_router
+
+        spec = get_router().spec(crop)
+        model_tag = f"{spec.crop}:{os.path.basename(spec.model_path)}"
+    else:
+        model_tag = os.path.basename(str(settings.ML_MODEL_PATH)) + _mode_tag()
+    return f"{PREDICTION_CACHE_PREFIX}:{model_tag}:{digest}"
+
+
+def get_cached_prediction(digest: str, crop: str | None = None) -> dict | None:
+    """Returns the stored predict_disease() result for an image hash, if any."""
+    return cache.get(_cache_key(digest, crop))
+
+
+def cache_prediction(digest: str, prediction: dict, crop: str | None = None) -> None:
+    """Stores a predict_disease() result under the image hash."""
+    cache.set(_cache_key(digest, crop), prediction, timeout=settings.PREDICTION_CACHE_TTL)
+
+
+def _explanation_key(digest: str, crop: str | None = None) -> str:
+    layer = settings.ML_EXPLAIN_LAYER or "last-conv"
+    return f"{_cache_key(digest, crop)}:explanation:{layer}"
+
+
+def get_cached_explanation(digest: str, crop: str | None = None) -> dict | None:
+    """Returns the stored Grad-CAM explanation for an image hash, if any."""
+    return cache.get(_explanation_key(digest, crop))
+
+
+def cache_explanation(digest: str, explanation: dict, crop: str | None = None) -> None:
+    """Stores a Grad-CAM explanation under the image hash."""
+    cache.set(_explanation_key(digest, crop), explanation, timeout=settings.PREDICTION_CACHE_TTL)
@@ -5,6 +5,8 @@ LeafLens - DRF Serializers
 
 from rest_framework import serializers
 
+from .models import ScanHistory
+
 
 class PredictionRequestSerializer(serializers.Serializer):
     """Serializer for the prediction request (image upload + optional GPS)."""
@@ -73,3 +75,43 @@ class PredictionResponseSerializer(serializers.Serializer):
     # Weather (optional — only if GPS was provided)
     weather = WeatherInfoSerializer(required=False, allow_null=True)
     weather_risk = WeatherRiskSerializer(required=False, allow_null=True)
+
+
+class ScanHistorySerializer(serializers.ModelSerializer):
+    """One scan in /api/history/, with absolute image URLs once stored."""
+
+    thumbnail_url = serializers.SerializerMethodField()
+    image_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ScanHistory
+        fields = [
+            "id",
+            "crop",
+            "disease_class",
+            "confidence",
+            "source",
+            "model_version",
+            "latitude",
+            "longitude",
+            "city",
+            "temperature",
+            "humidity",
+            "weather_description",
+            "scanned_at",
+            "image_hash",
+            "thumbnail_url",
+            "image_url",
+        ]
+
+    def _url(self, field):
+        if not field:
+            return None  # Not written yet (see image_store.py)
+        request = self.context.get("request")
+        return request.build_absolute_uri(field.url) if request else field.url
+
+    def get_thumbnail_url(self, scan):
+        return self._url(scan.thumbnail)
+
+    def get_image_url(self, scan):
+        return self._url(scan.image)
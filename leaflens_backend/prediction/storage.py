@@ -0,0 +1,72 @@
+"""
+LeafLens - Content-Addressed Scan Image Storage
+@Maharsh Doshi
+
+Scan images are stored under their SHA-256 digest instead of the
+upload filename:
+
+    media/scans/originals/3f/a2/3fa2…e9.jpg
+    media/scans/thumbnails/3f/a2/3fa2…e9.webp
+    media/scans/model/3f/a2/3fa2…e9.webp
+
+The same photo uploaded a hundred times is stored once, and a file
+name alone tells us whether an image has been seen before.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 hex digest used as the storage key for an image."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def content_name(prefix: str, digest: str, extension: str) -> str:
+    """Sharded storage path for a digest: <prefix>/ab/cd/<digest><ext>."""
+    return f"{prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage for content-addressed names: a name that already
+    exists holds the same bytes, so saving it again is a no-op rather
+    than a renamed copy.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Write to a temp file and rename into place, so readers never see
+        # a partial image and concurrent writers of the same digest are safe.
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, full_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return name
+
+
+scan_image_storage = ContentAddressedStorage()
+
+
+def get_scan_image_storage():
+    """Storage callable referenced by ScanHistory's image fields."""
+    return scan_image_storage
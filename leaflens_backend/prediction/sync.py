@@ -0,0 +1,342 @@
+"""
+LeafLens - Offline Scan Sync
+@Maharsh Doshi
+
+Phones running the downloaded TFLite model keep their scans while
+offline and upload them in one batch when they reconnect:
+
+    POST /api/history/sync/
+    Content-Type: application/json  or  application/msgpack
+
+Records can be sent as a list of objects, or in the compact columnar
+form (field names once, then one array per record):
+
+    {"records": [{"client_id": "...", "disease_class": "Late Blight", ...}, ...]}
+    {"columns": ["client_id", "disease_class", "confidence", ...],
+     "rows": [["7f3a...", "Late Blight", 97.2, ...], ...]}
+
+Fields per record:
+
+    client_id       required, unique per scan (e.g. a UUID made on the phone)
+    disease_class   required, one of the crop's classes
+    confidence      required, 0-100
+    scanned_at      required, ISO 8601 or Unix seconds
+    crop            optional, default crop otherwise
+    model_version   optional, the TFLite version that made the prediction
+    latitude, longitude   optional
+    image           optional, JPEG/PNG bytes (base64 in JSON)
+
+Records whose client_id is already stored are skipped, so a phone can
+safely resend a batch whose response it never received. New rows are
+inserted with bulk_create(). A random sample of records that carry an
+image (SYNC_VERIFY_RATE, at most SYNC_VERIFY_MAX per request) is
+re-scored by the server model; the server's answer is stored next to
+the phone's, and the images of sampled scans are kept.
+"""
+
+import base64
+import binascii
+import logging
+import random
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from . import metrics
+from .geo import grid_cell
+from .model_router import UnknownCropError, get_router
+from .models import ScanHistory
+from .storage import content_hash
+
+try:
+    import msgpack
+except ImportError:  # MessagePack bodies are then rejected with 415
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+SYNC_FIELDS = (
+    "client_id",
+    "disease_class",
+    "confidence",
+    "scanned_at",
+    "crop",
+    "model_version",
+    "latitude",
+    "longitude",
+    "image",
+)
+
+# SQLite allows a limited number of query parameters
+LOOKUP_CHUNK = 500
+
+
+class SyncError(ValueError):
+    """A record (or the whole body) that cannot be synced."""
+
+
+class MessagePackParser(BaseParser):
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False, timestamp=3)
+        except Exception as e:
+            raise ParseError(f"MessagePack parse error: {e}")
+
+
+def sync_parsers() -> list:
+    from rest_framework.parsers import JSONParser
+
+    return [JSONParser, MessagePackParser] if msgpack is not None else [JSONParser]
+
+
+# ─── Parsing ─────────────────────────────────────────────────────────
+
+
+def iter_records(data) -> list[dict]:
+    """The records of a sync body, in either the list or the columnar form."""
+    if not isinstance(data, dict):
+        raise SyncError("Body must be an object with 'records' or 'columns' and 'rows'.")
+
+    if "columns" in data:
+        columns, rows = data["columns"], data.get("rows")
+        if not isinstance(columns, list) or not isinstance(rows, list):
+            raise SyncError("'columns' and 'rows' must be arrays.")
+        unknown = set(columns) - set(SYNC_FIELDS)
+        if unknown:
+            raise SyncError(f"Unknown columns: {', '.join(sorted(map(str, unknown)))}")
+        records = [
+            dict(zip(columns, row)) if isinstance(row, list) and len(row) == len(columns) else row
+            for row in rows
+        ]
+    else:
+        records = data.get("records")
+        if not isinstance(records, list):
+            raise SyncError("'records' must be an array.")
+
+    if len(records) > settings.SYNC_MAX_RECORDS:
+        raise SyncError(
+            f"At most {settings.SYNC_MAX_RECORDS} records per request; got {len(records)}."
+        )
+    return records
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):  # MessagePack timestamp extension
+        scanned_at = value
+    elif isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        try:
+            if isinstance(value, str):
+                scanned_at = parse_datetime(value)
+            else:
+                scanned_at = datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            # Well-formed but impossible ("2026-13-45"), or out of range (1e20)
+            scanned_at = None
+        if scanned_at is None:
+            raise SyncError(f"Invalid scanned_at: {value!r}")
+    else:
+        raise SyncError("scanned_at is required.")
+
+    if timezone.is_naive(scanned_at):
+        scanned_at = timezone.make_aware(scanned_at, dt_timezone.utc)
+    if (scanned_at - timezone.now()).total_seconds() > settings.SYNC_MAX_CLOCK_SKEW:
+        raise SyncError("scanned_at is in the future.")
+    return scanned_at
+
+
+def _coordinate(value, name, limit):
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise SyncError(f"Invalid {name}: {value!r}")
+    if not -limit <= value <= limit:
+        raise SyncError(f"{name} out of range: {value}")
+    return value
+
+
+def _image(value):
+    if value is None or isinstance(value, bytes):
+        return value
+    try:
+        return base64.b64decode(value, validate=True)
+    except (TypeError, binascii.Error):
+        raise SyncError("image must be bytes (MessagePack) or base64 (JSON).")
+
+
+def clean_record(record) -> tuple[ScanHistory, bytes | None]:
+    """Validates one record into an unsaved ScanHistory row (and its image)."""
+    if not isinstance(record, dict):
+        raise SyncError("Record must be an object (or a row matching 'columns').")
+
+    client_id = record.get("client_id")
+    if not isinstance(client_id, str) or not 0 < len(client_id) <= 64:
+        raise SyncError("client_id must be a string of 1-64 characters.")
+
+    crop = record.get("crop")
+    if crop is not None and not isinstance(crop, str):
+        raise SyncError("crop must be a string.")
+    try:
+        spec = get_router().spec(crop)
+    except UnknownCropError as e:
+        raise SyncError(str(e))
+    disease_class = record.get("disease_class")
+    if disease_class not in spec.class_names:
+        raise SyncError(f"Unknown {spec.crop} class: {disease_class!r}")
+
+    confidence = record.get("confidence")
+    if isinstance(confidence, bool) or not isinstance(confidence, (int, float)):
+        raise SyncError("confidence must be a number from 0 to 100.")
+    if not 0 <= confidence <= 100:
+        raise SyncError(f"confidence out of range: {confidence}")
+
+    model_version = record.get("model_version")
+    if model_version is not None:
+        model_version = str(model_version)[:50]
+
+    latitude = _coordinate(record.get("latitude"), "latitude", 90)
+    longitude = _coordinate(record.get("longitude"), "longitude", 180)
+    image = _image(record.get("image"))
+
+    scan = ScanHistory(
+        client_id=client_id,
+        source=ScanHistory.SOURCE_DEVICE,
+        model_version=model_version,
+        crop=spec.crop,
+        disease_class=disease_class,
+        confidence=round(float(confidence), 2),
+        latitude=latitude,
+        longitude=longitude,
+        # bulk_create() skips save(), which normally sets the cell
+        grid_cell=grid_cell(latitude, longitude),
+        scanned_at=_timestamp(record.get("scanned_at")),
+        image_hash=content_hash(image) if image else None,
+    )
+    return scan, image
+
+
+# ─── Sync ────────────────────────────────────────────────────────────
+
+
+def _existing_client_ids(client_ids: list[str]) -> set[str]:
+    existing = set()
+    for start in range(0, len(client_ids), LOOKUP_CHUNK):
+        chunk = client_ids[start : start + LOOKUP_CHUNK]
+        existing.update(
+            ScanHistory.objects.filter(client_id__in=chunk).values_list("client_id", flat=True)
+        )
+    return existing
+
+
+def _verify(scans: list[ScanHistory], images: dict[str, bytes]) -> dict:
+    """Re-scores a random sample of the scans that came with an image."""
+    from .ml_model import predict_disease
+
+    candidates = [scan for scan in scans if scan.client_id in images]
+    sample_size = 0
+    if candidates and settings.SYNC_VERIFY_RATE > 0:
+        # Any batch with images gets at least one check
+        wanted = max(1, round(len(candidates) * settings.SYNC_VERIFY_RATE))
+        sample_size = min(settings.SYNC_VERIFY_MAX, wanted)
+    sample = random.sample(candidates, sample_size)
+
+    agreed = failed = 0
+    for scan in sample:
+        try:
+            prediction = predict_disease(images[scan.client_id], crop=scan.crop)
+        except Exception as e:
+            logger.warning(f"Sync verification of {scan.client_id} failed: {e}")
+            failed += 1
+            continue
+        scan.verified_class = prediction["class"]
+        scan.verified_confidence = prediction["confidence"]
+        agreed += scan.verified_class == scan.disease_class
+
+    checked = len(sample) - failed
+    metrics.increment("sync.verified", checked)
+    metrics.increment("sync.verify_disagreements", checked - agreed)
+    return {
+        "sampled": len(sample),
+        "checked": checked,
+        "agreed": agreed,
+        "disagreements": [
+            {
+                "client_id": scan.client_id,
+                "device_class": scan.disease_class,
+                "server_class": scan.verified_class,
+                "server_confidence": scan.verified_confidence,
+            }
+            for scan in sample
+            if scan.verified_class is not None and scan.verified_class != scan.disease_class
+        ],
+    }
+
+
+def sync_records(records: list) -> dict:
+    """
+    Validates, deduplicates and inserts a batch of on-device scans.
+
+    Returns:
+        {"received", "created", "duplicates", "rejected": [{"index", "client_id", "error"}],
+         "verification": {...}}
+    """
+    from .image_store import schedule_scan_image
+
+    scans, images, rejected = [], {}, []
+    seen = set()
+    duplicates = 0
+    for index, record in enumerate(records):
+        try:
+            scan, image = clean_record(record)
+        except SyncError as e:
+            client_id = record.get("client_id") if isinstance(record, dict) else None
+            rejected.append({"index": index, "client_id": client_id, "error": str(e)})
+            continue
+        if scan.client_id in seen:
+            duplicates += 1
+            continue
+        seen.add(scan.client_id)
+        scans.append(scan)
+        if image:
+            images[scan.client_id] = image
+
+    existing = _existing_client_ids([scan.client_id for scan in scans])
+    duplicates += len(existing)
+    scans = [scan for scan in scans if scan.client_id not in existing]
+
+    verification = _verify(scans, images)
+
+    with transaction.atomic():
+        # A concurrent sync of the same records is skipped by the unique index
+        ScanHistory.objects.bulk_create(scans, batch_size=LOOKUP_CHUNK, ignore_conflicts=True)
+
+    # Keep the images of verified scans, e.g. for reviewing disagreements
+    verified = [scan.client_id for scan in scans if scan.verified_class is not None]
+    if verified:
+        rows = ScanHistory.objects.filter(client_id__in=verified).values_list(
+            "pk", "client_id", "image_hash"
+        )
+        for pk, client_id, image_hash in rows:
+            schedule_scan_image(pk, images[client_id], image_hash)
+
+    metrics.increment("sync.records_created", len(scans))
+    metrics.increment("sync.records_duplicate", duplicates)
+    metrics.increment("sync.records_rejected", len(rejected))
+    logger.info(
+        f"Synced {len(scans)} on-device scans ({duplicates} duplicates, {len(rejected)} rejected)"
+    )
+    return {
+        "received": len(records),
+        "created": len(scans),
+        "duplicates": duplicates,
+        "rejected": rejected,
+        "verification": verification,
+    }
@@ -0,0 +1,124 @@
+"""
+LeafLens - Raw Tensor Uploads
+@Maharsh Doshi
+
+The mobile app already resizes each photo to 256x256 for its local
+TFLite model, so it can send those pixels instead of a JPEG and spare
+the server a decode and two resizes:
+
+    POST /api/predict/?latitude=19.07&longitude=72.87
+    Content-Type: application/x-leaflens-tensor; shape=256,256,3; encoding=zlib; crc32=9a1f03c2
+
+    body: 256*256*3 uint8 RGB values, row-major (HWC), optionally compressed
+
+Content-type parameters:
+
+    shape      optional, must be 256,256,3 (the model input)
+    dtype      optional, must be uint8
+    encoding   identity (default), zlib or gzip
+    crc32      required, CRC-32 of the uncompressed pixels, 8 hex digits
+
+The pixels become a read-only NumPy view over the request bytes
+(np.frombuffer, no copy) that goes straight to leaf validation and
+inference. Form fields (latitude, longitude, crop, explain, stream) go
+in the query string.
+"""
+
+import zlib
+from typing import TYPE_CHECKING, NamedTuple
+
+from django.utils.http import parse_header_parameters
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from .constants import IMAGE_SIZE
+from .storage import content_hash
+
+if TYPE_CHECKING:
+    import numpy as np
+
+TENSOR_CONTENT_TYPE = "application/x-leaflens-tensor"
+TENSOR_SHAPE = IMAGE_SIZE + (3,)
+TENSOR_BYTES = TENSOR_SHAPE[0] * TENSOR_SHAPE[1] * TENSOR_SHAPE[2]
+TENSOR_ENCODINGS = {"identity": None, "zlib": zlib.MAX_WBITS, "gzip": 16 + zlib.MAX_WBITS}
+
+
+class LeafTensor(NamedTuple):
+    pixels: "np.ndarray"  # TENSOR_SHAPE uint8, read-only
+    digest: str  # SHA-256 of the uncompressed pixels
+    body: bytes  # As received, for traffic capture
+    content_type: str
+
+
+def _decompress(body: bytes, encoding: str) -> bytes:
+    wbits = TENSOR_ENCODINGS.get(encoding, -1)
+    if wbits == -1:
+        raise ParseError(f"Unsupported tensor encoding: {encoding} (use identity, zlib or gzip).")
+    if wbits is None:
+        return body
+    decompressor = zlib.decompressobj(wbits)
+    try:
+        # Never inflate past one tensor, however the body was crafted
+        raw = decompressor.decompress(body, TENSOR_BYTES + 1)
+    except zlib.error as e:
+        raise ParseError(f"Invalid {encoding} tensor data: {e}")
+    if not decompressor.eof:
+        raise ParseError(f"Tensor must be exactly {TENSOR_BYTES} bytes uncompressed.")
+    return raw
+
+
+def parse_tensor(body: bytes, content_type: str) -> LeafTensor:
+    """Validates and unpacks a tensor upload; raises ParseError if it is malformed."""
+    import numpy as np
+
+    _, params = parse_header_parameters(content_type)
+    shape = params.get("shape")
+    if shape is not None and shape.replace(" ", "") != ",".join(map(str, TENSOR_SHAPE)):
+        raise ParseError(f"Tensor shape must be {','.join(map(str, TENSOR_SHAPE))}, got {shape}.")
+    if params.get("dtype", "uint8") != "uint8":
+        raise ParseError("Tensor dtype must be uint8.")
+
+    checksum = params.get("crc32")
+    if checksum is None:
+        raise ParseError("Tensor content type needs a crc32 parameter.")
+    try:
+        checksum = int(checksum, 16)
+    except ValueError:
+        raise ParseError(f"Invalid crc32: {params['crc32']}")
+
+    raw = _decompress(body, params.get("encoding", "identity").lower())
+    if len(raw) != TENSOR_BYTES:
+        raise ParseError(f"Tensor must be exactly {TENSOR_BYTES} bytes uncompressed, got {len(raw)}.")
+    if zlib.crc32(raw) != checksum:
+        raise ParseError("Tensor checksum mismatch.")
+
+    pixels = np.frombuffer(raw, dtype=np.uint8).reshape(TENSOR_SHAPE)
+    return LeafTensor(pixels, content_hash(raw), body, content_type)
+
+
+class TensorParser(BaseParser):
+    """request.data becomes {"tensor": LeafTensor}."""
+
+    media_type = TENSOR_CONTENT_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        # The largest legitimate body: uncompressed, or compressed with some overhead
+        limit = TENSOR_BYTES + 1024
+        body = stream.read(limit + 1) if stream is not None else b""
+        if not body:
+            raise ParseError("Empty tensor upload.")
+        if len(body) > limit:
+            raise ParseError("Tensor upload is too large.")
+        return {"tensor": parse_tensor(body, media_type or TENSOR_CONTENT_TYPE)}
+
+
+def tensor_upload_info() -> dict:
+    """How to send a tensor upload (advertised by GET /api/tflite/info/)."""
+    return {
+        "content_type": TENSOR_CONTENT_TYPE,
+        "shape": list(TENSOR_SHAPE),
+        "dtype": "uint8",
+        "layout": "HWC, RGB",
+        "encodings": list(TENSOR_ENCODINGS),
+        "checksum": "crc32 of the uncompressed bytes, hex",
+    }
@@ -0,0 +1,8 @@
+"""
+LeafLens - Tests
+@Maharsh Doshi
+
+One module per prediction module. None of them loads TensorFlow:
+
+    python manage.py test prediction
+"""
@@ -0,0 +1,95 @@
+"""
+LeafLens - Scan History Archive Tests
+@Maharsh Doshi
+"""
+
+import importlib.util
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .. import archive, history
+from ..models import ScanHistory
+
+
+def _pages(params: dict, limit: int) -> list[int]:
+    ids, params = [], dict(params)
+    while True:
+        scans, cursor = history.history_page(params, limit)
+        ids += [scan.id for scan in scans]
+        if cursor is None:
+            return ids
+        params["cursor"] = cursor
+
+
+@skipUnless(importlib.util.find_spec("pyarrow"), "the scan archive needs pyarrow")
+class ArchivedHistoryTests(TestCase):
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir)
+        overrides = override_settings(SCAN_ARCHIVE_DIR=self.archive_dir)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        now = timezone.now()
+        scans = []
+        for index in range(60):
+            scans.append(
+                ScanHistory(
+                    disease_class=("Early Blight", "Late Blight", "Healthy")[index % 3],
+                    confidence=50 + index % 50,
+                    city="Pune" if index % 2 else "Mumbai",
+                    # Every third scan shares a timestamp with the previous one
+                    scanned_at=now - timedelta(days=10 * (index - index // 3)),
+                )
+            )
+        ScanHistory.objects.bulk_create(scans)
+
+    def _archive_older_than(self, months: int) -> None:
+        for month in archive.months_to_archive(archive.retention_cutoff(months)):
+            archive.archive_month(month)
+
+    def test_pages_and_exports_read_across_archived_months(self):
+        filters = [{}, {"city": "pune"}, {"source": "server", "date_from": "2025-01-01"}]
+        before = {
+            json.dumps(params): (_pages(params, 7), list(history.iter_export_rows(params)))
+            for params in filters
+        }
+
+        self._archive_older_than(3)
+        self.assertLess(ScanHistory.objects.count(), 60)
+        self.assertTrue(archive.archived_months())
+
+        for params in filters:
+            pages, rows = before[json.dumps(params)]
+            with self.subTest(params=params):
+                self.assertEqual(_pages(params, 7), pages)
+                self.assertEqual(list(history.iter_export_rows(params)), rows)
+
+    def test_late_scan_in_an_archived_month(self):
+        self._archive_older_than(3)
+        late = ScanHistory.objects.create(
+            disease_class="Healthy",
+            confidence=99,
+            scanned_at=timezone.now() - timedelta(days=300),
+        )
+        ids = _pages({}, 5)
+        self.assertIn(late.id, ids)
+        self.assertEqual(len(ids), len(set(ids)))
+
+        rows = list(history.iter_export_rows({}))
+        self.assertEqual(rows, sorted(rows, key=lambda row: (row["scanned_at"], row["id"])))
+
+    def test_failed_rename_keeps_the_rows(self):
+        month = archive.months_to_archive(archive.retention_cutoff(3))[0]
+        count = ScanHistory.objects.count()
+        with mock.patch("prediction.archive.os.replace", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                archive.archive_month(month)
+        self.assertEqual(ScanHistory.objects.count(), count)
+        self.assertEqual(archive.archived_months(), [])
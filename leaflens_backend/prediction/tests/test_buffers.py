@@ -0,0 +1,78 @@
+"""
+LeafLens - Pooled Tensor Buffer Tests
+@Maharsh Doshi
+"""
+
+import threading
+
+import numpy as np
+from django.test import SimpleTestCase
+
+from ..buffers import BufferPool, fill_input
+
+
+class BufferPoolTests(SimpleTestCase):
+    def test_released_buffer_is_reused(self):
+        pool = BufferPool((1, 4, 4, 3))
+        with pool.borrow() as first:
+            self.assertEqual((first.shape, first.dtype), ((1, 4, 4, 3), np.float32))
+        with pool.borrow() as second:
+            self.assertIs(second, first)
+
+    def test_concurrent_borrowers_get_distinct_buffers(self):
+        pool = BufferPool((2,))
+        with pool.borrow() as first, pool.borrow() as second:
+            self.assertIsNot(first, second)
+
+    def test_at_most_max_buffers_are_kept(self):
+        pool = BufferPool((2,), max_buffers=2)
+        buffers = [pool.acquire() for _ in range(3)]
+        for buffer in buffers:
+            pool.release(buffer)
+        reused = [pool.acquire() for _ in range(3)]
+        self.assertEqual(sum(any(b is r for b in buffers) for r in reused), 2)
+
+    def test_buffer_returned_after_an_exception(self):
+        pool = BufferPool((2,))
+        with self.assertRaises(RuntimeError), pool.borrow() as buffer:
+            raise RuntimeError
+        self.assertIs(pool.acquire(), buffer)
+
+    def test_threads(self):
+        pool = BufferPool((8,), max_buffers=4)
+        seen = []
+
+        def work(value):
+            for _ in range(200):
+                with pool.borrow() as buffer:
+                    buffer[:] = value
+                    seen.append(bool((buffer == value).all()))
+
+        threads = [threading.Thread(target=work, args=(value,)) for value in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all(seen))
+        self.assertLessEqual(len(pool._free), 4)
+
+
+class FillInputTests(SimpleTestCase):
+    def setUp(self):
+        self.pixels = np.arange(48, dtype=np.uint8).reshape(4, 4, 3) * 5
+
+    def test_scaled(self):
+        out = np.empty((4, 4, 3), dtype=np.float32)
+        result = fill_input(self.pixels, out, 1.0 / 255.0)
+        self.assertIs(result, out)
+        np.testing.assert_allclose(out, self.pixels / 255.0, rtol=1e-6)
+
+    def test_unscaled(self):
+        out = np.empty((4, 4, 3), dtype=np.float32)
+        fill_input(self.pixels, out, 1.0)
+        np.testing.assert_array_equal(out, self.pixels.astype(np.float32))
+
+    def test_overwrites_a_reused_buffer(self):
+        out = np.full((4, 4, 3), np.nan, dtype=np.float32)
+        fill_input(np.zeros((4, 4, 3), dtype=np.uint8), out, 1.0 / 255.0)
+        self.assertFalse(out.any())
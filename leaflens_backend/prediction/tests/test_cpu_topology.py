@@ -0,0 +1,91 @@
+"""
+LeafLens - CPU Topology Tests
+@Maharsh Doshi
+"""
+
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from .. import cpu_topology
+
+
+class CgroupLimitTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        for name in ("CGROUP_V2_CPU_MAX", "CGROUP_V1_QUOTA", "CGROUP_V1_PERIOD"):
+            patcher = mock.patch.object(cpu_topology, name, os.path.join(self.directory, name))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _write(self, name, content):
+        with open(getattr(cpu_topology, name), "w") as f:
+            f.write(content)
+
+    def test_no_cgroup_files(self):
+        self.assertIsNone(cpu_topology.cgroup_cpu_limit())
+
+    def test_v2_quota(self):
+        self._write("CGROUP_V2_CPU_MAX", "250000 100000\n")
+        self.assertEqual(cpu_topology.cgroup_cpu_limit(), 2.5)
+
+    def test_v2_unlimited(self):
+        self._write("CGROUP_V2_CPU_MAX", "max 100000\n")
+        self._write("CGROUP_V1_QUOTA", "100000\n")
+        self._write("CGROUP_V1_PERIOD", "100000\n")
+        self.assertIsNone(cpu_topology.cgroup_cpu_limit())
+
+    def test_v1_quota(self):
+        self._write("CGROUP_V1_QUOTA", "150000\n")
+        self._write("CGROUP_V1_PERIOD", "100000\n")
+        self.assertEqual(cpu_topology.cgroup_cpu_limit(), 1.5)
+
+    def test_v1_unlimited(self):
+        self._write("CGROUP_V1_QUOTA", "-1\n")
+        self._write("CGROUP_V1_PERIOD", "100000\n")
+        self.assertIsNone(cpu_topology.cgroup_cpu_limit())
+
+    def test_malformed_v2_falls_back_to_v1(self):
+        self._write("CGROUP_V2_CPU_MAX", "garbage\n")
+        self._write("CGROUP_V1_QUOTA", "200000\n")
+        self._write("CGROUP_V1_PERIOD", "100000\n")
+        self.assertEqual(cpu_topology.cgroup_cpu_limit(), 2.0)
+
+
+@override_settings(
+    WEB_CONCURRENCY=3, ML_RESERVED_CPUS=1, ML_INTRA_OP_THREADS=0, ML_INTER_OP_THREADS=0,
+    ML_PIN_CPUS=False,
+)
+@mock.patch.object(cpu_topology, "allowed_cpu_ids", return_value=list(range(8)))
+class PlanLayoutTests(SimpleTestCase):
+    def test_cpus_split_between_workers(self, _):
+        with mock.patch.object(cpu_topology, "cgroup_cpu_limit", return_value=None):
+            layout = cpu_topology.plan_layout()
+        self.assertEqual(layout["cpus_effective"], 8)
+        # (8 - 1 reserved) // 3 workers
+        self.assertEqual((layout["intra_op_threads"], layout["tflite_threads"]), (2, 2))
+        self.assertEqual(layout["inter_op_threads"], 1)
+        self.assertIsNone(layout["pinned_cpus"])
+
+    def test_quota_caps_the_affinity_mask(self, _):
+        for limit, effective in ((2.5, 2), (0.5, 1), (16.0, 8)):
+            with self.subTest(limit=limit), mock.patch.object(
+                cpu_topology, "cgroup_cpu_limit", return_value=limit
+            ):
+                self.assertEqual(cpu_topology.effective_cpu_count(), effective)
+                layout = cpu_topology.plan_layout()
+                self.assertEqual(layout["cgroup_cpu_limit"], limit)
+                self.assertEqual(layout["intra_op_threads"], max((effective - 1) // 3, 1))
+
+    @override_settings(ML_INTRA_OP_THREADS=6, ML_INTER_OP_THREADS=2)
+    def test_explicit_thread_counts_win(self, _):
+        with mock.patch.object(cpu_topology, "cgroup_cpu_limit", return_value=None):
+            layout = cpu_topology.plan_layout()
+        self.assertEqual(
+            (layout["intra_op_threads"], layout["inter_op_threads"], layout["tflite_threads"]),
+            (6, 2, 6),
+        )
@@ -0,0 +1,117 @@
+"""
+LeafLens - Spatial Grid Tests
+@Maharsh Doshi
+"""
+
+import math
+from datetime import timedelta
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .. import geo
+from ..models import ScanHistory
+
+
+def _offset(latitude, longitude, north_km=0.0, east_km=0.0) -> tuple[float, float]:
+    """The point `north_km` north and `east_km` east of (latitude, longitude), away from the poles."""
+    return (
+        latitude + north_km / geo.KM_PER_DEGREE_LAT,
+        longitude + east_km / (geo.KM_PER_DEGREE_LAT * math.cos(math.radians(latitude))),
+    )
+
+
+class CellsWithinTests(SimpleTestCase):
+    def assertCovers(self, latitude, longitude, radius_km):
+        """Every point of a fine lat/lon mesh inside the circle lies in a listed cell."""
+        cells = set(geo.cells_within(latitude, longitude, radius_km))
+        span = 1.5 * radius_km / geo.KM_PER_DEGREE_LAT
+        lats = np.clip(np.linspace(latitude - span, latitude + span, 61), -90, 90)
+        lons = np.linspace(-180, 180, 14401)[:-1]  # half a cell apart
+        mesh_lats, mesh_lons = (axis.ravel() for axis in np.meshgrid(lats, lons))
+        inside = geo.haversine_km(latitude, longitude, mesh_lats, mesh_lons) <= radius_km
+        self.assertTrue(inside.any())
+        # One representative point per cell the mesh touches
+        points = np.stack([mesh_lats[inside], mesh_lons[inside]], axis=1)
+        _, first = np.unique(np.floor(points / geo.GRID_CELL_DEGREES), axis=0, return_index=True)
+        missing = {geo.grid_cell(float(lat), float(lon)) for lat, lon in points[first]} - cells
+        self.assertEqual(missing, set())
+
+    def test_covers_the_circle(self):
+        self.assertCovers(18.52, 73.85, 5)
+        self.assertCovers(-33.9, 18.4, 50)
+
+    def test_antimeridian(self):
+        for longitude in (179.99, -179.99):
+            with self.subTest(longitude=longitude):
+                self.assertCovers(-17.7, longitude, 10)
+        columns = {cell % geo.GRID_COLS for cell in geo.cells_within(-17.7, 179.99, 10)}
+        self.assertIn(0, columns)
+        self.assertIn(geo.GRID_COLS - 1, columns)
+
+    def test_near_the_poles(self):
+        self.assertCovers(89.97, 10.0, 5)
+        self.assertCovers(-89.99, -120.0, 5)
+        # The circle spans every longitude there
+        cells = geo.cells_within(89.99, 0.0, 5)
+        self.assertEqual({cell % geo.GRID_COLS for cell in cells}, set(range(geo.GRID_COLS)))
+        self.assertEqual(max(cells) // geo.GRID_COLS, geo.GRID_ROWS - 1)
+
+    def test_cells_are_unique_and_valid(self):
+        cells = geo.cells_within(0.0, 179.99, 50)
+        self.assertEqual(len(cells), len(set(cells)))
+        self.assertTrue(all(0 <= cell < geo.GRID_ROWS * geo.GRID_COLS for cell in cells))
+
+
+class NearbyScansTests(TestCase):
+    def _scan(self, latitude, longitude, disease="Late Blight", age=timedelta(hours=1)):
+        return ScanHistory.objects.create(
+            disease_class=disease,
+            confidence=90,
+            latitude=latitude,
+            longitude=longitude,
+            scanned_at=timezone.now() - age,
+        )
+
+    def test_haversine_post_filter(self):
+        origin = (18.52, 73.85)
+        near = self._scan(*_offset(*origin, north_km=1))
+        nearer = self._scan(*_offset(*origin, east_km=-0.5))
+        # Inside the bounding box (and its grid cells), outside the circle
+        corner = self._scan(*_offset(*origin, north_km=4, east_km=4))
+        self.assertIn(corner.grid_cell, geo.cells_within(*origin, 5))
+
+        scans = geo.nearby_scans(*origin, radius_km=5, days=7)
+        self.assertEqual([scan["id"] for scan in scans], [nearer.id, near.id])
+        self.assertAlmostEqual(scans[0]["distance_km"], 0.5, places=2)
+
+    def test_across_the_antimeridian(self):
+        east = self._scan(-17.7, 179.98)
+        west = self._scan(-17.7, -179.98)
+        scans = geo.nearby_scans(-17.7, 179.99, radius_km=5, days=7)
+        self.assertEqual({scan["id"] for scan in scans}, {east.id, west.id})
+
+    def test_old_scans_are_excluded(self):
+        self._scan(18.52, 73.85, age=timedelta(days=8))
+        self.assertEqual(geo.nearby_scans(18.52, 73.85, radius_km=5, days=7), [])
+
+
+@override_settings(RATE_LIMIT_ENABLED=False, OUTBREAK_MAX_DAYS=30)
+class OutbreaksNearbyViewTests(TestCase):
+    def _get(self, **params):
+        return self.client.get(
+            "/api/outbreaks/nearby/", {"latitude": 18.52, "longitude": 73.85, **params}
+        )
+
+    def test_days_out_of_range(self):
+        for days in (0, 31, 100000000):
+            with self.subTest(days=days):
+                response = self._get(days=days)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("days in [1, 30]", response.json()["error"])
+
+    def test_days_at_the_limit(self):
+        response = self._get(days=30)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["total"], 0)
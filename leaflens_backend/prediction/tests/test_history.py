@@ -0,0 +1,44 @@
+"""
+LeafLens - Scan History Tests
+@Maharsh Doshi
+"""
+
+from datetime import datetime
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .. import history
+
+
+class ScanFiltersTests(SimpleTestCase):
+    def test_date_bounds(self):
+        lookups = history.scan_filters({"date_from": "2026-06-01", "date_to": "2026-06-30"})
+        self.assertEqual(
+            lookups["scanned_at__gte"], timezone.make_aware(datetime(2026, 6, 1))
+        )
+        # A bare date covers the whole day
+        self.assertEqual(lookups["scanned_at__lt"], timezone.make_aware(datetime(2026, 7, 1)))
+
+    def test_datetime_upper_bound_is_inclusive(self):
+        lookups = history.scan_filters({"date_to": "2026-06-30T12:00:00+05:30"})
+        self.assertEqual(list(lookups), ["scanned_at__lte"])
+
+    def test_invalid_dates(self):
+        values = ("soon", "2026-13-45", "2026-02-30T00:00:00", "2026-06-01T25:00:00", "9999-12-31")
+        for value in values:
+            with self.subTest(date_to=value), self.assertRaises(history.HistoryQueryError):
+                history.scan_filters({"date_to": value})
+        with self.assertRaises(history.HistoryQueryError):
+            history.scan_filters({"date_from": "2026-13-45"})
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class HistoryEndpointTests(TestCase):
+    def test_impossible_dates_are_bad_requests(self):
+        for url in ("/api/history/", "/api/history/export/"):
+            for params in ({"date_from": "2026-13-45"}, {"date_to": "2026-02-30T00:00:00"}):
+                with self.subTest(url=url, params=params):
+                    response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn("Invalid date", response.json()["error"])
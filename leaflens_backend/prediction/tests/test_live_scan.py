@@ -0,0 +1,41 @@
+"""
+LeafLens - Live-Scan WebSocket Tests
+@Maharsh Doshi
+"""
+
+import asyncio
+import json
+
+from django.test import SimpleTestCase
+
+from ..live_scan import LiveScanSession
+
+
+class HandleTextTests(SimpleTestCase):
+    def _replies(self, *texts) -> list[dict]:
+        sent = []
+
+        async def send(message):
+            sent.append(json.loads(message["text"]))
+
+        async def run():
+            session = LiveScanSession(send)
+            for text in texts:
+                await session.handle_text(text)
+
+        asyncio.run(run())
+        return sent
+
+    def test_ping(self):
+        self.assertEqual(self._replies('{"type": "ping"}'), [{"type": "pong"}])
+
+    def test_messages_that_are_not_objects(self):
+        for text in ("not json", "[]", "42", '"ping"', "null"):
+            with self.subTest(text=text):
+                self.assertEqual(
+                    self._replies(text), [{"type": "error", "error": "Invalid JSON message."}]
+                )
+
+    def test_session_survives_a_bad_message(self):
+        replies = self._replies("[]", '{"type": "ping"}')
+        self.assertEqual([reply["type"] for reply in replies], ["error", "pong"])
@@ -0,0 +1,137 @@
+"""
+LeafLens - ML Model Tests
+@Maharsh Doshi
+"""
+
+from concurrent.futures import Future
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from .. import ml_model
+from ..ml_model import CLASS_NAMES, TTA_CROP_SCALE, build_tta_batch
+
+SIZE = 256
+
+
+class BuildTtaBatchTests(SimpleTestCase):
+    def setUp(self):
+        # Every value encodes its own position: y * SIZE + x + channel / 4
+        y, x, channel = np.indices((SIZE, SIZE, 3))
+        self.image = (y * SIZE + x + channel / 4).astype(np.float32)
+        self.batch = build_tta_batch(self.image[np.newaxis])
+
+    def test_shape(self):
+        self.assertEqual(self.batch.shape, (9, SIZE, SIZE, 3))
+        self.assertEqual(self.batch.dtype, np.float32)
+        self.assertTrue(self.batch.flags.c_contiguous)
+
+    def test_flips_and_rotations(self):
+        y, x = np.indices((SIZE, SIZE))
+        last = SIZE - 1
+        expected = {
+            "horizontal flip": self.image[y, last - x],
+            "vertical flip": self.image[last - y, x],
+            "rotation by 90°": self.image[x, last - y],
+            "rotation by 270°": self.image[last - x, y],
+        }
+        for view, (name, pixels) in zip(self.batch, expected.items()):
+            with self.subTest(name):
+                np.testing.assert_array_equal(view, pixels)
+
+    def test_crops_are_stretched_back_to_full_size(self):
+        crop = int(SIZE * TTA_CROP_SCALE)
+        margin = SIZE - crop
+        index = np.arange(SIZE) * crop // SIZE
+        offsets = {
+            "centre": (margin // 2, margin // 2),
+            "top left": (0, 0),
+            "top right": (0, margin),
+            "bottom left": (margin, 0),
+            "bottom right": (margin, margin),
+        }
+        for view, (name, (top, left)) in zip(self.batch[4:], offsets.items()):
+            with self.subTest(name):
+                np.testing.assert_array_equal(view, self.image[np.ix_(top + index, left + index)])
+                # Corners of the view are corners of the crop
+                np.testing.assert_array_equal(view[0, 0], self.image[top, left])
+                np.testing.assert_array_equal(
+                    view[-1, -1], self.image[top + crop - 1, left + crop - 1]
+                )
+
+    def test_input_is_not_modified(self):
+        before = self.image.copy()
+        build_tta_batch(self.image[np.newaxis])
+        np.testing.assert_array_equal(self.image, before)
+
+
+def _probabilities(confidence: float) -> np.ndarray:
+    probabilities = np.full(len(CLASS_NAMES), (1 - confidence) / (len(CLASS_NAMES) - 1))
+    probabilities[CLASS_NAMES.index("Late Blight")] = confidence
+    return probabilities.astype(np.float32)
+
+
+def _batcher(confidence: float):
+    future = Future()
+    future.set_result(_probabilities(confidence))
+    batcher = mock.Mock()
+    batcher.submit.return_value = future
+    return batcher
+
+
+@override_settings(
+    ML_DEFAULT_CROP="potato", ML_CASCADE_ENABLED=False, ML_TTA_CONFIDENCE_THRESHOLD=70
+)
+class PredictDiseaseInputTests(SimpleTestCase):
+    """The pooled float32 input is only filled on paths that read it."""
+
+    pixels = np.full((SIZE, SIZE, 3), 120, dtype=np.uint8)
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(ml_model, "model_input_scale", return_value=1 / 255),
+            mock.patch.object(ml_model, "normalize_image", wraps=ml_model.normalize_image),
+        ]
+        self.scale, self.normalize = (patch.start() for patch in patches)
+        self.addCleanup(mock.patch.stopall)
+
+    @override_settings(ML_BATCHING_ENABLED=True)
+    def test_batcher_path_does_not_fill_the_input(self):
+        batcher = _batcher(0.95)
+        with mock.patch("prediction.batcher.get_batcher", return_value=batcher):
+            result = ml_model.predict_disease(None, tta=False, pixels=self.pixels)
+        self.assertEqual(result["class"], "Late Blight")
+        self.assertIs(batcher.submit.call_args.args[0], self.pixels)
+        self.normalize.assert_not_called()
+
+    @override_settings(ML_BATCHING_ENABLED=True)
+    def test_tta_after_the_batcher_fills_the_input_once(self):
+        def run_model(batch):
+            return np.stack([_probabilities(0.9)] * len(batch))
+
+        with mock.patch("prediction.batcher.get_batcher", return_value=_batcher(0.5)):
+            with mock.patch.object(ml_model, "run_model", side_effect=run_model) as run_model:
+                result = ml_model.predict_disease(None, tta=True, pixels=self.pixels)
+        self.assertTrue(result["tta"]["applied"])
+        self.normalize.assert_called_once()
+        augmented = run_model.call_args.args[0]
+        np.testing.assert_allclose(augmented, 120 / 255, rtol=1e-6)
+
+    @override_settings(ML_BATCHING_ENABLED=False)
+    def test_direct_path_fills_the_input(self):
+        with mock.patch.object(
+            ml_model, "run_model", return_value=_probabilities(0.95)[np.newaxis]
+        ) as run_model:
+            ml_model.predict_disease(None, tta=False, pixels=self.pixels)
+        self.normalize.assert_called_once()
+        np.testing.assert_allclose(run_model.call_args.args[0], 120 / 255, rtol=1e-6)
+
+    @override_settings(ML_BATCHING_ENABLED=False, ML_CASCADE_ENABLED=True, ML_CASCADE_AUDIT_RATE=0)
+    def test_confident_cascade_does_not_fill_the_input(self):
+        runner = mock.Mock()
+        runner.predict.return_value = _probabilities(0.99)[np.newaxis]
+        with mock.patch.object(ml_model, "_get_fast_runner", return_value=runner):
+            result = ml_model.predict_disease(None, tta=False, pixels=self.pixels)
+        self.assertFalse(result["cascade"]["escalated"])
+        self.normalize.assert_not_called()
@@ -0,0 +1,90 @@
+"""
+LeafLens - Multi-Crop Model Router Tests
+@Maharsh Doshi
+"""
+
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..model_router import CropSpec, ModelRouter, UnknownCropError
+
+MODEL_BYTES = 100
+
+
+class StubModel:
+    def __init__(self, crop):
+        self.crop = crop
+
+
+class StubRouter(ModelRouter):
+    """Loads StubModels of MODEL_BYTES each; `release` holds loads back."""
+
+    def __init__(self, budget_bytes, crops=("tomato", "pepper", "corn")):
+        super().__init__(budget_bytes)
+        self._specs = {crop: CropSpec(crop, f"{crop}.h5", ["Healthy"]) for crop in crops}
+        self.loads = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def _load(self, spec):
+        self.loads.append(spec.crop)
+        self.release.wait(timeout=5)
+        return StubModel(spec.crop)
+
+
+@mock.patch("prediction.model_router._weights_bytes", lambda model: MODEL_BYTES)
+class ModelRouterTests(SimpleTestCase):
+    def test_unknown_crop(self):
+        with self.assertRaises(UnknownCropError):
+            StubRouter(10 * MODEL_BYTES).get_model("banana")
+
+    def test_concurrent_first_requests_share_one_load(self):
+        router = StubRouter(10 * MODEL_BYTES)
+        router.release.clear()
+        models = []
+        threads = [
+            threading.Thread(target=lambda: models.append(router.get_model("Tomato")))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        while not router.loads:
+            time.sleep(0.001)
+        time.sleep(0.05)  # let the other threads queue on the shared Future
+        router.release.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(router.loads, ["tomato"])
+        self.assertEqual(len(models), 8)
+        self.assertTrue(all(model is models[0] for model in models))
+
+    def test_failed_load_is_retried(self):
+        router = StubRouter(10 * MODEL_BYTES)
+        with mock.patch.object(StubRouter, "_load", side_effect=OSError("no such file")):
+            with self.assertRaises(OSError):
+                router.get_model("tomato")
+        self.assertFalse(router.is_resident("tomato"))
+        self.assertEqual(router.get_model("tomato").crop, "tomato")
+
+    def test_least_recently_used_model_is_evicted(self):
+        router = StubRouter(2 * MODEL_BYTES)
+        router.get_model("tomato")
+        router.get_model("pepper")
+        router.get_model("tomato")  # pepper is now the least recently used
+        router.get_model("corn")
+
+        self.assertEqual(list(router._resident), ["tomato", "corn"])
+        self.assertFalse(router.is_resident("pepper"))
+        router.get_model("pepper")
+        self.assertEqual(router.loads, ["tomato", "pepper", "corn", "pepper"])
+
+    def test_model_over_budget_stays_loaded(self):
+        router = StubRouter(MODEL_BYTES // 2)
+        tomato = router.get_model("tomato")
+        self.assertIs(router.get_model("tomato"), tomato)
+        router.get_model("pepper")
+        self.assertEqual(list(router._resident), ["pepper"])
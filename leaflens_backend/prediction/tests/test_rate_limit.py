@@ -0,0 +1,54 @@
+"""
+LeafLens - Rate Limiting Tests
+@Maharsh Doshi
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..rate_limit import PROBE_WINDOW, BucketTable
+
+
+@mock.patch("prediction.rate_limit.time.monotonic")
+class BucketTableTests(SimpleTestCase):
+    def test_spends_and_refills(self, monotonic):
+        table = BucketTable(slots=64, idle_after=3600)
+        monotonic.return_value = 100.0
+        self.assertEqual(table.take(7, 1, capacity=2, rate=1), (True, 1))
+        self.assertEqual(table.take(7, 1, capacity=2, rate=1), (True, 0))
+        self.assertEqual(table.take(7, 1, capacity=2, rate=1), (False, 0))
+
+        monotonic.return_value = 100.5
+        self.assertEqual(table.take(7, 1, capacity=2, rate=1), (False, 0.5))
+        monotonic.return_value = 110.0
+        # Refill stops at capacity
+        self.assertEqual(table.take(7, 1, capacity=2, rate=1), (True, 1))
+
+    def test_keys_are_independent(self, monotonic):
+        table = BucketTable(slots=64, idle_after=3600)
+        monotonic.return_value = 100.0
+        self.assertTrue(table.take(1, 5, capacity=5, rate=1)[0])
+        self.assertFalse(table.take(1, 1, capacity=5, rate=1)[0])
+        self.assertTrue(table.take(2, 1, capacity=5, rate=1)[0])
+
+    def test_full_group_evicts_the_least_recently_used(self, monotonic):
+        table = BucketTable(slots=PROBE_WINDOW, idle_after=3600)  # One group
+        for key in range(1, PROBE_WINDOW + 1):
+            monotonic.return_value = 100.0 + key
+            table.take(key, 1, capacity=1, rate=0.001)
+
+        monotonic.return_value = 200.0
+        table.take(PROBE_WINDOW + 1, 1, capacity=1, rate=0.001)  # Evicts key 1
+        self.assertTrue(table.take(1, 1, capacity=1, rate=0.001)[0])  # A fresh bucket again
+        self.assertFalse(table.take(PROBE_WINDOW, 1, capacity=1, rate=0.001)[0])
+
+    def test_idle_slots_are_reused(self, monotonic):
+        table = BucketTable(slots=PROBE_WINDOW, idle_after=10)
+        for key in range(1, PROBE_WINDOW + 1):
+            monotonic.return_value = 100.0
+            table.take(key, 1, capacity=1, rate=0.001)
+        monotonic.return_value = 200.0
+        with mock.patch("prediction.rate_limit.metrics.increment") as increment:
+            table.take(PROBE_WINDOW + 1, 1, capacity=1, rate=0.001)
+        increment.assert_not_called()  # No eviction
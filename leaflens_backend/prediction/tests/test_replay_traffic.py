@@ -0,0 +1,24 @@
+"""
+LeafLens - Traffic Replay Tests
+@Maharsh Doshi
+"""
+
+from django.test import SimpleTestCase
+
+from ..management.commands.replay_traffic import _answered_from_cache
+
+
+class ReplayCacheMarkerTests(SimpleTestCase):
+    def test_json(self):
+        cached = b'{"disease_class":"Healthy","cached":true}'  # DRF's compact JSON
+        self.assertTrue(_answered_from_cache(cached, "application/json"))
+        self.assertFalse(_answered_from_cache(b'{"disease_class":"Healthy"}', "application/json"))
+
+    def test_streams(self):
+        sse = b'event: validation\ndata: {"is_leaf": true, "cached": true}\n\nevent: done\ndata: {}\n\n'
+        ndjson = b'{"event": "prediction", "data": {"cached": true}}\n{"event": "done", "data": {}}\n'
+        self.assertTrue(_answered_from_cache(sse, "text/event-stream; charset=utf-8"))
+        self.assertTrue(_answered_from_cache(ndjson, "application/x-ndjson"))
+
+    def test_unparseable_body(self):
+        self.assertFalse(_answered_from_cache(b"<html>502</html>", "text/html"))
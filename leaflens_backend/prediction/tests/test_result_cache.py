@@ -0,0 +1,47 @@
+"""
+LeafLens - Prediction Result Cache Tests
+@Maharsh Doshi
+"""
+
+import os
+import tempfile
+
+from django.test import SimpleTestCase, override_settings
+
+from ..result_cache import _cache_key
+
+DIGEST = "ab" * 32
+
+
+@override_settings(ML_DEFAULT_CROP="potato", ML_TTA_ENABLED=False, ML_CASCADE_ENABLED=False)
+class CacheKeyTests(SimpleTestCase):
+    def test_plain_model(self):
+        self.assertEqual(_cache_key(DIGEST), _cache_key(DIGEST, "potato"))
+
+    def test_every_answer_changing_setting_changes_the_key(self):
+        with tempfile.NamedTemporaryFile(suffix=".tflite") as cascade:
+            base = {"ML_CASCADE_MODEL_PATH": cascade.name}
+            variants = [
+                {},
+                {"ML_TTA_ENABLED": True, "ML_TTA_CONFIDENCE_THRESHOLD": 70},
+                {"ML_TTA_ENABLED": True, "ML_TTA_CONFIDENCE_THRESHOLD": 85},
+                {"ML_CASCADE_ENABLED": True},
+                {"ML_CASCADE_ENABLED": True, "ML_CASCADE_CONFIDENCE_THRESHOLD": 95},
+                {"ML_CASCADE_ENABLED": True, "ML_CASCADE_MARGIN_THRESHOLD": 30},
+            ]
+            keys = []
+            for variant in variants:
+                with override_settings(**base, **variant):
+                    keys.append(_cache_key(DIGEST))
+            self.assertEqual(len(set(keys)), len(variants))
+
+            # A replaced cascade model keeps its name but not its mtime
+            with override_settings(**base, ML_CASCADE_ENABLED=True):
+                before = _cache_key(DIGEST)
+                os.utime(cascade.name, (0, 0))
+                self.assertNotEqual(_cache_key(DIGEST), before)
+
+    def test_disabled_modes_ignore_their_thresholds(self):
+        key = _cache_key(DIGEST)
+        with override_settings(ML_TTA_CONFIDENCE_THRESHOLD=99, ML_CASCADE_MARGIN_THRESHOLD=1):
+            self.assertEqual(_cache_key(DIGEST), key)
@@ -0,0 +1,103 @@
+"""
+LeafLens - Streamed Prediction Tests
+@Maharsh Doshi
+"""
+
+import json
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from ..models import ScanHistory
+
+PREDICTION = {"class": "Late Blight", "confidence": 97.4, "class_index": 1}
+
+
+def _sse_events(chunks) -> list[tuple[str, dict]]:
+    events = []
+    for message in b"".join(chunks).decode().split("\n\n"):
+        if message:
+            event, data = message.split("\n")
+            events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+@override_settings(RATE_LIMIT_ENABLED=False)
+class StreamedPredictionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        patches = {
+            "validate": mock.patch(
+                "prediction.image_validator.validate_leaf_image", return_value={"is_leaf": True}
+            ),
+            "predict": mock.patch(
+                "prediction.ml_model.predict_disease", side_effect=lambda *a, **k: dict(PREDICTION)
+            ),
+            "store": mock.patch("prediction.image_store.schedule_scan_image"),
+        }
+        self.mocks = {name: patch.start() for name, patch in patches.items()}
+        self.addCleanup(mock.patch.stopall)
+
+    def _post(self, stream, **fields):
+        image = SimpleUploadedFile("leaf.jpg", b"not really a jpeg", content_type="image/jpeg")
+        return self.client.post(f"/api/predict/?stream={stream}", {"file": image, **fields})
+
+    def test_sse_event_order(self):
+        response = self._post("sse")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        events = _sse_events(response.streaming_content)
+
+        self.assertEqual([event for event, _ in events], ["validation", "prediction", "weather", "done"])
+        self.assertEqual(events[0][1], {"is_leaf": True})
+        self.assertEqual(events[1][1]["disease_class"], "Late Blight")
+        self.assertEqual(events[-1][1], {})
+        self.assertEqual(ScanHistory.objects.get().disease_class, "Late Blight")
+
+    def test_ndjson_event_order(self):
+        response = self._post("ndjson")
+        lines = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(
+            [line["event"] for line in lines], ["validation", "prediction", "weather", "done"]
+        )
+        self.assertEqual(lines[1]["data"]["confidence"], 97.4)
+
+    def test_not_a_leaf(self):
+        self.mocks["validate"].return_value = {"is_leaf": False, "reason": "No leaf found."}
+        events = _sse_events(self._post("sse").streaming_content)
+        self.assertEqual([event for event, _ in events], ["validation", "done"])
+        self.assertFalse(events[0][1]["is_leaf"])
+        self.mocks["predict"].assert_not_called()
+        self.assertFalse(ScanHistory.objects.exists())
+
+    def test_error_event(self):
+        self.mocks["predict"].side_effect = RuntimeError("model missing")
+        with self.assertLogs("prediction.views", "ERROR"):
+            events = _sse_events(self._post("sse").streaming_content)
+        self.assertEqual([event for event, _ in events], ["validation", "error"])
+        self.assertIn("model missing", events[-1][1]["error"])
+
+    def test_scan_recorded_when_the_client_hangs_up_after_the_diagnosis(self):
+        response = self._post("sse")
+        chunks = iter(response.streaming_content)
+        self.assertTrue(next(chunks).startswith(b"event: validation"))
+        self.assertTrue(next(chunks).startswith(b"event: prediction"))
+        self.assertFalse(ScanHistory.objects.exists())
+
+        response.close()
+        self.assertEqual(ScanHistory.objects.get().disease_class, "Late Blight")
+
+    async def test_asgi_stream_records_the_scan_on_disconnect(self):
+        image = SimpleUploadedFile("leaf.jpg", b"not really a jpeg", content_type="image/jpeg")
+        response = await self.async_client.post("/api/predict/?stream=ndjson", {"file": image})
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(json.loads(await anext(chunks))["event"], "validation")
+        self.assertEqual(json.loads(await anext(chunks))["event"], "prediction")
+
+        await chunks.aclose()
+        self.assertFalse(await ScanHistory.objects.aexists())
+        # What the ASGI handler does once the response is over
+        await sync_to_async(response.close)()
+        self.assertEqual(await ScanHistory.objects.acount(), 1)
@@ -0,0 +1,100 @@
+"""
+LeafLens - Offline Sync Tests
+@Maharsh Doshi
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from .. import sync
+from ..models import ScanHistory
+
+
+def _record(**fields):
+    record = {
+        "client_id": "scan-1",
+        "disease_class": "Late Blight",
+        "confidence": 91.5,
+        "scanned_at": "2026-06-01T08:30:00Z",
+    }
+    record.update(fields)
+    return record
+
+
+class CleanRecordTests(TestCase):
+    def test_valid_record(self):
+        scan, image = sync.clean_record(_record(latitude=19.07, longitude=72.87))
+        self.assertEqual(scan.source, ScanHistory.SOURCE_DEVICE)
+        self.assertEqual(scan.crop, "potato")
+        self.assertEqual(scan.scanned_at, datetime(2026, 6, 1, 8, 30, tzinfo=dt_timezone.utc))
+        self.assertIsNotNone(scan.grid_cell)
+        self.assertIsNone(image)
+
+    def test_unix_timestamp(self):
+        scan, _ = sync.clean_record(_record(scanned_at=1780000000))
+        self.assertEqual(scan.scanned_at.timestamp(), 1780000000)
+
+    def test_impossible_timestamps_are_sync_errors(self):
+        for value in (1e20, 99999999999999, float("nan"), "2026-13-45T00:00:00", "soon", None):
+            with self.subTest(scanned_at=value), self.assertRaises(sync.SyncError):
+                sync.clean_record(_record(scanned_at=value))
+
+    def test_future_timestamp(self):
+        future = (timezone.now() + timedelta(hours=1)).isoformat()
+        with self.assertRaisesMessage(sync.SyncError, "future"):
+            sync.clean_record(_record(scanned_at=future))
+
+    def test_invalid_fields(self):
+        invalid = {
+            "client_id": "",
+            "disease_class": "Rust",
+            "confidence": 101,
+            "latitude": float("inf"),
+            "crop": "banana",
+            "image": "not base64!",
+        }
+        for field, value in invalid.items():
+            with self.subTest(field=field), self.assertRaises(sync.SyncError):
+                sync.clean_record(_record(**{field: value}))
+
+    def test_crop_must_be_a_string(self):
+        for value in (5, ["potato"], {"name": "potato"}):
+            with self.subTest(crop=value), self.assertRaisesMessage(sync.SyncError, "crop"):
+                sync.clean_record(_record(crop=value))
+
+    def test_bad_record_does_not_fail_the_batch(self):
+        records = [_record(client_id="good"), _record(client_id="bad", scanned_at=1e20)]
+        result = sync.sync_records(records)
+        self.assertEqual(result["created"], 1)
+        self.assertEqual([row["index"] for row in result["rejected"]], [1])
+        self.assertTrue(ScanHistory.objects.filter(client_id="good").exists())
+
+
+class IterRecordsTests(SimpleTestCase):
+    def test_records_form(self):
+        self.assertEqual(sync.iter_records({"records": [_record()]}), [_record()])
+
+    def test_columnar_form(self):
+        records = sync.iter_records(
+            {"columns": ["client_id", "confidence"], "rows": [["a", 90], ["b", 80]]}
+        )
+        self.assertEqual(
+            records, [{"client_id": "a", "confidence": 90}, {"client_id": "b", "confidence": 80}]
+        )
+
+    def test_row_of_the_wrong_length_is_passed_through_for_rejection(self):
+        records = sync.iter_records({"columns": ["client_id"], "rows": [["a", "extra"]]})
+        self.assertEqual(records, [["a", "extra"]])
+
+    def test_malformed_bodies(self):
+        bodies = ([], {"records": "x"}, {"columns": ["nope"], "rows": []}, {"columns": "x", "rows": []})
+        for body in bodies:
+            with self.subTest(body=body), self.assertRaises(sync.SyncError):
+                sync.iter_records(body)
+
+    @override_settings(SYNC_MAX_RECORDS=2)
+    def test_batch_limit(self):
+        with self.assertRaisesMessage(sync.SyncError, "At most 2"):
+            sync.iter_records({"records": [_record()] * 3})
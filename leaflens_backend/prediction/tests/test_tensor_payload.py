@@ -0,0 +1,53 @@
+"""
+LeafLens - Tensor Upload Tests
+@Maharsh Doshi
+"""
+
+import zlib
+
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ParseError
+
+from ..tensor_payload import TENSOR_BYTES, TENSOR_CONTENT_TYPE, TENSOR_SHAPE, parse_tensor
+
+
+class ParseTensorTests(SimpleTestCase):
+    raw = bytes(range(256)) * (TENSOR_BYTES // 256)
+
+    def content_type(self, **params):
+        params.setdefault("crc32", f"{zlib.crc32(self.raw):08x}")
+        parts = [f"{name}={value}" for name, value in params.items()]
+        return "; ".join([TENSOR_CONTENT_TYPE] + parts)
+
+    def test_encodings(self):
+        bodies = {
+            "identity": self.raw,
+            "zlib": zlib.compress(self.raw),
+            "gzip": zlib.compress(self.raw, wbits=16 + zlib.MAX_WBITS),
+        }
+        for encoding, body in bodies.items():
+            with self.subTest(encoding=encoding):
+                tensor = parse_tensor(body, self.content_type(encoding=encoding, shape="256,256,3"))
+                self.assertEqual(tensor.pixels.shape, TENSOR_SHAPE)
+                self.assertEqual(tensor.pixels.tobytes(), self.raw)
+                self.assertFalse(tensor.pixels.flags.writeable)
+
+    def test_digest_is_of_the_pixels(self):
+        plain = parse_tensor(self.raw, self.content_type())
+        compressed = parse_tensor(zlib.compress(self.raw), self.content_type(encoding="zlib"))
+        self.assertEqual(plain.digest, compressed.digest)
+
+    def test_rejected(self):
+        cases = {
+            "checksum": (self.raw, self.content_type(crc32="deadbeef")),
+            "no checksum": (self.raw, TENSOR_CONTENT_TYPE),
+            "shape": (self.raw, self.content_type(shape="224,224,3")),
+            "dtype": (self.raw, self.content_type(dtype="float32")),
+            "encoding": (self.raw, self.content_type(encoding="br")),
+            "short": (self.raw[:-1], self.content_type()),
+            "bomb": (zlib.compress(self.raw + bytes(10**6)), self.content_type(encoding="zlib")),
+            "corrupt": (b"not zlib", self.content_type(encoding="zlib")),
+        }
+        for name, (body, content_type) in cases.items():
+            with self.subTest(name), self.assertRaises(ParseError):
+                parse_tensor(body, content_type)
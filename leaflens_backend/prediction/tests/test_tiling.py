@@ -0,0 +1,102 @@
+"""
+LeafLens - Tiled Inference Tests
+@Maharsh Doshi
+"""
+
+from io import BytesIO
+from unittest import mock
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from .. import tiling
+from ..ml_model import CLASS_NAMES
+
+
+class TileStepTests(SimpleTestCase):
+    def test_single_tile(self):
+        self.assertEqual(tiling._tile_step(256, 256, 192), (1, 0))
+        self.assertEqual(tiling._tile_step(100, 256, 192), (1, 0))
+
+    def test_exact_fit(self):
+        self.assertEqual(tiling._tile_step(256 + 2 * 192, 256, 192), (3, 192))
+
+    def test_tiles_reach_the_far_edge(self):
+        for length in range(257, 2049, 7):
+            with self.subTest(length=length):
+                count, step = tiling._tile_step(length, 256, 192)
+                last_end = (count - 1) * step + 256
+                self.assertLessEqual(step, 192)
+                self.assertLessEqual(last_end, length)
+                self.assertLess(length - last_end, count)
+                # The fewest tiles that can do it
+                self.assertLess((count - 2) * 192 + 256, length)
+
+
+class TileViewTests(SimpleTestCase):
+    def test_tiles_are_views_of_the_image(self):
+        image = np.random.default_rng(0).integers(0, 256, (600, 1000, 3), dtype=np.uint8)
+        tiles, row_starts, col_starts = tiling.tile_view(image, 256, 192)
+
+        self.assertEqual(tiles.shape, (3, 5, 256, 256, 3))
+        self.assertEqual(list(row_starts), [0, 172, 344])
+        self.assertEqual(list(col_starts), [0, 186, 372, 558, 744])
+        self.assertTrue(np.shares_memory(tiles, image))
+        self.assertFalse(tiles.flags.writeable)
+        for r, y in enumerate(row_starts):
+            for c, x in enumerate(col_starts):
+                np.testing.assert_array_equal(tiles[r, c], image[y : y + 256, x : x + 256])
+
+    def test_image_of_one_tile(self):
+        image = np.zeros((256, 256, 3), dtype=np.uint8)
+        tiles, row_starts, col_starts = tiling.tile_view(image, 256, 192)
+        self.assertEqual(tiles.shape, (1, 1, 256, 256, 3))
+        self.assertEqual((list(row_starts), list(col_starts)), ([0], [0]))
+
+
+@override_settings(TILED_STRIDE=192, TILED_MAX_SIDE=2048, TILED_BATCH_SIZE=5)
+class PredictTiledTests(SimpleTestCase):
+    def setUp(self):
+        # Leaf on the left 640 px, grey background on the right
+        self.pixels = np.full((600, 1000, 3), 128, dtype=np.uint8)
+        self.pixels[:, :640] = (40, 150, 40)
+        buffer = BytesIO()
+        Image.fromarray(self.pixels).save(buffer, format="PNG")
+        self.photo = buffer.getvalue()
+
+    def test_leaf_tiles_are_scored_in_bounded_batches(self):
+        batches = []
+
+        def run_model(batch):
+            batches.append(batch.copy())
+            probabilities = np.zeros((len(batch), len(CLASS_NAMES)), dtype=np.float32)
+            probabilities[:, CLASS_NAMES.index("Late Blight")] = 0.9
+            probabilities[:, CLASS_NAMES.index("Healthy")] = 0.1
+            return probabilities
+
+        with mock.patch.object(tiling, "run_model", side_effect=run_model), mock.patch.object(
+            tiling, "model_input_scale", return_value=1 / 255
+        ):
+            result = tiling.predict_tiled(self.photo)
+
+        self.assertEqual(result["grid"], [3, 5])
+        self.assertEqual((result["tiles_total"], result["tiles_scored"]), (15, 12))
+        self.assertEqual([len(batch) for batch in batches], [5, 5, 2])
+        # Each scored tile was scaled into its slot, none left over from a previous batch
+        tiles, _, _ = tiling.tile_view(self.pixels, 256, 192)
+        expected = np.stack([tiles[tile["row"], tile["col"]] for tile in result["tiles"]])
+        np.testing.assert_allclose(np.concatenate(batches), expected / 255, rtol=1e-6)
+
+        self.assertEqual((result["class"], result["confidence"]), ("Late Blight", 90.0))
+        self.assertEqual([tile["col"] for tile in result["tiles"]], [0, 1, 2, 3] * 3)
+        self.assertEqual(result["heatmap"][0], [0.9, 0.9, 0.9, 0.9, None])
+
+    def test_no_leaf(self):
+        buffer = BytesIO()
+        Image.new("RGB", (512, 512), (128, 128, 128)).save(buffer, format="PNG")
+        with mock.patch.object(tiling, "run_model") as run_model:
+            result = tiling.predict_tiled(buffer.getvalue())
+        run_model.assert_not_called()
+        self.assertFalse(result["is_leaf"])
+        self.assertEqual(result["tiles_scored"], 0)
@@ -0,0 +1,118 @@
+"""
+LeafLens - Chunked Upload Tests
+@Maharsh Doshi
+"""
+
+import hashlib
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+
+from .. import uploads
+
+
+class UploadTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        overrides = override_settings(UPLOAD_TEMP_DIR=self.temp_dir, RATE_LIMIT_ENABLED=False)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+
+class ChunkProtocolTests(UploadTestCase):
+    data = bytes(range(256)) * 4
+
+    def _upload(self, sha256=None) -> str:
+        return uploads.create_upload(len(self.data), "image/png", sha256)["upload_id"]
+
+    def test_chunks_in_order(self):
+        upload_id = self._upload()
+        self.assertEqual(uploads.append_chunk(upload_id, 0, self.data[:600]), 600)
+        self.assertEqual(uploads.append_chunk(upload_id, 600, self.data[600:]), 1024)
+        data, meta = uploads.finalize_upload(upload_id)
+        self.assertEqual(data, self.data)
+        self.assertEqual(meta["sha256"], hashlib.sha256(self.data).hexdigest())
+
+    def test_offset_mismatch_returns_the_current_offset(self):
+        upload_id = self._upload()
+        uploads.append_chunk(upload_id, 0, self.data[:100])
+        for offset in (0, 50, 200):
+            with self.subTest(offset=offset), self.assertRaises(uploads.UploadError) as raised:
+                uploads.append_chunk(upload_id, offset, self.data[offset : offset + 300])
+            self.assertEqual(raised.exception.status_code, 409)
+            self.assertEqual(raised.exception.extra, {"offset": 100})
+        self.assertEqual(uploads.get_upload_status(upload_id)["offset"], 100)
+
+    def test_duplicate_chunk_is_acknowledged_once(self):
+        upload_id = self._upload()
+        uploads.append_chunk(upload_id, 0, self.data[:100])
+        uploads.append_chunk(upload_id, 100, self.data[100:300])
+        # The response to the second chunk was lost and the client retries it
+        self.assertEqual(uploads.append_chunk(upload_id, 100, self.data[100:300]), 300)
+        self.assertEqual(uploads.get_upload_status(upload_id)["offset"], 300)
+
+    def test_chunk_past_total_size(self):
+        upload_id = self._upload()
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.append_chunk(upload_id, 0, self.data + b"x")
+        self.assertEqual(raised.exception.status_code, 400)
+
+    def test_finalize_incomplete_upload(self):
+        upload_id = self._upload()
+        uploads.append_chunk(upload_id, 0, self.data[:10])
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.finalize_upload(upload_id)
+        self.assertEqual((raised.exception.status_code, raised.exception.extra), (409, {"offset": 10}))
+
+    def test_finalize_checksum_mismatch_discards_the_upload(self):
+        upload_id = self._upload(sha256=hashlib.sha256(b"another image").hexdigest())
+        uploads.append_chunk(upload_id, 0, self.data)
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.finalize_upload(upload_id)
+        self.assertEqual(raised.exception.status_code, 422)
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.get_upload_status(upload_id)
+        self.assertEqual(raised.exception.status_code, 404)
+
+    def test_chunk_protocol_over_http(self):
+        url = f"/api/uploads/{self._upload()}/"
+
+        def put(offset, chunk):
+            return self.client.put(
+                url, chunk, content_type="application/offset+octet-stream",
+                HTTP_UPLOAD_OFFSET=str(offset),
+            )
+
+        self.assertEqual(put(0, self.data[:512]).json()["offset"], 512)
+        response = put(256, self.data[256:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 512)
+        self.assertEqual(self.client.get(url).json()["offset"], 512)
+
+
+class UploadCreateViewTests(UploadTestCase):
+    def _create(self, **fields):
+        body = {"total_size": 1000, "content_type": "image/jpeg", **fields}
+        return self.client.post("/api/uploads/", body, content_type="application/json")
+
+    def test_invalid_sha256_is_a_bad_request(self):
+        for value in (5, ["a" * 64], {"sha256": "a" * 64}, "", "a" * 63, "g" * 64, " " + "a" * 63):
+            with self.subTest(sha256=value):
+                response = self._create(sha256=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("sha256", response.json()["error"])
+
+    def test_non_string_crop_is_a_bad_request(self):
+        for value in (5, ["potato"], {"crop": "potato"}):
+            with self.subTest(crop=value):
+                response = self._create(crop=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("crop", response.json()["error"])
+
+    def test_sha256_is_stored_lowercase(self):
+        response = self._create(sha256="AB" * 32)
+        self.assertEqual(response.status_code, 201)
+        meta = uploads.get_upload_status(response.json()["upload_id"])
+        self.assertEqual(meta["sha256"], "ab" * 32)
@@ -0,0 +1,26 @@
+"""
+LeafLens - Weather Service Tests
+@Maharsh Doshi
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from ..geo import valid_coordinates
+from ..weather_service import get_weather_data
+
+
+class CoordinateTests(SimpleTestCase):
+    def test_valid_coordinates(self):
+        self.assertTrue(valid_coordinates(19.07, 72.87))
+        self.assertTrue(valid_coordinates(-90, 180))
+        invalid = ((float("nan"), 0), (float("inf"), 0), (0, float("-inf")), (91, 0), (0, 181))
+        for latitude, longitude in invalid:
+            with self.subTest(latitude=latitude, longitude=longitude):
+                self.assertFalse(valid_coordinates(latitude, longitude))
+
+    def test_no_weather_for_invalid_coordinates(self):
+        with mock.patch("prediction.weather_service.fetch_weather_data") as fetch:
+            self.assertIsNone(get_weather_data(float("inf"), 72.87))
+        fetch.assert_not_called()
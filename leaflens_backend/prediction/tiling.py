@@ -0,0 +1,187 @@
+"""
+LeafLens - Tiled Inference for High-Resolution Field Photos
+@Maharsh Doshi
+
+preprocess_image() squashes the whole photo to 256x256, which is
+right for a close-up of one leaf but erases small lesions on a
+12 MP photo of a plant. Tiled mode instead:
+
+    1. Cuts the full-resolution image into overlapping 256x256 tiles
+       (strided views of one array — no per-tile copies)
+    2. Drops tiles that are not leaf using the image_validator
+       green-dominance statistics on a subsampled view of every tile
+    3. Scores the remaining tiles in batched forward passes of up to
+       TILED_BATCH_SIZE tiles
+    4. Aggregates the tile predictions into one diagnosis plus a
+       coarse disease-probability heatmap
+"""
+
+import logging
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from PIL import Image
+
+from .buffers import fill_input
+from .image_validator import compute_leaf_statistics, passes_leaf_thresholds
+from .ml_model import CLASS_NAMES, IMAGE_SIZE, model_input_scale, run_model
+
+logger = logging.getLogger(__name__)
+
+HEALTHY_INDEX = CLASS_NAMES.index("Healthy")
+
+# Pixel step used when computing leaf statistics on each tile (256 / 8 = 32x32 samples)
+LEAF_CHECK_STEP = 8
+
+
+def _tile_step(length: int, tile: int, stride: int) -> tuple[int, int]:
+    """
+    Returns (count, step) for one axis: the fewest evenly spaced tiles
+    with step <= stride that reach the far edge (to within count-1 px).
+    """
+    if length <= tile:
+        return 1, 0
+    count = -(-(length - tile) // stride) + 1  # ceil division
+    return count, (length - tile) // (count - 1)
+
+
+def tile_view(image: np.ndarray, tile: int, stride: int):
+    """
+    Returns (tiles, row_starts, col_starts) where `tiles` is a read-only
+    (rows, cols, tile, tile, 3) view into `image` — no pixel data is copied.
+    """
+    height, width = image.shape[:2]
+    rows, step_y = _tile_step(height, tile, stride)
+    cols, step_x = _tile_step(width, tile, stride)
+
+    s_row, s_col, s_ch = image.strides
+    tiles = np.lib.stride_tricks.as_strided(
+        image,
+        shape=(rows, cols, tile, tile, image.shape[2]),
+        strides=(s_row * step_y, s_col * step_x, s_row, s_col, s_ch),
+        writeable=False,
+    )
+    return tiles, np.arange(rows) * step_y, np.arange(cols) * step_x
+
+
+def load_full_resolution(image_bytes: bytes) -> np.ndarray:
+    """
+    Decodes the upload as a uint8 RGB array, capped at
+    settings.TILED_MAX_SIDE on the long side and upscaled if it is
+    smaller than one tile.
+    """
+    image = Image.open(BytesIO(image_bytes)).convert("RGB")
+    tile = IMAGE_SIZE[0]
+    max_side = settings.TILED_MAX_SIDE
+
+    scale = 1.0
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+    if min(image.size) * scale < tile:
+        scale = tile / min(image.size)
+    if scale != 1.0:
+        new_size = (
+            max(int(round(image.width * scale)), tile),
+            max(int(round(image.height * scale)), tile),
+        )
+        image = image.resize(new_size)
+    return np.asarray(image)
+
+
+def predict_tiled(image_bytes: bytes) -> dict:
+    """
+    Runs tiled inference on a full-resolution image.
+
+    Returns:
+        dict with keys:
+            - class, confidence, class_index: aggregated diagnosis
+            - is_leaf: False if no tile looked like a leaf
+            - grid: [rows, cols] of the tile grid
+            - tiles_total / tiles_scored: tile counts before/after leaf filtering
+            - tiles: per-tile predictions for the scored tiles
+            - heatmap: rows x cols disease probability (null = non-leaf tile)
+    """
+    image = load_full_resolution(image_bytes)
+    tile = IMAGE_SIZE[0]
+    tiles, row_starts, col_starts = tile_view(image, tile, settings.TILED_STRIDE)
+    rows, cols = tiles.shape[:2]
+
+    # ── Cheap leaf filter: statistics on a subsampled view of every tile ──
+    samples = tiles[:, :, ::LEAF_CHECK_STEP, ::LEAF_CHECK_STEP].astype(np.float32)
+    leaf_mask = passes_leaf_thresholds(*compute_leaf_statistics(samples))
+    leaf_positions = np.argwhere(leaf_mask)
+
+    result = {
+        "grid": [int(rows), int(cols)],
+        "tiles_total": int(rows * cols),
+        "tiles_scored": int(len(leaf_positions)),
+        "tiles": [],
+        "heatmap": [[None] * cols for _ in range(rows)],
+    }
+    if len(leaf_positions) == 0:
+        result.update({"is_leaf": False, "class": None, "confidence": 0, "class_index": None})
+        return result
+
+    # ── Batched forward passes over the leaf tiles ──
+    # The only pixel copy: each tile is scaled straight into one reused
+    # batch, which caps the float32 input at TILED_BATCH_SIZE tiles
+    # (12 MB for 16, where a 2048px photo has up to 121 tiles)
+    batch_size = max(1, min(settings.TILED_BATCH_SIZE, len(leaf_positions)))
+    batch = np.empty((batch_size, tile, tile, 3), dtype=np.float32)
+    scale = model_input_scale()
+    outputs = []
+    for start in range(0, len(leaf_positions), batch_size):
+        positions = leaf_positions[start : start + batch_size]
+        for i, (r, c) in enumerate(positions):
+            fill_input(tiles[r, c], batch[i], scale)
+        outputs.append(run_model(batch[: len(positions)]))
+    probabilities = np.concatenate(outputs)
+
+    tile_classes = probabilities.argmax(axis=1)
+    tile_confidences = probabilities.max(axis=1)
+
+    for (r, c), probs, class_index, conf in zip(
+        leaf_positions, probabilities, tile_classes, tile_confidences
+    ):
+        result["heatmap"][r][c] = round(float(1.0 - probs[HEALTHY_INDEX]), 3)
+        result["tiles"].append(
+            {
+                "row": int(r),
+                "col": int(c),
+                "x": int(col_starts[c]),
+                "y": int(row_starts[r]),
+                "class": CLASS_NAMES[class_index],
+                "confidence": round(float(conf) * 100, 2),
+            }
+        )
+
+    # ── Aggregate ──
+    # Averaging dilutes a lesion that shows on only a few tiles, so a disease
+    # confidently detected on enough tiles wins over the mean prediction.
+    threshold = settings.TILED_DISEASE_THRESHOLD / 100
+    confident = (tile_confidences >= threshold) & (tile_classes != HEALTHY_INDEX)
+    disease_counts = np.bincount(tile_classes[confident], minlength=len(CLASS_NAMES))
+
+    if disease_counts.max() >= settings.TILED_MIN_DISEASE_TILES:
+        class_index = int(disease_counts.argmax())
+        confidence = float(tile_confidences[confident & (tile_classes == class_index)].mean())
+    else:
+        mean_probs = probabilities.mean(axis=0)
+        class_index = int(mean_probs.argmax())
+        confidence = float(mean_probs[class_index])
+
+    logger.info(
+        f"Tiled inference: {result['tiles_scored']}/{result['tiles_total']} leaf tiles, "
+        f"diagnosis={CLASS_NAMES[class_index]} ({confidence:.2%})"
+    )
+
+    result.update(
+        {
+            "is_leaf": True,
+            "class": CLASS_NAMES[class_index],
+            "confidence": round(confidence * 100, 2),
+            "class_index": class_index,
+        }
+    )
+    return result
@@ -0,0 +1,239 @@
+"""
+LeafLens - Traffic Capture
+@Maharsh Doshi
+
+Records a sample of real /api/predict/ requests (the image bytes, form
+fields and timing) so `manage.py replay_traffic` can re-drive the
+actual mix of resolutions, formats and coordinates against a build.
+Off unless TRAFFIC_CAPTURE_ENABLED; TRAFFIC_CAPTURE_RATE of requests
+are sampled. Captures contain user photos and locations: keep them on
+the server and delete them after use.
+
+Each worker process appends to its own log file in
+TRAFFIC_CAPTURE_DIR, on a background thread:
+
+    file    b"LLCAP\\x01", then records
+    record  struct "<II" (metadata length, payload length),
+            metadata (UTF-8 JSON), payload (the uploaded file, or the
+            raw body of a tensor upload, whose metadata has no filename)
+
+A file is rotated at TRAFFIC_CAPTURE_FILE_BYTES, and the oldest files
+are deleted once the directory holds more than TRAFFIC_CAPTURE_MAX_BYTES.
+"""
+
+import json
+import logging
+import os
+import random
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+FILE_MAGIC = b"LLCAP\x01"
+FILE_SUFFIX = ".llcap"
+RECORD_HEADER = struct.Struct("<II")
+
+# Form fields replayed with the image (the file itself is the payload)
+CAPTURED_FIELDS = ("latitude", "longitude", "crop", "explain", "stream")
+
+# Captures waiting for the writer beyond this are dropped, not queued
+MAX_PENDING = 32
+
+# Sent by replay_traffic, whose requests must not be captured again
+REPLAY_HEADER = "X-LeafLens-Replay"
+
+
+class CaptureLog:
+    """Appends records to size-capped, rotating files in one directory."""
+
+    def __init__(self, directory: str, file_bytes: int, max_bytes: int):
+        self.directory = directory
+        self.file_bytes = file_bytes
+        self.max_bytes = max_bytes
+        self._file = None
+        self._sequence = 0
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        # One writer thread: records stay in order and files need no locking
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="leaflens-capture")
+
+    def submit(self, meta: dict, payload: bytes) -> bool:
+        """Queues a record; returns False if it was dropped."""
+        with self._pending_lock:
+            if self._pending >= MAX_PENDING:
+                metrics.increment("capture.dropped")
+                return False
+            self._pending += 1
+        self._executor.submit(self._write, meta, payload)
+        return True
+
+    def _write(self, meta: dict, payload: bytes) -> None:
+        try:
+            encoded = json.dumps(meta, separators=(",", ":")).encode()
+            if self._file is None or self._file.tell() >= self.file_bytes:
+                self._rotate()
+            self._file.write(RECORD_HEADER.pack(len(encoded), len(payload)))
+            self._file.write(encoded)
+            self._file.write(payload)
+            self._file.flush()
+            metrics.increment("capture.records")
+        except Exception as e:
+            logger.warning(f"Traffic capture write failed: {e}")
+        finally:
+            with self._pending_lock:
+                self._pending -= 1
+
+    def _rotate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        self._sequence += 1
+        name = f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self._sequence}{FILE_SUFFIX}"
+        self._file = open(os.path.join(self.directory, name), "wb")
+        self._file.write(FILE_MAGIC)
+        self._prune()
+
+    def _prune(self) -> None:
+        """Deletes the oldest capture files (any worker's) beyond max_bytes."""
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith(FILE_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:  # pruned by another worker
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        current = os.path.realpath(self._file.name)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            if os.path.realpath(path) == current:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+_capture_log = None
+_capture_log_lock = threading.Lock()
+
+
+def get_capture_log() -> CaptureLog:
+    global _capture_log
+    if _capture_log is None:
+        with _capture_log_lock:
+            if _capture_log is None:
+                _capture_log = CaptureLog(
+                    directory=str(settings.TRAFFIC_CAPTURE_DIR),
+                    file_bytes=settings.TRAFFIC_CAPTURE_FILE_BYTES,
+                    max_bytes=settings.TRAFFIC_CAPTURE_MAX_BYTES,
+                )
+    return _capture_log
+
+
+def capture_traffic(view):
+    """
+    View decorator: samples requests into the capture log, with the
+    view's status and duration (for streamed responses, until the
+    response starts). Goes under @api_view, so `request` is DRF's.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (
+            not settings.TRAFFIC_CAPTURE_ENABLED
+            or random.random() >= settings.TRAFFIC_CAPTURE_RATE
+            or REPLAY_HEADER in request.headers
+        ):
+            return view(request, *args, **kwargs)
+
+        received_at = time.time()
+        start = time.perf_counter()
+        response = view(request, *args, **kwargs)
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        try:
+            upload = request.FILES.get("file")
+            tensor = request.data.get("tensor") if upload is None else None
+            if upload is not None or tensor is not None:
+                meta = {
+                    "received_at": round(received_at, 6),
+                    "path": request.path,
+                    "query": request.META.get("QUERY_STRING", ""),
+                    "status": response.status_code,
+                    "duration_ms": round(duration_ms, 2),
+                }
+                if upload is not None:
+                    upload.seek(0)
+                    meta["filename"] = upload.name
+                    meta["content_type"] = upload.content_type
+                    meta["fields"] = {
+                        name: request.data[name] for name in CAPTURED_FIELDS if name in request.data
+                    }
+                    payload = upload.read()
+                else:
+                    # A raw tensor body (see tensor_payload.py); its fields are in the query
+                    meta["filename"] = None
+                    meta["content_type"] = tensor.content_type
+                    payload = tensor.body
+                get_capture_log().submit(meta, payload)
+        except Exception as e:
+            logger.warning(f"Traffic capture failed: {e}")
+        return response
+
+    return wrapper
+
+
+# ─── Reading ─────────────────────────────────────────────────────────
+
+
+def iter_capture_file(path: str):
+    """Yields (meta, payload) from one log; a truncated last record is skipped."""
+    with open(path, "rb") as f:
+        if f.read(len(FILE_MAGIC)) != FILE_MAGIC:
+            raise ValueError(f"Not a LeafLens capture file: {path}")
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            meta_length, payload_length = RECORD_HEADER.unpack(header)
+            encoded = f.read(meta_length)
+            payload = f.read(payload_length)
+            if len(encoded) < meta_length or len(payload) < payload_length:
+                return  # The writer was stopped mid-record
+            yield json.loads(encoded), payload
+
+
+def capture_files(paths: list[str]) -> list[str]:
+    """Capture files among the given files and directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith(FILE_SUFFIX)
+            )
+        else:
+            files.append(path)
+    return files
+
+
+def load_capture(paths: list[str]) -> list[tuple[dict, bytes]]:
+    """Every record in the given files/directories, in arrival order."""
+    records = [record for path in capture_files(paths) for record in iter_capture_file(path)]
+    records.sort(key=lambda record: record[0]["received_at"])
+    return records
@@ -166,9 +166,38 @@ def get_weather_risk_assessment(
     return _check_weather_risk(disease_name, temperature, humidity)
 
 
-def _check_weather_risk(disease_name: str, temperature: float, humidity: float) -> dict:
+def get_crop_weather_risk(
+    database: dict, healthy_class: str, disease_name: str, temperature: float, humidity: float
+) -> dict:
+    """
+    get_weather_risk_assessment() for another crop's treatment data
+    (a model manifest's "treatments", see model_router.py).
+    """
+    if disease_name != healthy_class:
+        return _check_weather_risk(disease_name, temperature, humidity, database)
+
+    favorable = [
+        name
+        for name in database
+        if name != healthy_class
+        and _check_weather_risk(name, temperature, humidity, database)["weather_favorable"]
+    ]
+    return {
+        "risk_level": "Moderate" if favorable else "Low",
+        "risk_message": " | ".join(
+            f"⚠️ Current weather is favorable for {name}. Monitor closely." for name in favorable
+        )
+        if favorable
+        else "✅ Weather conditions are not favorable for disease. Keep monitoring!",
+        "weather_favorable": bool(favorable),
+    }
+
+
+def _check_weather_risk(
+    disease_name: str, temperature: float, humidity: float, database: dict | None = None
+) -> dict:
     """Internal helper to check weather risk for a specific disease."""
-    treatment = TREATMENT_DATABASE.get(disease_name)
+    treatment = (database or TREATMENT_DATABASE).get(disease_name)
     if not treatment:
         return {
             "risk_level": "Unknown",
@@ -176,7 +205,7 @@ def _check_weather_risk(disease_name: str, temperature: float, humidity: float)
             "weather_favorable": False,
         }
 
-    weather_ctx = treatment["weather_context"]
+    weather_ctx = treatment.get("weather_context", {})
     temp_min = weather_ctx.get("favorable_temp_min")
     temp_max = weather_ctx.get("favorable_temp_max")
     hum_min = weather_ctx.get("favorable_humidity_min")
@@ -196,7 +225,7 @@ def _check_weather_risk(disease_name: str, temperature: float, humidity: float)
         risk_level = "Critical"
         risk_message = (
             f"🚨 CRITICAL: Current temperature ({temperature}°C) and humidity ({humidity}%) "
-            f"are HIGHLY favorable for {disease_name}. {weather_ctx['description']} "
+            f"are HIGHLY favorable for {disease_name}. {weather_ctx.get('description', '')} "
             f"Take immediate preventive/treatment action!"
         )
     elif temp_favorable:
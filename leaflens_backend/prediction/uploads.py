@@ -0,0 +1,211 @@
+"""
+LeafLens - Resumable Chunked Uploads
+@Maharsh Doshi
+
+A single multipart POST that drops at 90% on a 2G link has to start
+over. Chunked uploads let the mobile app send an image in small
+pieces and resume from the last acknowledged byte:
+
+    POST /api/uploads/                   → create, returns upload_id
+    PUT  /api/uploads/<id>/              → append a chunk at Upload-Offset
+    GET  /api/uploads/<id>/              → current offset (resume point)
+    POST /api/uploads/<id>/finalize/     → verify and run the prediction
+
+Each upload is a directory in UPLOAD_TEMP_DIR holding meta.json and
+the partial data file. Uploads not finalized within UPLOAD_EXPIRY
+seconds are purged.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import locks
+
+logger = logging.getLogger(__name__)
+
+META_FILENAME = "meta.json"
+DATA_FILENAME = "data.part"
+PURGE_LOCK_KEY = "leaflens:uploads:purge"
+
+
+class UploadError(Exception):
+    """Raised for invalid upload operations; carries an HTTP status code."""
+
+    def __init__(self, message: str, status_code: int = 400, **extra):
+        super().__init__(message)
+        self.status_code = status_code
+        self.extra = extra
+
+
+def _upload_dir(upload_id: str) -> str:
+    # upload_id is a uuid4 hex; reject anything else so it cannot escape the temp dir
+    if len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+        raise UploadError("Unknown upload.", status_code=404)
+    return os.path.join(settings.UPLOAD_TEMP_DIR, upload_id)
+
+
+def _read_meta(upload_id: str) -> dict:
+    try:
+        with open(os.path.join(_upload_dir(upload_id), META_FILENAME)) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        raise UploadError("Unknown or expired upload.", status_code=404)
+
+    if meta["expires_at"] < time.time():
+        discard_upload(upload_id)
+        raise UploadError("Upload expired.", status_code=404)
+    return meta
+
+
+def _data_path(upload_id: str) -> str:
+    return os.path.join(_upload_dir(upload_id), DATA_FILENAME)
+
+
+def create_upload(
+    total_size: int,
+    content_type: str,
+    sha256: str | None = None,
+    latitude=None,
+    longitude=None,
+    crop=None,
+) -> dict:
+    """Registers a new upload and returns its metadata."""
+    if total_size <= 0 or total_size > settings.UPLOAD_MAX_BYTES:
+        raise UploadError(
+            f"total_size must be between 1 and {settings.UPLOAD_MAX_BYTES} bytes."
+        )
+
+    purge_expired_uploads()
+
+    upload_id = uuid.uuid4().hex
+    directory = _upload_dir(upload_id)
+    os.makedirs(directory)
+
+    meta = {
+        "upload_id": upload_id,
+        "total_size": total_size,
+        "content_type": content_type,
+        "sha256": sha256.lower() if sha256 else None,
+        "latitude": latitude,
+        "longitude": longitude,
+        "crop": crop,
+        "created_at": time.time(),
+        "expires_at": time.time() + settings.UPLOAD_EXPIRY,
+    }
+    with open(os.path.join(directory, META_FILENAME), "w") as f:
+        json.dump(meta, f)
+    open(os.path.join(directory, DATA_FILENAME), "wb").close()
+
+    logger.info(f"Chunked upload {upload_id} created ({total_size} bytes)")
+    return meta
+
+
+def get_upload_status(upload_id: str) -> dict:
+    """Returns the upload metadata plus the number of bytes received."""
+    meta = _read_meta(upload_id)
+    meta["offset"] = os.path.getsize(_data_path(upload_id))
+    return meta
+
+
+def append_chunk(upload_id: str, offset: int, chunk: bytes) -> int:
+    """
+    Appends `chunk` at `offset`, which must equal the bytes received so far
+    (a retried chunk that already landed is acknowledged, not duplicated).
+    Returns the new offset.
+    """
+    meta = _read_meta(upload_id)
+    if len(chunk) > settings.UPLOAD_MAX_CHUNK_BYTES:
+        raise UploadError(
+            f"Chunk too large (max {settings.UPLOAD_MAX_CHUNK_BYTES} bytes).",
+            status_code=413,
+        )
+
+    with open(_data_path(upload_id), "ab") as f:
+        locks.lock(f, locks.LOCK_EX)
+        try:
+            current = f.seek(0, os.SEEK_END)
+            if offset + len(chunk) == current and offset < current:
+                return current  # duplicate of a chunk we already have
+            if offset != current:
+                raise UploadError(
+                    "Offset mismatch; resume from the returned offset.",
+                    status_code=409,
+                    offset=current,
+                )
+            if current + len(chunk) > meta["total_size"]:
+                raise UploadError("Chunk exceeds the declared total_size.")
+            f.write(chunk)
+            return current + len(chunk)
+        finally:
+            locks.unlock(f)
+
+
+def finalize_upload(upload_id: str) -> tuple[bytes, dict]:
+    """
+    Checks the upload is complete and its hash matches the one declared
+    at creation (if any). Returns (image_bytes, meta) with meta["sha256"]
+    set, and removes the temp files.
+    """
+    meta = _read_meta(upload_id)
+    with open(_data_path(upload_id), "rb") as f:
+        data = f.read()
+
+    if len(data) != meta["total_size"]:
+        raise UploadError(
+            "Upload incomplete.", status_code=409, offset=len(data)
+        )
+
+    digest = hashlib.sha256(data).hexdigest()
+    if meta["sha256"] and meta["sha256"] != digest:
+        discard_upload(upload_id)
+        raise UploadError("Checksum mismatch; the upload was corrupted.", status_code=422)
+
+    meta["sha256"] = digest
+    discard_upload(upload_id)
+    return data, meta
+
+
+def discard_upload(upload_id: str) -> None:
+    shutil.rmtree(_upload_dir(upload_id), ignore_errors=True)
+
+
+def purge_expired_uploads(force: bool = False) -> int:
+    """
+    Deletes expired uploads. Runs at most once per minute across all
+    workers unless `force` is set. Returns the number removed.
+    """
+    if not force and not cache.add(PURGE_LOCK_KEY, 1, timeout=60):
+        return 0
+
+    temp_dir = settings.UPLOAD_TEMP_DIR
+    if not os.path.isdir(temp_dir):
+        os.makedirs(temp_dir, exist_ok=True)
+        return 0
+
+    removed = 0
+    now = time.time()
+    with os.scandir(temp_dir) as entries:
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            meta_path = os.path.join(entry.path, META_FILENAME)
+            try:
+                with open(meta_path) as f:
+                    expired = json.load(f)["expires_at"] < now
+            except (OSError, ValueError, KeyError):
+                # Half-created upload: judge by directory age
+                expired = entry.stat().st_mtime + settings.UPLOAD_EXPIRY < now
+            if expired:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+
+    if removed:
+        logger.info(f"Purged {removed} expired chunked uploads")
+    return removed
@@ -11,8 +11,26 @@ app_name = "prediction"
 urlpatterns = [
     # Health check
     path("ping/", views.ping, name="ping"),
+    path("metrics/", views.metrics_view, name="metrics"),
     # Main prediction endpoint
     path("predict/", views.predict, name="predict"),
+    path("predict/tiled/", views.predict_tiled_view, name="predict-tiled"),
+    # Resumable chunked uploads (low-bandwidth clients)
+    path("uploads/", views.upload_create, name="upload-create"),
+    path("uploads/<str:upload_id>/", views.upload_detail, name="upload-detail"),
+    path(
+        "uploads/<str:upload_id>/finalize/",
+        views.upload_finalize,
+        name="upload-finalize",
+    ),
+    # Scan history
+    path("history/", views.history_list, name="history-list"),
+    path("history/export/", views.history_export, name="history-export"),
+    path("history/sync/", views.history_sync, name="history-sync"),
+    # Disease reports near a location
+    path("outbreaks/nearby/", views.outbreaks_nearby, name="outbreaks-nearby"),
+    # Available crop models
+    path("crops/", views.crops, name="crops"),
     # Treatment recommendations
     path(
         "treatment/<str:disease_name>/", views.treatment_detail, name="treatment-detail"
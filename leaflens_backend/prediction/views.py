@@ -3,8 +3,21 @@ LeafLens - API Views
 @Maharsh Doshi
 
 Endpoints:
-    POST /api/predict/           — Upload image, get disease prediction + treatment + weather risk
+    POST /api/predict/           — Upload image (or a preprocessed 256x256 tensor), get disease
+                                   prediction + treatment + weather risk
+                                   (+ Grad-CAM heatmap overlay with explain=true;
+                                   stream=sse|ndjson sends each stage as it finishes)
+    POST /api/predict/tiled/     — Tiled prediction + heatmap for high-resolution photos
+    POST /api/uploads/           — Start a resumable chunked upload
+    GET|PUT /api/uploads/<id>/   — Upload status / append a chunk
+    POST /api/uploads/<id>/finalize/ — Complete the upload and run the prediction
+    GET  /api/history/           — Scan history, keyset-paginated, with filters
+    GET  /api/history/export/    — Stream the (filtered) history as CSV or NDJSON
+    POST /api/history/sync/      — Upload a batch of on-device (offline TFLite) scans
+    GET  /api/outbreaks/nearby/  — Disease reports within a radius of a location
+    GET  /api/crops/             — Crops (models) this backend can classify
     GET  /api/ping/              — Health check
+    GET  /api/metrics/           — Prediction engine counters and latencies
     GET  /api/tflite/download/   — Download TFLite model for offline inference
     GET  /api/treatment/<disease>/ — Get treatment info for a specific disease
 """
@@ -13,16 +26,35 @@ import os
 import logging
 
 from django.conf import settings
-from django.http import FileResponse, Http404
-from rest_framework.decorators import api_view, parser_classes
-from rest_framework.parsers import MultiPartParser, FormParser
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import api_view, parser_classes, renderer_classes
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.response import Response
 from rest_framework import status
 
-from .ml_model import predict_disease
-from .treatment_data import get_treatment, get_weather_risk_assessment
-from .weather_service import get_weather_data
-from .image_validator import validate_leaf_image
+from leaflens_backend.database import read_database
+
+from . import metrics
+from .models import ScanHistory
+from .renderers import STREAM_CONTENT_TYPES, STREAMING_RENDERERS
+from .serializers import ScanHistorySerializer
+from .model_router import UnknownCropError, get_router
+from .storage import content_hash
+from .tensor_payload import LeafTensor, TensorParser, tensor_upload_info
+from .traffic_capture import capture_traffic
+from .result_cache import (
+    cache_explanation,
+    cache_prediction,
+    get_cached_explanation,
+    get_cached_prediction,
+)
+from . import geo, history, sync, uploads
+
+# The inference modules (NumPy, PIL, requests, and TensorFlow on first
+# prediction) are imported inside the views that run inference, so a cold
+# worker answers ping/treatment/history without loading them. See
+# prediction/warmup.py to load them ahead of the first request.
 
 logger = logging.getLogger(__name__)
 
@@ -43,11 +75,19 @@ def ping(request):
     )
 
 
+@api_view(["GET"])
+def metrics_view(request):
+    """Per-worker counters, latency percentiles and configuration info."""
+    return Response(metrics.snapshot())
+
+
 # ─── Main Prediction Endpoint ───────────────────────────────────────
 
 
 @api_view(["POST"])
-@parser_classes([MultiPartParser, FormParser])
+@parser_classes([MultiPartParser, FormParser, TensorParser])
+@renderer_classes(STREAMING_RENDERERS)
+@capture_traffic
 def predict(request):
     """
     Upload a potato leaf image and get:
@@ -59,23 +99,430 @@ def predict(request):
         POST /api/predict/
         Content-Type: multipart/form-data
         Body:
-            - file: Image file (required)
+            - file: Image file (required, unless the body is a raw tensor:
+              Content-Type: application/x-leaflens-tensor, fields in the
+              query string; see prediction/tensor_payload.py)
             - latitude: float (optional)
             - longitude: float (optional)
+            - crop: str (optional, default "potato"; see GET /api/crops/)
+            - explain: bool (optional; adds a Grad-CAM heatmap overlay)
+            - stream: "sse" | "ndjson" (optional; or Accept: text/event-stream
+              or application/x-ndjson — see Streamed response below)
 
     Response:
         {
+            "crop": "potato",
             "disease_class": "Late Blight",
             "confidence": 98.5,
             "treatment_info": { ... },
             "weather": { ... } | null,
-            "weather_risk": { ... } | null
+            "weather_risk": { ... } | null,
+            "explanation": {            (only with explain=true)
+                "method": "grad-cam",
+                "class": "Late Blight",
+                "layer": "conv2d_5",
+                "grid": [4, 4],
+                "peak": {"row": 1, "col": 2},
+                "overlay_png": "<base64 PNG, transparent, stretch over the photo>"
+            }
         }
+
+    Streamed response: the same fields, sent as each stage finishes, so
+    the diagnosis does not wait for the weather API:
+        event: validation   {"is_leaf": true}  (the full "Not a Leaf" body otherwise)
+        event: prediction   crop, disease_class, confidence, treatment_info, ...
+        event: weather      weather, weather_risk, nearby_outbreaks
+        event: done         {}
+    NDJSON sends one {"event": ..., "data": {...}} object per line.
     """
 
-    # ── Validate image ──
-    if "file" not in request.FILES:
+    # ── Validate image (an encoded file, or a client-preprocessed tensor) ──
+    tensor = _get_uploaded_tensor(request)
+    if tensor is not None:
+        image = {"image_bytes": None, "pixels": tensor.pixels, "digest": tensor.digest}
+    else:
+        image_file, error_response = _get_uploaded_image(request)
+        if error_response is not None:
+            return error_response
+        image = {"image_bytes": image_file.read()}
+
+    latitude = request.data.get("latitude") or request.query_params.get("latitude")
+    longitude = request.data.get("longitude") or request.query_params.get("longitude")
+
+    crop, error_response = _resolve_crop(
+        request.data.get("crop") or request.query_params.get("crop")
+    )
+    if error_response is not None:
+        return error_response
+
+    try:
+        stream_format = _stream_format(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    if stream_format:
+        return _stream_prediction(
+            stream_format,
+            latitude=latitude,
+            longitude=longitude,
+            crop=crop,
+            explain=_wants_explanation(request),
+            asynchronous=_is_asgi(request),
+            **image,
+        )
+
+    try:
+        return _run_prediction(
+            latitude=latitude,
+            longitude=longitude,
+            crop=crop,
+            explain=_wants_explanation(request),
+            **image,
+        )
+
+    except Exception as e:
+        logger.error(f"Prediction failed: {e}", exc_info=True)
         return Response(
+            {"error": f"Prediction failed: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+
+def _resolve_crop(crop):
+    """Returns (crop name, None) for a known crop, or (None, error_response)."""
+    if crop is not None and not isinstance(crop, str):
+        return None, Response(
+            {"error": "crop must be a string."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        return get_router().spec(crop).crop, None
+    except UnknownCropError as e:
+        return None, Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _wants_explanation(request) -> bool:
+    value = request.data.get("explain") or request.query_params.get("explain") or ""
+    return str(value).lower() in ("1", "true", "yes")
+
+
+def _run_prediction(
+    image_bytes, latitude=None, longitude=None, digest=None, crop=None, explain=False, pixels=None
+):
+    """
+    The full prediction pipeline shared by /api/predict/ and finalized
+    chunked uploads: leaf validation, inference (or a cached answer for
+    an already-seen image), treatment, weather risk, and scan recording.
+    With `explain`, a Grad-CAM explanation (also cached) is included.
+
+    `image_bytes` may be None when decoded `pixels` are given (a tensor
+    upload, whose `digest` is the hash of the pixels), or when `digest`
+    is already cached (a chunked upload whose declared hash we have seen).
+
+    Returns:
+        DRF Response
+    """
+    response_data = {}
+    events = _prediction_events(image_bytes, latitude, longitude, digest, crop, explain, pixels)
+    for event, data in events:
+        if event == "validation":
+            if not data["is_leaf"]:
+                return Response(_not_a_leaf_response(data), status=status.HTTP_200_OK)
+        else:
+            response_data.update(data)
+    return Response(response_data, status=status.HTTP_200_OK)
+
+
+def _not_a_leaf_response(validation):
+    return {
+        "disease_class": "Not a Leaf",
+        "confidence": 0,
+        "is_leaf": False,
+        "validation_message": validation["validation_message"],
+        "treatment_info": None,
+        "weather": None,
+        "weather_risk": None,
+    }
+
+
+class UncachedImageError(ValueError):
+    """A prediction was asked for by digest alone, and the digest is not cached."""
+
+
+def _prediction_events(image_bytes, latitude, longitude, digest, crop, explain, pixels=None):
+    """
+    Runs the pipeline in stages, yielding (event, data) as each finishes:
+
+        validation   {"is_leaf", "validation_message"?, "cached"?}
+        prediction   crop, disease_class, confidence, treatment_info
+                     (+ tta / cascade / explanation / cached)
+        weather      weather, weather_risk, nearby_outbreaks
+
+    Stops after validation for a photo that is not a leaf. The weather
+    lookup starts as soon as the image is known to be a leaf, so the
+    API round trip runs alongside inference instead of after it.
+    """
+    from .image_store import schedule_scan_image, schedule_scan_pixels
+    from .image_validator import validate_leaf_array, validate_leaf_image
+    from .ml_model import predict_disease
+    from .weather_prefetch import ensure_prefetcher_started
+    from .weather_service import get_weather_data_async
+
+    digest = digest or content_hash(image_bytes)
+
+    lat = lon = None
+    if latitude is not None and longitude is not None:
+        try:
+            lat, lon = float(latitude), float(longitude)
+        except (ValueError, TypeError) as e:
+            logger.warning(
+                f"Invalid GPS coordinates: lat={latitude}, lon={longitude}. Error: {e}"
+            )
+        else:
+            # float() accepts "nan", "inf" and "1e400"
+            if not geo.valid_coordinates(lat, lon):
+                logger.warning(f"Invalid GPS coordinates: lat={latitude}, lon={longitude}")
+                lat = lon = None
+
+    # ── Already-seen image? Skip validation and inference ──
+    router = get_router()
+    crop = router.spec(crop).crop
+    prediction = get_cached_prediction(digest, crop)
+    explanation = get_cached_explanation(digest, crop) if explain else None
+    has_image = image_bytes is not None or pixels is not None
+    if prediction is not None and explain and explanation is None and has_image:
+        # Seen before, but never explained: one explained pass gives both
+        prediction = None
+    cached = prediction is not None
+
+    if cached:
+        yield "validation", {"is_leaf": True, "cached": True}
+    else:
+        if not has_image:
+            raise UncachedImageError("Image bytes are required for an uncached image.")
+
+        # ── Validate: is this actually a leaf? ──
+        if pixels is not None:
+            validation = validate_leaf_array(pixels)
+        else:
+            validation = validate_leaf_image(image_bytes)
+        if not validation["is_leaf"]:
+            yield "validation", {"is_leaf": False, "validation_message": validation["reason"]}
+            return
+        yield "validation", {"is_leaf": True}
+
+    weather_future = None
+    if lat is not None:
+        ensure_prefetcher_started()
+        weather_future = get_weather_data_async(lat, lon)
+
+    if not cached:
+        # ── Run ML prediction ──
+        prediction = predict_disease(image_bytes, crop=crop, explain=explain, pixels=pixels)
+        explanation = prediction.pop("explanation", None)
+        cache_prediction(digest, prediction, crop)
+        if explanation is not None:
+            cache_explanation(digest, explanation, crop)
+    else:
+        metrics.increment("ml.prediction_cache_hits")
+
+    disease_class = prediction["class"]
+    confidence = prediction["confidence"]
+
+    # ── Get treatment recommendations ──
+    treatment_info = router.treatment(crop, disease_class)
+
+    prediction_data = {
+        "crop": crop,
+        "disease_class": disease_class,
+        "confidence": confidence,
+        "treatment_info": {
+            "disease": treatment_info["disease"],
+            "scientific_name": treatment_info["scientific_name"],
+            "symptoms": treatment_info["symptoms"],
+            "causes": treatment_info["causes"],
+            "treatment": treatment_info["treatment"],
+            "prevention": treatment_info["prevention"],
+            "severity": treatment_info["severity"],
+        },
+    }
+    if "tta" in prediction:
+        prediction_data["tta"] = prediction["tta"]
+    if "cascade" in prediction:
+        prediction_data["cascade"] = prediction["cascade"]
+    if explanation is not None:
+        prediction_data["explanation"] = explanation
+    if cached:
+        prediction_data["cached"] = True
+
+    recorded = False
+
+    def record(weather_data):
+        nonlocal recorded
+        recorded = True
+        scan = _record_scan(
+            disease_class, confidence, lat, lon, weather_data, image_hash=digest, crop=crop
+        )
+        # Original + thumbnails are written off the request thread
+        if scan is not None and image_bytes is not None:
+            schedule_scan_image(scan.pk, image_bytes, digest)
+        elif scan is not None and pixels is not None:
+            schedule_scan_pixels(scan.pk, pixels, digest)
+
+    try:
+        yield "prediction", prediction_data
+
+        # ── Weather & Risk Assessment (optional) ──
+        weather_data = None
+        weather_risk = None
+        nearby_outbreaks = None
+
+        if weather_future is not None:
+            try:
+                weather_data = weather_future.result()
+            except Exception as e:
+                logger.error(f"Weather lookup failed: {e}")
+            if weather_data:
+                weather_risk = router.weather_risk(
+                    crop,
+                    disease_class,
+                    weather_data["temperature"],
+                    weather_data["humidity"],
+                )
+            nearby_outbreaks = geo.outbreak_summary(lat, lon)
+
+        record(weather_data)
+        yield "weather", {
+            "weather": weather_data,
+            "weather_risk": weather_risk,
+            "nearby_outbreaks": nearby_outbreaks,
+        }
+    finally:
+        # A streaming client that hangs up once it has the diagnosis closes
+        # this generator at the prediction event; the scan is still kept,
+        # with the weather only if it has already arrived
+        if not recorded:
+            done = weather_future is not None and weather_future.done()
+            record(weather_future.result() if done and not weather_future.exception() else None)
+
+
+# ─── Streamed Prediction Responses ───────────────────────────────────
+
+def _stream_format(request):
+    """
+    "sse" or "ndjson" when the client opted into a streamed response
+    (stream=sse|ndjson, or an Accept header naming one of the types),
+    else None. An unknown stream value raises ValueError.
+    """
+    value = request.data.get("stream") or request.query_params.get("stream")
+    if value:
+        value = str(value).lower()
+        if value not in STREAM_CONTENT_TYPES:
+            raise ValueError("stream must be 'sse' or 'ndjson'.")
+        return value
+    accepted = request.accepted_renderer.format
+    return accepted if accepted in STREAM_CONTENT_TYPES else None
+
+
+def _stream_prediction(
+    stream_format,
+    image_bytes,
+    latitude=None,
+    longitude=None,
+    digest=None,
+    crop=None,
+    explain=False,
+    pixels=None,
+    asynchronous=False,
+):
+    """
+    The prediction pipeline as a streamed response: one message per
+    stage as soon as it is ready (validation, prediction, weather), then
+    "done". A photo that is not a leaf gets its validation result and
+    "done". Errors after the headers are sent arrive as an "error" event.
+
+        SSE:     event: prediction\ndata: {...}\n\n
+        NDJSON:  {"event": "prediction", "data": {...}}\n
+
+    Under ASGI (`asynchronous`, see _is_asgi()) the body must be an
+    async iterator: Django reads a sync one into a list before sending
+    it, which would deliver every event at the end.
+    """
+    import json
+
+    def encode(event, data):
+        if stream_format == "sse":
+            return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        return json.dumps({"event": event, "data": data}) + "\n"
+
+    def body():
+        try:
+            for event, data in _prediction_events(
+                image_bytes, latitude, longitude, digest, crop, explain, pixels
+            ):
+                if event == "validation" and not data["is_leaf"]:
+                    data = _not_a_leaf_response(data)
+                yield encode(event, data)
+        except Exception as e:
+            logger.error(f"Prediction failed: {e}", exc_info=True)
+            yield encode("error", {"error": f"Prediction failed: {str(e)}"})
+            return
+        yield encode("done", {})
+
+    metrics.increment(f"predict.streamed.{stream_format}")
+    response = StreamingHttpResponse(
+        _AsyncEvents(body()) if asynchronous else body(),
+        content_type=STREAM_CONTENT_TYPES[stream_format],
+    )
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the events into one response
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class _AsyncEvents:
+    """
+    A streamed body for ASGI: runs each stage of a sync event generator
+    on the request's sync thread, like the view itself. Django calls
+    close() when the response ends, a disconnect included, which closes
+    the stages (and so records the scan) on that thread too.
+    """
+
+    def __init__(self, events):
+        self.events = events
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        from asgiref.sync import sync_to_async
+
+        message = await sync_to_async(next)(self.events, None)
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def close(self):
+        self.events.close()
+
+
+def _is_asgi(request) -> bool:
+    """Whether the request came in through asgi.py rather than wsgi.py."""
+    from django.core.handlers.asgi import ASGIRequest
+
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+def _get_uploaded_tensor(request):
+    """The LeafTensor of a raw tensor upload (see tensor_payload.py), else None."""
+    tensor = request.data.get("tensor") if hasattr(request.data, "get") else None
+    return tensor if isinstance(tensor, LeafTensor) else None
+
+
+def _get_uploaded_image(request):
+    """
+    Returns (image_file, None) for a valid upload, or (None, error_response).
+    """
+    if "file" not in request.FILES:
+        return None, Response(
             {"error": "No image file provided. Send a 'file' field with your image."},
             status=status.HTTP_400_BAD_REQUEST,
         )
@@ -85,93 +532,474 @@ def predict(request):
     # Validate file type
     allowed_types = ["image/jpeg", "image/png", "image/jpg", "image/webp"]
     if image_file.content_type not in allowed_types:
-        return Response(
+        return None, Response(
             {
                 "error": f"Invalid file type: {image_file.content_type}. Allowed: {', '.join(allowed_types)}"
             },
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    return image_file, None
+
+
+def _record_scan(
+    disease_class, confidence, latitude, longitude, weather_data, image_hash=None, crop=None
+):
+    """
+    Saves the scan to ScanHistory. The recorded coordinates also drive
+    the weather prefetcher's view of which regions are active.
+    A failed insert must never fail the prediction itself.
+    """
+    try:
+        return ScanHistory.objects.create(
+            disease_class=disease_class,
+            confidence=confidence,
+            latitude=latitude,
+            longitude=longitude,
+            city=weather_data["city"] if weather_data else None,
+            temperature=weather_data["temperature"] if weather_data else None,
+            humidity=weather_data["humidity"] if weather_data else None,
+            weather_description=weather_data["description"] if weather_data else None,
+            image_hash=image_hash,
+            crop=crop or settings.ML_DEFAULT_CROP,
+        )
+    except Exception as e:
+        logger.error(f"Failed to record scan history: {e}")
+        return None
+
+
+# ─── Resumable Chunked Upload Endpoints ──────────────────────────────
+
+
+def _upload_error_response(error):
+    return Response({"error": str(error), **error.extra}, status=error.status_code)
+
+
+@api_view(["POST"])
+@parser_classes([JSONParser, FormParser])
+def upload_create(request):
+    """
+    Start a chunked upload.
+
+    Request:
+        POST /api/uploads/
+        {
+            "total_size": 2483112,
+            "content_type": "image/jpeg",
+            "sha256": "3fa2…",        (optional — enables instant answers)
+            "latitude": 19.07,        (optional)
+            "longitude": 72.87,       (optional)
+            "crop": "potato"          (optional)
+        }
+
+    Response (201):
+        {"upload_id": "…", "offset": 0, "chunk_size": 262144, "expires_at": …}
+
+    If `sha256` matches an image we have already scored, the prediction
+    is returned straight away (200, "complete": true) and nothing needs
+    to be uploaded.
+    """
+    allowed_types = ["image/jpeg", "image/png", "image/jpg", "image/webp"]
+    content_type = request.data.get("content_type")
+    if content_type not in allowed_types:
+        return Response(
+            {"error": f"Invalid content_type: {content_type}. Allowed: {', '.join(allowed_types)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     try:
-        # ── Run ML prediction ──
-        image_bytes = image_file.read()
+        total_size = int(request.data.get("total_size"))
+    except (TypeError, ValueError):
+        return Response(
+            {"error": "total_size (bytes) is required."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
 
-        # ── Validate: is this actually a leaf? ──
-        validation = validate_leaf_image(image_bytes)
-        if not validation["is_leaf"]:
+    sha256 = request.data.get("sha256")
+    if sha256 is not None:
+        sha256 = sha256.lower() if isinstance(sha256, str) else ""
+        if len(sha256) != 64 or not all(c in "0123456789abcdef" for c in sha256):
+            return Response(
+                {"error": "sha256 must be a 64-character hex digest."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+    latitude = request.data.get("latitude")
+    longitude = request.data.get("longitude")
+    crop, error_response = _resolve_crop(request.data.get("crop"))
+    if error_response is not None:
+        return error_response
+
+    # ── Seen this exact image before? Answer without any upload ──
+    if sha256 and get_cached_prediction(sha256, crop) is not None:
+        try:
+            response = _run_prediction(None, latitude, longitude, digest=sha256, crop=crop)
+        except UncachedImageError:
+            # Expired since the check above: the client uploads it after all
+            response = None
+        except Exception as e:
+            logger.error(f"Prediction failed: {e}", exc_info=True)
+            return Response(
+                {"error": f"Prediction failed: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        if response is not None:
+            response.data = {"upload_id": None, "complete": True, "result": response.data}
+            return response
+
+    try:
+        meta = uploads.create_upload(
+            total_size, content_type, sha256, latitude, longitude, crop=crop
+        )
+    except uploads.UploadError as e:
+        return _upload_error_response(e)
+
+    return Response(
+        {
+            "upload_id": meta["upload_id"],
+            "offset": 0,
+            "total_size": total_size,
+            "chunk_size": settings.UPLOAD_CHUNK_SIZE,
+            "expires_at": meta["expires_at"],
+            "complete": False,
+        },
+        status=status.HTTP_201_CREATED,
+    )
+
+
+@api_view(["GET", "PUT"])
+@parser_classes([])
+def upload_detail(request, upload_id):
+    """
+    GET: how many bytes have been received (where to resume).
+    PUT: append the raw request body as the next chunk.
+
+        PUT /api/uploads/<id>/
+        Upload-Offset: 262144
+        Content-Type: application/offset+octet-stream
+        <chunk bytes>
+
+    A mismatched offset returns 409 with the server's current offset.
+    """
+    try:
+        if request.method == "GET":
+            meta = uploads.get_upload_status(upload_id)
             return Response(
                 {
-                    "disease_class": "Not a Leaf",
-                    "confidence": 0,
-                    "is_leaf": False,
-                    "validation_message": validation["reason"],
-                    "treatment_info": None,
-                    "weather": None,
-                    "weather_risk": None,
-                },
-                status=status.HTTP_200_OK,
+                    "upload_id": upload_id,
+                    "offset": meta["offset"],
+                    "total_size": meta["total_size"],
+                    "expires_at": meta["expires_at"],
+                }
             )
 
-        prediction = predict_disease(image_bytes)
+        try:
+            offset = int(request.headers.get("Upload-Offset", ""))
+        except ValueError:
+            return Response(
+                {"error": "Upload-Offset header is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        new_offset = uploads.append_chunk(upload_id, offset, request.body)
+    except uploads.UploadError as e:
+        return _upload_error_response(e)
 
-        disease_class = prediction["class"]
-        confidence = prediction["confidence"]
+    return Response({"upload_id": upload_id, "offset": new_offset})
 
-        # ── Get treatment recommendations ──
-        treatment_info = get_treatment(disease_class)
 
-        # ── Weather & Risk Assessment (optional) ──
-        weather_data = None
-        weather_risk = None
+@api_view(["POST"])
+@renderer_classes(STREAMING_RENDERERS)
+def upload_finalize(request, upload_id):
+    """
+    Completes the upload, verifies its SHA-256 and returns the same
+    response as /api/predict/ (instantly, if the image was seen before).
+    Add ?explain=true for a Grad-CAM explanation and ?stream=sse|ndjson
+    for a streamed response.
+    """
+    try:
+        stream_format = _stream_format(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        latitude = request.data.get("latitude") or request.query_params.get("latitude")
-        longitude = request.data.get("longitude") or request.query_params.get(
-            "longitude"
+    try:
+        image_bytes, meta = uploads.finalize_upload(upload_id)
+    except uploads.UploadError as e:
+        return _upload_error_response(e)
+
+    if stream_format:
+        return _stream_prediction(
+            stream_format,
+            image_bytes,
+            meta["latitude"],
+            meta["longitude"],
+            digest=meta["sha256"],
+            crop=meta.get("crop"),
+            explain=_wants_explanation(request),
+            asynchronous=_is_asgi(request),
         )
 
-        if latitude is not None and longitude is not None:
-            try:
-                lat = float(latitude)
-                lon = float(longitude)
-                weather_data = get_weather_data(lat, lon)
-
-                if weather_data:
-                    weather_risk = get_weather_risk_assessment(
-                        disease_class,
-                        weather_data["temperature"],
-                        weather_data["humidity"],
-                    )
-            except (ValueError, TypeError) as e:
-                logger.warning(
-                    f"Invalid GPS coordinates: lat={latitude}, lon={longitude}. Error: {e}"
-                )
+    try:
+        return _run_prediction(
+            image_bytes,
+            meta["latitude"],
+            meta["longitude"],
+            digest=meta["sha256"],
+            crop=meta.get("crop"),
+            explain=_wants_explanation(request),
+        )
+    except Exception as e:
+        logger.error(f"Prediction failed: {e}", exc_info=True)
+        return Response(
+            {"error": f"Prediction failed: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
 
-        # ── Build response ──
-        response_data = {
-            "disease_class": disease_class,
-            "confidence": confidence,
-            "treatment_info": {
-                "disease": treatment_info["disease"],
-                "scientific_name": treatment_info["scientific_name"],
-                "symptoms": treatment_info["symptoms"],
-                "causes": treatment_info["causes"],
-                "treatment": treatment_info["treatment"],
-                "prevention": treatment_info["prevention"],
-                "severity": treatment_info["severity"],
-            },
-            "weather": weather_data,
-            "weather_risk": weather_risk,
+
+# ─── Tiled Prediction Endpoint ───────────────────────────────────────
+
+
+@api_view(["POST"])
+@parser_classes([MultiPartParser, FormParser])
+def predict_tiled_view(request):
+    """
+    Tiled inference for high-resolution field photos showing several
+    leaves. The photo is scored as overlapping 256x256 tiles instead of
+    being squashed to 256x256, so small lesions stay visible.
+
+    Request:
+        POST /api/predict/tiled/
+        Content-Type: multipart/form-data
+        Body:
+            - file: Image file (required)
+
+    Response:
+        {
+            "disease_class": "Late Blight",
+            "confidence": 93.1,
+            "is_leaf": true,
+            "grid": [8, 11],
+            "tiles_total": 88,
+            "tiles_scored": 41,
+            "tiles": [{"row": 0, "col": 3, "x": 576, "y": 0, "class": ..., "confidence": ...}, ...],
+            "heatmap": [[null, 0.12, ...], ...],
+            "treatment_info": { ... }
         }
+    """
+    from .tiling import predict_tiled
 
-        return Response(response_data, status=status.HTTP_200_OK)
+    image_file, error_response = _get_uploaded_image(request)
+    if error_response is not None:
+        return error_response
 
+    try:
+        result = predict_tiled(image_file.read())
     except Exception as e:
-        logger.error(f"Prediction failed: {e}", exc_info=True)
+        logger.error(f"Tiled prediction failed: {e}", exc_info=True)
         return Response(
             {"error": f"Prediction failed: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
 
+    if not result["is_leaf"]:
+        return Response(
+            {
+                "disease_class": "Not a Leaf",
+                "confidence": 0,
+                "is_leaf": False,
+                "validation_message": "No part of the image appears to contain a plant leaf.",
+                "grid": result["grid"],
+                "tiles_total": result["tiles_total"],
+                "tiles_scored": 0,
+                "treatment_info": None,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    return Response(
+        {
+            "disease_class": result["class"],
+            "confidence": result["confidence"],
+            "is_leaf": True,
+            "grid": result["grid"],
+            "tiles_total": result["tiles_total"],
+            "tiles_scored": result["tiles_scored"],
+            "tiles": result["tiles"],
+            "heatmap": result["heatmap"],
+            "treatment_info": get_router().treatment(None, result["class"]),
+        },
+        status=status.HTTP_200_OK,
+    )
+
+
+# ─── Scan History Endpoints ──────────────────────────────────────────
+
+
+@api_view(["GET"])
+def history_list(request):
+    """
+    Scan history, newest first, one keyset page at a time.
+
+    Request:
+        GET /api/history/?disease=late_blight&city=Pune
+            &date_from=2026-06-01&date_to=2026-09-30&limit=50
+        GET /api/history/?cursor=<next_cursor from the previous page>
+
+    The filters must stay the same while following next_cursor. Pages
+    continue into archived months (see archive.py) without a gap.
+
+    Response:
+        {"results": [ ... ], "next_cursor": "…" | null}
+    """
+    try:
+        limit = int(request.query_params.get("limit", settings.HISTORY_PAGE_SIZE))
+    except ValueError:
+        return Response(
+            {"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST
+        )
+    limit = min(max(limit, 1), settings.HISTORY_MAX_PAGE_SIZE)
+
+    try:
+        scans, next_cursor = history.history_page(request.query_params, limit)
+    except history.HistoryQueryError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = ScanHistorySerializer(scans, many=True, context={"request": request})
+    return Response({"results": serializer.data, "next_cursor": next_cursor})
+
+
+@api_view(["GET"])
+def history_export(request):
+    """
+    Streams the whole (filtered) history, oldest first, without loading
+    it into memory, archived months included. Accepts the same filters
+    as /api/history/.
+
+        GET /api/history/export/?export_format=csv&date_from=2026-06-01
+        GET /api/history/export/?export_format=ndjson&disease=early_blight
+    """
+    export_format = request.query_params.get("export_format", "csv").lower()
+    if export_format not in ("csv", "ndjson"):
+        return Response(
+            {"error": "export_format must be 'csv' or 'ndjson'."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        # Validate the filters now; a bad one mid-stream could not become a 400
+        history.filter_scans(ScanHistory.objects.none(), request.query_params)
+    except history.HistoryQueryError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = history.iter_export_rows(request.query_params)
+    if export_format == "csv":
+        body, content_type = history.stream_csv(rows), "text/csv"
+    else:
+        body, content_type = history.stream_ndjson(rows), "application/x-ndjson"
+
+    filename = f"leaflens-history-{timezone.localdate():%Y%m%d}.{export_format}"
+    response = StreamingHttpResponse(body, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(["POST"])
+@parser_classes(sync.sync_parsers())
+def history_sync(request):
+    """
+    Records scans that phones classified offline with the TFLite model,
+    without running inference again. Accepts JSON or MessagePack; see
+    prediction/sync.py for the record format.
+
+        POST /api/history/sync/
+        {"records": [{"client_id": "0b9c...", "disease_class": "Late Blight",
+                      "confidence": 97.2, "model_version": "2",
+                      "latitude": 19.07, "longitude": 72.87,
+                      "scanned_at": "2026-10-18T07:42:10Z"}, ...]}
+
+    Response:
+        {"received": 1200, "created": 1180, "duplicates": 20, "rejected": [],
+         "verification": {"sampled": 3, "checked": 3, "agreed": 3, "disagreements": []}}
+
+    Re-sent records (same client_id) count as duplicates, so a phone can
+    retry a batch whose response it lost.
+    """
+    try:
+        records = sync.iter_records(request.data)
+    except sync.SyncError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        result = sync.sync_records(records)
+    except Exception as e:
+        logger.error(f"History sync failed: {e}", exc_info=True)
+        return Response(
+            {"error": f"Sync failed: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+    return Response(result, status=status.HTTP_200_OK)
+
+
+# ─── Nearby Outbreaks Endpoint ───────────────────────────────────────
+
+
+@api_view(["GET"])
+def outbreaks_nearby(request):
+    """
+    Disease reports near a location.
+
+    Request:
+        GET /api/outbreaks/nearby/?latitude=18.52&longitude=73.85
+            &radius_km=5&days=7&disease=late_blight
+
+    Healthy scans are excluded unless asked for with disease=healthy.
+
+    Response:
+        {
+            "radius_km": 5, "days": 7,
+            "counts": {"Late Blight": 12, "Early Blight": 3},
+            "total": 15,
+            "scans": [{"id": …, "disease_class": …, "distance_km": 0.84, "scanned_at": …}, …]
+        }
+    """
+    params = request.query_params
+    try:
+        lat = float(params["latitude"])
+        lon = float(params["longitude"])
+        radius_km = float(params.get("radius_km", settings.OUTBREAK_RADIUS_KM))
+        days = int(params.get("days", settings.OUTBREAK_DAYS))
+    except (KeyError, ValueError):
+        return Response(
+            {"error": "latitude and longitude are required; radius_km and days must be numbers."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return Response({"error": "Coordinates out of range."}, status=status.HTTP_400_BAD_REQUEST)
+    max_radius_km, max_days = settings.OUTBREAK_MAX_RADIUS_KM, settings.OUTBREAK_MAX_DAYS
+    if not 0 < radius_km <= max_radius_km or not 1 <= days <= max_days:
+        return Response(
+            {"error": f"radius_km must be in (0, {max_radius_km}] and days in [1, {max_days}]."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    queryset = ScanHistory.objects.using(read_database())
+    try:
+        if params.get("disease"):
+            queryset = history.filter_scans(queryset, {"disease": params["disease"]})
+        else:
+            queryset = queryset.exclude(disease_class="Healthy")
+    except history.HistoryQueryError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    scans = geo.nearby_scans(lat, lon, radius_km, days, queryset=queryset)
+    return Response(
+        {
+            "radius_km": radius_km,
+            "days": days,
+            "counts": geo.count_by_disease(scans),
+            "total": len(scans),
+            "scans": scans[: settings.HISTORY_MAX_PAGE_SIZE],
+        }
+    )
+
 
 # ─── Treatment Info Endpoint ─────────────────────────────────────────
 
@@ -184,8 +1012,14 @@ def treatment_detail(request, disease_name):
     GET /api/treatment/Early Blight/
     GET /api/treatment/Late Blight/
     GET /api/treatment/Healthy/
+    GET /api/treatment/Bacterial Spot/?crop=tomato
     """
-    valid_diseases = ["Early Blight", "Late Blight", "Healthy"]
+    crop, error_response = _resolve_crop(request.query_params.get("crop"))
+    if error_response is not None:
+        return error_response
+
+    router = get_router()
+    valid_diseases = router.spec(crop).class_names
     if disease_name not in valid_diseases:
         return Response(
             {
@@ -194,10 +1028,32 @@ def treatment_detail(request, disease_name):
             status=status.HTTP_404_NOT_FOUND,
         )
 
-    treatment = get_treatment(disease_name)
+    treatment = router.treatment(crop, disease_name)
     return Response(treatment, status=status.HTTP_200_OK)
 
 
+# ─── Crops Endpoint ──────────────────────────────────────────────────
+
+
+@api_view(["GET"])
+def crops(request):
+    """
+    Crops this backend can classify, with each model's classes.
+
+    GET /api/crops/
+    """
+    router = get_router()
+    return Response(
+        {
+            "default": settings.ML_DEFAULT_CROP,
+            "crops": [
+                {**spec.describe(), "loaded": router.is_resident(name)}
+                for name, spec in router.specs().items()
+            ],
+        }
+    )
+
+
 # ─── TFLite Model Download Endpoint ─────────────────────────────────
 
 
@@ -285,6 +1141,7 @@ def tflite_info(request):
             "recommended_version": "2",
             "input_size": "256x256",
             "class_names": ["Early Blight", "Late Blight", "Healthy"],
+            "tensor_upload": tensor_upload_info(),
             "description": "Download a TFLite model for offline potato disease classification on mobile devices.",
         }
     )
@@ -0,0 +1,92 @@
+"""
+LeafLens - Inference Warm-up
+@Maharsh Doshi
+
+The inference modules are imported lazily (see views.py), so on a cold
+worker the first prediction pays for importing NumPy, PIL and
+TensorFlow, loading the model and building its serving graph.
+warm_up() does all of that ahead of time.
+
+settings.ML_WARMUP decides when a server process runs it:
+    "lazy"        — never; the first inference request pays (scale-to-zero)
+    "background"  — in a daemon thread at startup, while cheap endpoints
+                    are already being served
+    "eager"       — before the worker serves its first request
+
+wsgi.py and asgi.py call start_warmup(); management commands do not.
+"""
+
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+WARMUP_MODES = ("lazy", "background", "eager")
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def warm_up() -> dict:
+    """
+    Imports the inference modules, loads the default model and runs one
+    forward pass. Returns the time each step took (ms).
+    """
+    timings = {}
+
+    start = time.perf_counter()
+    from . import image_store, image_validator, ml_model, tiling, weather_service  # noqa: F401
+    from .buffers import get_input_pool
+
+    timings["imports_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    ml_model.get_model()
+    timings["model_load_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    # The first call builds the predict function (or traces the buckets);
+    # zeros give the same graph as a real image
+    start = time.perf_counter()
+    ml_model.warm_up_serving_graph()
+    if settings.ML_KERAS_SERVING_MODE == "predict":
+        with get_input_pool().borrow() as img_batch:
+            img_batch.fill(0)
+            ml_model.run_model(img_batch)
+    timings["first_inference_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    metrics.set_info("warmup", timings)
+    logger.info(f"Inference warm-up done: {timings}")
+    return timings
+
+
+def _warm_up_safely() -> None:
+    try:
+        warm_up()
+    except Exception as e:
+        # The first request will retry the same loads and report the error
+        logger.error(f"Inference warm-up failed: {e}", exc_info=True)
+
+
+def start_warmup(mode: str | None = None) -> None:
+    """Runs warm_up() according to settings.ML_WARMUP, once per process."""
+    global _started
+    mode = mode or settings.ML_WARMUP
+    if mode not in WARMUP_MODES:
+        raise ValueError(f"Unknown ML_WARMUP mode: {mode}. Valid options: {WARMUP_MODES}")
+    if mode == "lazy":
+        return
+
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+
+    if mode == "eager":
+        _warm_up_safely()
+    else:
+        threading.Thread(target=_warm_up_safely, name="leaflens-warmup", daemon=True).start()
@@ -0,0 +1,182 @@
+"""
+LeafLens - Background Weather Prefetcher
+@Maharsh Doshi
+
+Keeps the shared weather store warm for regions where farmers are
+actively scanning, so /api/predict/ almost never waits on
+OpenWeatherMap.
+
+Every cycle the prefetcher:
+    1. Learns the active regions from recent ScanHistory coordinates
+    2. Ranks them by scan volume
+    3. Refreshes any region whose cached reading is about to expire,
+       busiest first, until the hourly API-quota budget is used up
+
+Only one process refreshes per cycle (leader election through the
+shared cache), so running several Django workers does not multiply
+API usage.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .weather_service import (
+    api_calls_this_hour,
+    fetch_weather_data,
+    get_cached_weather,
+    get_region_key,
+    store_weather,
+)
+
+logger = logging.getLogger(__name__)
+
+LEADER_KEY = "leaflens:weather-prefetch:leader"
+
+# ─── Singleton Scheduler Instance ────────────────────────────────────
+_prefetcher = None
+_prefetcher_lock = threading.Lock()
+
+
+class WeatherPrefetcher:
+    """Periodically refreshes weather for the busiest recent regions."""
+
+    def __init__(
+        self,
+        interval: int | None = None,
+        lookback_hours: int | None = None,
+        max_regions: int | None = None,
+    ):
+        self.interval = interval or settings.WEATHER_PREFETCH_INTERVAL
+        self.lookback_hours = lookback_hours or settings.WEATHER_PREFETCH_LOOKBACK_HOURS
+        self.max_regions = max_regions or settings.WEATHER_PREFETCH_MAX_REGIONS
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ── Region discovery ──
+
+    def active_regions(self) -> list[tuple[tuple[float, float], int]]:
+        """
+        Returns [(region, scan_count), ...] for the lookback window,
+        busiest region first.
+        """
+        from leaflens_backend.database import read_database
+
+        from .models import ScanHistory
+
+        since = timezone.now() - timedelta(hours=self.lookback_hours)
+        coordinates = (
+            ScanHistory.objects.using(read_database())
+            .filter(
+                scanned_at__gte=since,
+                latitude__isnull=False,
+                longitude__isnull=False,
+            )
+            .values_list("latitude", "longitude")
+            .iterator(chunk_size=2000)
+        )
+        counts = Counter(get_region_key(lat, lon) for lat, lon in coordinates)
+        return counts.most_common(self.max_regions)
+
+    # ── Budget ──
+
+    def remaining_budget(self) -> int:
+        """
+        API calls the prefetcher may still spend this hour. A share of the
+        hourly quota is held back for cache misses on the request path.
+        """
+        quota = settings.WEATHER_API_HOURLY_QUOTA
+        reserved = int(quota * settings.WEATHER_PREFETCH_RESERVE)
+        return max(quota - reserved - api_calls_this_hour(), 0)
+
+    # ── One refresh cycle ──
+
+    def run_once(self) -> dict:
+        """
+        Refreshes stale or soon-to-expire regions. Returns a summary
+        dict: {"regions": n, "refreshed": n, "fresh": n, "skipped_quota": n}.
+        """
+        summary = {"regions": 0, "refreshed": 0, "fresh": 0, "skipped_quota": 0}
+
+        if not settings.OPENWEATHERMAP_API_KEY:
+            logger.warning("Weather prefetch skipped: OPENWEATHERMAP_API_KEY not set.")
+            return summary
+
+        refresh_after = settings.WEATHER_CACHE_TTL - settings.WEATHER_PREFETCH_MARGIN
+        budget = self.remaining_budget()
+        regions = self.active_regions()
+        summary["regions"] = len(regions)
+
+        for region, _count in regions:
+            entry = get_cached_weather(region)
+            if entry is not None and time.time() - entry["fetched_at"] < refresh_after:
+                summary["fresh"] += 1
+                continue
+            if budget <= 0:
+                summary["skipped_quota"] += 1
+                continue
+
+            budget -= 1
+            weather_info = fetch_weather_data(*region)
+            if weather_info is not None:
+                store_weather(region, weather_info)
+                summary["refreshed"] += 1
+
+        logger.info(
+            f"Weather prefetch: {summary['regions']} active regions, "
+            f"{summary['refreshed']} refreshed, {summary['fresh']} still fresh, "
+            f"{summary['skipped_quota']} skipped (quota)"
+        )
+        return summary
+
+    # ── Background loop ──
+
+    def _is_leader(self) -> bool:
+        # cache.add() only succeeds for one process per interval
+        return cache.add(LEADER_KEY, os.getpid(), timeout=max(self.interval - 1, 1))
+
+    def run_forever(self) -> None:
+        logger.info(
+            f"Weather prefetcher started (every {self.interval}s, "
+            f"lookback {self.lookback_hours}h, max {self.max_regions} regions)"
+        )
+        while not self._stop.is_set():
+            try:
+                if self._is_leader():
+                    self.run_once()
+            except Exception as e:
+                logger.error(f"Weather prefetch cycle failed: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, name="leaflens-weather-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def ensure_prefetcher_started() -> None:
+    """
+    Starts the in-process prefetcher the first time it is called, if
+    WEATHER_PREFETCH_ENABLED is set. Safe to call on every request.
+    """
+    global _prefetcher
+    if _prefetcher is not None or not settings.WEATHER_PREFETCH_ENABLED:
+        return
+    with _prefetcher_lock:
+        if _prefetcher is None:
+            _prefetcher = WeatherPrefetcher()
+            _prefetcher.start()
@@ -4,20 +4,176 @@ LeafLens - Weather Service (OpenWeatherMap Integration)
 
 Fetches real-time weather data for a given GPS location
 to provide contextual disease risk assessment.
+
+Results are kept in the shared weather store (the Django cache) keyed
+by a coarse grid cell, so every scan in the same region within the
+TTL reuses one API response. The background prefetcher
+(see weather_prefetch.py) refreshes busy regions before they expire.
+
+Request paths that have other work to do (inference) start the lookup
+with get_weather_data_async() and collect it when they need it.
 """
 
 import logging
+import math
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
+
+from .geo import valid_coordinates
 
 logger = logging.getLogger(__name__)
 
 OPENWEATHERMAP_URL = "https://api.openweathermap.org/data/2.5/weather"
 
+WEATHER_CACHE_PREFIX = "leaflens:weather"
+WEATHER_QUOTA_PREFIX = "leaflens:weather-quota"
+
+# ─── Singleton Worker Pool ───────────────────────────────────────────
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# ─── Shared Weather Store ────────────────────────────────────────────
+
+
+def get_region_key(latitude: float, longitude: float) -> tuple[float, float]:
+    """
+    Snaps coordinates to the centre of their weather grid cell.
+    All scans inside one cell share a single cached weather reading.
+    """
+    step = settings.WEATHER_GRID_DEGREES
+    lat = (math.floor(latitude / step) + 0.5) * step
+    lon = (math.floor(longitude / step) + 0.5) * step
+    return round(lat, 4), round(lon, 4)
+
+
+def _cache_key(region: tuple[float, float]) -> str:
+    return f"{WEATHER_CACHE_PREFIX}:{region[0]:.4f}:{region[1]:.4f}"
+
+
+def get_cached_weather(region: tuple[float, float]) -> dict | None:
+    """
+    Returns the stored entry for a region: {"data": ..., "fetched_at": ...}.
+    """
+    return cache.get(_cache_key(region))
+
+
+def store_weather(region: tuple[float, float], weather_info: dict) -> None:
+    """Puts a fresh reading into the shared weather store."""
+    cache.set(
+        _cache_key(region),
+        {"data": weather_info, "fetched_at": time.time()},
+        timeout=settings.WEATHER_CACHE_TTL,
+    )
+
 
 def get_weather_data(latitude: float, longitude: float) -> dict | None:
+    """
+    Returns current weather for the given coordinates, served from the
+    shared weather store when a fresh reading exists for the region.
+
+    Args:
+        latitude: GPS latitude
+        longitude: GPS longitude
+
+    Returns:
+        dict with weather data or None if the API call fails
+        (or the coordinates are not a place on Earth)
+    """
+    if not valid_coordinates(latitude, longitude):
+        # get_region_key() would overflow on inf and snap NaN to NaN
+        logger.warning(f"No weather for invalid coordinates: lat={latitude}, lon={longitude}")
+        return None
+
+    region = get_region_key(latitude, longitude)
+    entry = get_cached_weather(region)
+    if entry is not None:
+        return entry["data"]
+
+    weather_info = fetch_weather_data(*region)
+    if weather_info is not None:
+        store_weather(region, weather_info)
+    return weather_info
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.WEATHER_FETCH_WORKERS,
+                    thread_name_prefix="leaflens-weather",
+                )
+    return _executor
+
+
+def get_weather_data_async(latitude: float, longitude: float) -> Future:
+    """
+    get_weather_data() on the weather pool; the Future resolves to the
+    same dict or None. A cached region resolves without a round trip.
+    """
+    return _get_executor().submit(get_weather_data, latitude, longitude)
+
+
+# ─── API Quota Accounting ────────────────────────────────────────────
+
+
+def _quota_key(hour: int) -> str:
+    return f"{WEATHER_QUOTA_PREFIX}:{hour}"
+
+
+def record_api_call() -> None:
+    """Counts one OpenWeatherMap call against the current hour's budget."""
+    key = _quota_key(int(time.time() // 3600))
+    # add() is a no-op if the counter exists; incr() is atomic on shared backends
+    cache.add(key, 0, timeout=2 * 3600)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=2 * 3600)
+
+
+def api_calls_this_hour() -> int:
+    """Number of OpenWeatherMap calls made (by any worker) in the current hour."""
+    return cache.get(_quota_key(int(time.time() // 3600)), 0)
+
+
+# ─── OpenWeatherMap Client ───────────────────────────────────────────
+
+
+def _stub_weather(latitude: float, longitude: float) -> dict:
+    """
+    A fixed reading per location, after WEATHER_STUB_LATENCY_MS, in place
+    of the API (load tests and traffic replay: no quota, no network noise).
+    """
+    time.sleep(settings.WEATHER_STUB_LATENCY_MS / 1000)
+    seed = zlib.crc32(f"{latitude:.4f},{longitude:.4f}".encode())
+    return {
+        "temperature": 10 + seed % 20,
+        "feels_like": 10 + seed % 20,
+        "humidity": 50 + (seed >> 8) % 50,
+        "pressure": 1013,
+        "description": "Stubbed",
+        "wind_speed": 2.0,
+        "city": "Stub",
+        "country": "",
+        "clouds": (seed >> 16) % 100,
+        "rain_1h": 0,
+        "rain_3h": 0,
+    }
+
+
+def fetch_weather_data(latitude: float, longitude: float) -> dict | None:
     """
     Fetches current weather data from OpenWeatherMap for given coordinates.
+    Always goes to the network — use get_weather_data() on request paths.
 
     Args:
         latitude: GPS latitude
@@ -26,6 +182,9 @@ def get_weather_data(latitude: float, longitude: float) -> dict | None:
     Returns:
         dict with weather data or None if the API call fails
     """
+    if settings.WEATHER_STUB:
+        return _stub_weather(latitude, longitude)
+
     api_key = settings.OPENWEATHERMAP_API_KEY
 
     if not api_key:
@@ -44,6 +203,7 @@ def get_weather_data(latitude: float, longitude: float) -> dict | None:
             "units": "metric",  # Celsius
         }
 
+        record_api_call()
         response = requests.get(OPENWEATHERMAP_URL, params=params, timeout=5)
         response.raise_for_status()
         data = response.json()